@@ -23,6 +23,7 @@
 
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.db import DEFAULT_DB_ALIAS, connections
 from django.core.management.base import BaseCommand
 
@@ -58,6 +59,7 @@ class Command(BaseCommand):
     def handle(self, **options):
         database = options["database"]
         verbosity = int(options["verbosity"])
+        chunksize = getattr(settings, "ARCHIVE_CHUNK_SIZE", 10000)
 
         # Delete archived data we don't need any longer
         p = int(Parameter.getValue("archive.duration", database, "365"))
@@ -95,7 +97,7 @@ class Command(BaseCommand):
             # Check if a snapshot already exists in this period
             cursor.execute(
                 """
-                select snapshot_date
+                select snapshot_date, complete
                 from ax_manager
                 inner join common_bucketdetail
                   on bucket_id = %s
@@ -106,16 +108,28 @@ class Command(BaseCommand):
                 """,
                 (frequency, now, now),
             )
-            snapshots = [r[0] for r in cursor.fetchall()]
+            snapshots = cursor.fetchall()
+            mgr = None
             if snapshots:
                 if options["force"]:
                     # Delete previous snapshot for the period
                     for s in snapshots:
                         if verbosity > 0:
-                            print("Deleting archive", s)
+                            print("Deleting archive", s[0])
+                        ArchiveManager.dropPartitions(s[0], database)
                         cursor.execute(
-                            "delete from ax_manager where snapshot_date = %s", (s,)
+                            "delete from ax_manager where snapshot_date = %s", (s[0],)
                         )
+                elif not snapshots[0][1]:
+                    # Resume an interrupted snapshot
+                    mgr = (
+                        ArchiveManager.objects.using(database)
+                        .filter(snapshot_date=snapshots[0][0])
+                        .first()
+                    )
+                    now = mgr.snapshot_date
+                    if verbosity > 0:
+                        print("Resuming history archive snapshot", now)
                 else:
                     # We already have a snapshot for this period
                     if verbosity > 0:
@@ -124,19 +138,23 @@ class Command(BaseCommand):
                         )
                     return
 
-            if verbosity > 0:
-                print("Creating history archive snapshot", now)
-            mgr = ArchiveManager(
-                snapshot_date=now,
-                total_records=0,
-                buffer_records=0,
-                demand_records=0,
-                operationplan_records=0,
-            )
-            mgr.save(using=database)
+            if not mgr:
+                if verbosity > 0:
+                    print("Creating history archive snapshot", now)
+                mgr = ArchiveManager(
+                    snapshot_date=now,
+                    total_records=0,
+                    buffer_records=0,
+                    demand_records=0,
+                    operationplan_records=0,
+                    complete=False,
+                )
+                mgr.save(using=database)
+                ArchiveManager.createPartitions(now, database)
 
             # Archiving buffer table
-            cursor.execute(
+            self.archiveInChunks(
+                cursor,
                 """
                 insert into ax_buffer (item, location, batch, onhand, cost, safetystock, snapshot_date_id)
                 select item_id, location_id, batch, onhand, cost, safetystock, '%s'
@@ -186,15 +204,22 @@ class Command(BaseCommand):
                   and buffer.batch is not distinct from operationplan.batch
                   inner join item on item.name = operationplanmaterial.item_id
                   where flowdate < '%s'
+                  and (%%s::varchar is null or operationplanmaterial.item_id > %%s)
+                  and operationplanmaterial.item_id <= %%s
                 ) recs
                 where rownumber = 1
                 """
-                % ((now,) * 6)
+                % ((now,) * 6),
+                "select name from item",
+                "ax_buffer",
+                "item",
+                now,
+                chunksize,
             )
-            buffer_records = cursor.rowcount
 
             # Archiving demand table
-            cursor.execute(
+            self.archiveInChunks(
+                cursor,
                 """
                 insert into ax_demand (name, item, location, customer, cost, due, status, priority, quantity,
                                       deliverydate, quantityplanned, snapshot_date_id)
@@ -204,13 +229,20 @@ class Command(BaseCommand):
                 inner join item on demand.item_id = item.name
                 left outer join operationplan on operationplan.demand_id = demand.name
                 where demand.status in ('open', 'quote')
+                and (%%s::varchar is null or demand.name > %%s)
+                and demand.name <= %%s
                 """
-                % (now,)
+                % (now,),
+                "select name from demand where status in ('open', 'quote')",
+                "ax_demand",
+                "name",
+                now,
+                chunksize,
             )
-            demand_records = cursor.rowcount
 
             # Archiving POs
-            cursor.execute(
+            self.archiveInChunks(
+                cursor,
                 """
                 insert into ax_operationplan
                 (reference, status, type, quantity, startdate, enddate, item, operation, supplier, location, item_cost, itemsupplier_cost, snapshot_date_id)
@@ -221,13 +253,69 @@ class Command(BaseCommand):
                 left outer join itemsupplier on itemsupplier.item_id = op.item_id and itemsupplier.supplier_id = op.supplier_id
                 where
                 op.type <> 'STCK' and op.status in ('confirmed','approved','completed')
+                and (%%s::varchar is null or op.reference > %%s)
+                and op.reference <= %%s
+                """
+                % (now,),
                 """
-                % (now,)
+                select reference from operationplan
+                where type <> 'STCK' and status in ('confirmed','approved','completed')
+                """,
+                "ax_operationplan",
+                "reference",
+                now,
+                chunksize,
             )
-            operationplan_records = cursor.rowcount
 
-            mgr.buffer_records = buffer_records
-            mgr.demand_records = demand_records
-            mgr.operationplan_records = operationplan_records
-            mgr.total_records = buffer_records + demand_records + operationplan_records
+            # The record counts include the records of an interrupted run
+            cursor.execute(
+                """
+                select
+                  (select count(*) from ax_buffer where snapshot_date_id = %s),
+                  (select count(*) from ax_demand where snapshot_date_id = %s),
+                  (select count(*) from ax_operationplan where snapshot_date_id = %s)
+                """,
+                (now,) * 3,
+            )
+            (
+                mgr.buffer_records,
+                mgr.demand_records,
+                mgr.operationplan_records,
+            ) = cursor.fetchone()
+            mgr.total_records = (
+                mgr.buffer_records + mgr.demand_records + mgr.operationplan_records
+            )
+            mgr.complete = True
             mgr.save(using=database)
+
+    @staticmethod
+    def archiveInChunks(cursor, sql, keys, table, field, snapshot_date, chunksize):
+        """
+        Runs an insert statement on consecutive chunks of keys, to keep the
+        transactions small.
+        Every chunk is committed on its own. Keys already present in the
+        snapshot were archived by an interrupted run, and are skipped.
+        """
+        cursor.execute(
+            "select max(%s) from %s where snapshot_date_id = %%s" % (field, table),
+            (snapshot_date,),
+        )
+        last = cursor.fetchone()[0]
+        while True:
+            cursor.execute(
+                """
+                select max(key) from (
+                  select key from (%s) keys(key)
+                  where %%s::varchar is null or key > %%s
+                  order by key
+                  limit %%s
+                ) chunk
+                """
+                % keys,
+                (last, last, chunksize),
+            )
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                return
+            cursor.execute(sql, (last, last, upper))
+            last = upper
@@ -0,0 +1,105 @@
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from django.conf import settings
+from django.db import migrations, models, connections
+
+
+def partitionArchive(apps, schema_editor):
+    """
+    Recreates the archive tables as tables partitioned by snapshot date.
+    Every snapshot gets its own partition. The existing data go into the
+    default partition.
+    """
+    db = schema_editor.connection.alias
+    with connections[db].cursor() as cursor:
+        for table in ("ax_buffer", "ax_demand", "ax_operationplan"):
+            cursor.execute(
+                """
+                select indexdef
+                from pg_indexes
+                where schemaname = current_schema() and tablename = %s
+                and indexname not in (
+                  select conname from pg_constraint where conrelid = %s::regclass
+                  )
+                """,
+                (table, table),
+            )
+            indexes = [i[0] for i in cursor.fetchall()]
+            cursor.execute(
+                """
+                select conname, pg_get_constraintdef(oid)
+                from pg_constraint
+                where conrelid = %s::regclass and contype = 'f'
+                """,
+                (table,),
+            )
+            foreignkeys = cursor.fetchall()
+            cursor.execute("alter table %s rename to %s_old" % (table, table))
+            cursor.execute("""
+                create table %s (like %s_old including storage)
+                partition by list (snapshot_date_id)
+                """ % (table, table))
+            cursor.execute(
+                "create table %s_default partition of %s default" % (table, table)
+            )
+            cursor.execute("insert into %s select * from %s_old" % (table, table))
+            cursor.execute("drop table %s_old" % table)
+            cursor.execute(
+                "alter table %s alter column id add generated by default as identity"
+                % table
+            )
+            cursor.execute(
+                """
+                select setval(pg_get_serial_sequence(%%s, 'id'), coalesce(max(id), 0) + 1, false)
+                from %s
+                """ % table,
+                (table,),
+            )
+            # A primary key of a partitioned table needs to include the
+            # partitioning column
+            cursor.execute(
+                "alter table %s add primary key (id, snapshot_date_id)" % table
+            )
+            for i in indexes:
+                cursor.execute(i)
+            for name, definition in foreignkeys:
+                cursor.execute(
+                    "alter table %s add constraint %s %s" % (table, name, definition)
+                )
+            role = settings.DATABASES[db].get("SQL_ROLE", "report_role")
+            if role:
+                cursor.execute("grant select on table %s to %s" % (table, role))
+
+
+class Migration(migrations.Migration):
+    dependencies = [("archive", "0008_alter_indexes")]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivemanager",
+            name="complete",
+            field=models.BooleanField(default=True, verbose_name="complete"),
+        ),
+        migrations.RunPython(partitionArchive, migrations.RunPython.noop),
+    ]
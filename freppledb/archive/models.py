@@ -21,7 +21,7 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-from django.db import models
+from django.db import connections, models
 from django.utils.translation import gettext_lazy as _
 
 from freppledb.common.models import MultiDBManager
@@ -39,6 +39,10 @@ class ArchiveManager(models.Model):
     buffer_records = models.IntegerField("buffer_records")
     demand_records = models.IntegerField("demand_records")
     operationplan_records = models.IntegerField("operationplan_records")
+    complete = models.BooleanField("complete", default=True)
+
+    # Archive tables, partitioned by snapshot date
+    archive_tables = ("ax_buffer", "ax_demand", "ax_operationplan")
 
     class Meta:
         db_table = "ax_manager"
@@ -47,6 +51,44 @@ class ArchiveManager(models.Model):
         ordering = ["snapshot_date"]
         default_permissions = ()
 
+    @staticmethod
+    def getPartition(table, snapshot_date):
+        return "%s_%s" % (table, snapshot_date.strftime("%Y%m%d%H%M%S"))
+
+    @classmethod
+    def createPartitions(cls, snapshot_date, database):
+        """
+        Creates a partition for the snapshot in every archive table.
+        """
+        with connections[database].cursor() as cursor:
+            for t in cls.archive_tables:
+                cursor.execute(
+                    "create table if not exists %s partition of %s for values in (%%s)"
+                    % (cls.getPartition(t, snapshot_date), t),
+                    (snapshot_date,),
+                )
+
+    @classmethod
+    def dropPartitions(cls, snapshot_date, database):
+        """
+        Drops the partitions of the snapshot, which is a lot faster than
+        deleting the records.
+        Snapshots that aren't stored in their own partition (because they were
+        created before the archive tables were partitioned, or because their
+        date was shifted since) are left alone.
+        """
+        with connections[database].cursor() as cursor:
+            for t in cls.archive_tables:
+                cursor.execute(
+                    "drop table if exists %s" % cls.getPartition(t, snapshot_date)
+                )
+
+    def delete(self, *args, **kwargs):
+        self.dropPartitions(
+            self.snapshot_date, kwargs.get("using", None) or self._state.db
+        )
+        return super().delete(*args, **kwargs)
+
 
 class ArchivedModel(models.Model):
     """
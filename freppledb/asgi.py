@@ -28,6 +28,7 @@ import jwt
 import logging
 import os
 import sys
+from urllib.parse import parse_qs
 
 from django.conf import settings
 from django.contrib.auth import authenticate
@@ -37,11 +38,12 @@ from django.urls import re_path
 from django.contrib.auth.models import AnonymousUser
 from freppledb.common.models import User, APIKey
 from freppledb.common.utils import get_databases
+from freppledb.webservice.utils import isReadOnly, PlanChanges
 
-from channels.auth import AuthMiddleware
+from channels.auth import AuthMiddleware, UserLazyObject
 from channels.db import database_sync_to_async
 from channels.generic.http import AsyncHttpConsumer
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.middleware import BaseMiddleware
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
@@ -59,8 +61,6 @@ logger = logging.getLogger(__name__)
 
 serviceRegistry = {}
 
-connected = set()
-
 
 def registerService(key):
     def inner(func):
@@ -83,24 +83,22 @@ for app in settings.INSTALLED_APPS:
             raise e
 
 
-# class WebsocketService(WebsocketConsumer):
-#     def connect(self):
-#         self.user = self.scope["user"]
-#         print("connecting", self.user)
-#         connected.add(self)
-#         self.accept()
-
-#     def disconnect(self, close_code):
-#         print("disconnecting")
-#         connected.remove(self)
-#         pass
+class WebsocketService(AsyncWebsocketConsumer):
+    """
+    Streams the changes to the plan to the user interface.
+    See PlanChanges for the messages.
+    """
 
-#     def receive(self, text_data):
-#         print("receive", text_data, self.scope)
-#         text_data_json = json.loads(text_data)
-#         message = text_data_json["message"]
+    async def connect(self):
+        user = self.scope.get("user", None)
+        if getattr(user, "is_authenticated", False) is not True or not user.is_active:
+            await self.close()
+            return
+        await self.accept()
+        PlanChanges.subscribers.add(self)
 
-#         self.send(text_data=json.dumps({"message": message}))
+    async def disconnect(self, close_code):
+        PlanChanges.subscribers.discard(self)
 
 
 class HTTPNotFound(AsyncHttpConsumer):
@@ -150,6 +148,15 @@ class TokenMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
         scope["database"] = self.database
         try:
+            if scope["type"] == "websocket":
+                # Browsers can't pass headers when opening a websocket
+                token = parse_qs(scope.get("query_string", b"").decode("ascii")).get(
+                    "token", None
+                )
+                if token:
+                    scope["headers"] = list(scope.get("headers", [])) + [
+                        (b"authorization", ("Bearer %s" % token[0]).encode("ascii"))
+                    ]
             if "headers" in scope:
                 for h in scope["headers"]:
                     if h[0] == b"authorization":
@@ -209,16 +216,18 @@ class TokenMiddleware(BaseMiddleware):
 
 class AuthAndPermissionMiddleware(AuthMiddleware):
     """
-    Populates user permissions.
+    - authenticates the user with the django session, unless the
+      TokenMiddleware already found a user
+    - populates user permissions
     """
 
-    async def __call__(self, scope, receive, send):
-        usr = scope.get("user", None)
-        if not usr:
-            scope["user"] = AnonymousUser
-        elif usr.is_authenticated and not usr.is_superuser:
+    async def resolve_scope(self, scope):
+        if isinstance(scope["user"], UserLazyObject):
+            # No user in the scope yet
+            await super().resolve_scope(scope)
+        usr = scope["user"]
+        if usr.is_authenticated and not usr.is_superuser:
             await database_sync_to_async(usr.get_all_permissions)()
-        return await super().__call__(scope, receive, send)
 
 
 class AuthenticatedMiddleware(BaseMiddleware):
@@ -278,6 +287,27 @@ class AuthenticatedMiddleware(BaseMiddleware):
                     "more_body": False,
                 }
             )
+        if (
+            scope["method"] not in ("GET", "HEAD")
+            and scope["path"] not in ("/stop/", "/stop/force/", "/readonly/")
+            and isReadOnly()
+        ):
+            # A new plan is being generated
+            scope["response_headers"].append((b"Content-Type", b"text/plain"))
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": scope["response_headers"],
+                }
+            )
+            return await send(
+                {
+                    "type": "http.response.body",
+                    "body": b"A new plan is being generated. Changes are possible again when it is ready.",
+                    "more_body": False,
+                }
+            )
         try:
             return await super().__call__(scope, receive, send)
         except Exception as e:
@@ -314,10 +344,16 @@ application = ProtocolTypeRouter(
                 )
             )
         ),
-        # "websocket": AllowedHostsOriginValidator(
-        #     AuthenticatedMiddleware(AuthMiddlewareStack(
-        #         URLRouter([re_path(r"ws/", WebsocketService.as_asgi())])
-        #     ))
-        # ),
+        "websocket": AllowedHostsOriginValidator(
+            CookieMiddleware(
+                SessionMiddleware(
+                    TokenMiddleware(
+                        AuthAndPermissionMiddleware(
+                            URLRouter([re_path(r"^ws/$", WebsocketService.as_asgi())])
+                        )
+                    )
+                )
+            )
+        ),
     }
 )
@@ -33,6 +33,7 @@ from django_bulk_drf import BulkModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 
 from freppledb.common.models import User
+from freppledb.common.utils import invalidateReportCache
 from freppledb.common.auth import getWebserviceAuthorization
 
 
@@ -92,6 +93,7 @@ class frePPleBulkModelViewSet(BulkModelViewSet):
         - Support for request-specific scenario database (.using(self.request.database))
         - Backward compatibility for query-parameter bulk DELETEs
         - Safety check preventing unintended full-table drops
+        - Invalidation of the cached report pages after a change
     """
 
     filter_backends = (DjangoFilterBackend,)
@@ -111,6 +113,12 @@ class frePPleBulkModelViewSet(BulkModelViewSet):
             actions = cls.DEFAULT_ACTIONS
         return super().as_view(actions=actions, **initkwargs)
 
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            invalidateReportCache(request.database)
+        return response
+
     def get_queryset(self):
         queryset = super().get_queryset().using(self.request.database)
         return queryset
@@ -168,10 +176,17 @@ class frePPleRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
     Customized API view for the REST framework.
        - support for request-specific scenario database
        - add 'title' to the context of the html view
+       - invalidation of the cached report pages after a change
     """
 
     permission_classes = (frepplePermissionClass,)
 
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            invalidateReportCache(request.database)
+        return response
+
     def get_queryset(self):
         if self.request.database == "default":
             return super().get_queryset()
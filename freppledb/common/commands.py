@@ -21,15 +21,30 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+import heapq
 import io
 from importlib import import_module
-from operator import attrgetter
+import json
+from operator import attrgetter, itemgetter
 import os
+from queue import Empty, Queue
+import struct
 import sys
 import site
 import logging
-from threading import Thread
+from threading import Event, Thread, local
+from time import perf_counter, process_time
+from zoneinfo import ZoneInfo
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
 
 if __name__ == "__main__":
     # Autodetect Python virtual enviroment
@@ -80,7 +95,7 @@ from django.conf import settings
 from django.db import DEFAULT_DB_ALIAS, connections
 from django.utils.encoding import force_str
 
-from freppledb.execute.models import Task
+from freppledb.execute.models import Task, TaskProfile
 from freppledb.common.utils import get_databases
 
 logger = logging.getLogger(__name__)
@@ -143,6 +158,626 @@ class CopyFromGenerator(io.TextIOBase):
         return "".join(line)
 
 
+# Reference points of the PostgreSQL binary formats
+_pg_epoch = datetime(2000, 1, 1)
+_pg_epoch_utc = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_pg_epoch_date = _pg_epoch.date()
+
+# The encoders return the length of the field followed by its binary value
+_int16 = struct.Struct("!h")
+_int32 = struct.Struct("!i")
+_field_int16 = struct.Struct("!ih")
+_field_int32 = struct.Struct("!ii")
+_field_int64 = struct.Struct("!iq")
+_field_float64 = struct.Struct("!id")
+_field_interval = struct.Struct("!iqii")
+_field_numeric = [struct.Struct("!ihhHh%dH" % i) for i in range(5)]
+_null_field = _int32.pack(-1)
+_true_field = _int32.pack(1) + b"\x01"
+_false_field = _int32.pack(1) + b"\x00"
+
+
+def _binary_text(value, tz=None):
+    v = (value if isinstance(value, str) else str(value)).encode("utf-8")
+    return _int32.pack(len(v)) + v
+
+
+def _binary_json(value, tz=None):
+    v = (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")
+    return _int32.pack(len(v) + 1) + b"\x01" + v
+
+
+def _binary_bool(value, tz=None):
+    return _true_field if value else _false_field
+
+
+def _binary_int2(value, tz=None):
+    return _field_int16.pack(2, round(value))
+
+
+def _binary_int4(value, tz=None):
+    return _field_int32.pack(4, round(value))
+
+
+def _binary_int8(value, tz=None):
+    return _field_int64.pack(8, round(value))
+
+
+def _binary_float8(value, tz=None):
+    return _field_float64.pack(8, value)
+
+
+def _binary_numeric(value, tz=None):
+    """
+    Encodes a number in the PostgreSQL binary numeric format: a header
+    followed by the digits in base 10000.
+    """
+    if value.__class__ is not Decimal and -10000000 < value < 10000000:
+        # Fast path for the common case: numbers with up to 8 decimals
+        if value < 0:
+            sign = 0x4000
+            value = -value
+        else:
+            sign = 0
+        i, f = divmod(round(value * 100000000), 100000000)
+        if not f:
+            if i >= 10000:
+                if i % 10000:
+                    return _field_numeric[2].pack(
+                        12, 2, 1, sign, 8, i // 10000, i % 10000
+                    )
+                return _field_numeric[1].pack(10, 1, 1, sign, 8, i // 10000)
+            elif i:
+                return _field_numeric[1].pack(10, 1, 0, sign, 8, i)
+            return _field_numeric[0].pack(8, 0, 0, 0, 8)
+        f1, f2 = divmod(f, 10000)
+        if i >= 10000:
+            groups = [i // 10000, i % 10000, f1, f2]
+            weight = 1
+        elif i:
+            groups = [i, f1, f2]
+            weight = 0
+        elif f1:
+            groups = [f1, f2]
+            weight = -1
+        else:
+            groups = [f2]
+            weight = -2
+        if not groups[-1]:
+            groups.pop()
+        return _field_numeric[len(groups)].pack(
+            8 + 2 * len(groups), len(groups), weight, sign, 8, *groups
+        )
+
+    # Generic case
+    if not isinstance(value, Decimal):
+        value = Decimal(repr(value) if isinstance(value, float) else value)
+    if value.is_nan():
+        return _field_numeric[0].pack(8, 0, 0, 0xC000, 0)
+    elif value.is_infinite():
+        return _field_numeric[0].pack(8, 0, 0, 0xF000 if value < 0 else 0xD000, 0)
+    sign, digits, exp = value.as_tuple()
+    digits = "".join(str(d) for d in digits)
+    if exp > 0:
+        digits += "0" * exp
+        exp = 0
+    dscale = -exp
+    # Align the fractional part on groups of 4 digits
+    fraction = dscale + (-dscale) % 4
+    digits += "0" * (fraction - dscale)
+    digits = digits.rjust(fraction, "0")
+    split = len(digits) - fraction
+    integer = digits[:split].rjust(split + (-split) % 4, "0")
+    groups = [int(integer[i : i + 4]) for i in range(0, len(integer), 4)]
+    weight = len(groups) - 1
+    groups.extend(int(digits[i : i + 4]) for i in range(split, len(digits), 4))
+    # Strip leading and trailing zero groups
+    start = 0
+    while start < len(groups) and not groups[start]:
+        start += 1
+        weight -= 1
+    end = len(groups)
+    while end > start and not groups[end - 1]:
+        end -= 1
+    groups = groups[start:end]
+    if not groups:
+        return _field_numeric[0].pack(8, 0, 0, 0, dscale)
+    return struct.pack(
+        "!ihhHh%dH" % len(groups),
+        8 + 2 * len(groups),
+        len(groups),
+        weight,
+        0x4000 if sign else 0,
+        dscale,
+        *groups,
+    )
+
+
+@lru_cache(maxsize=65536)
+def _binary_timestamp(value, tz=None):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    delta = value - _pg_epoch
+    return _field_int64.pack(
+        8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    )
+
+
+@lru_cache(maxsize=65536)
+def _binary_timestamptz(value, tz=None):
+    # Naive datetimes are in the timezone of the database session, just like
+    # they are interpreted by the text format.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz) if tz else value.astimezone()
+    delta = value - _pg_epoch_utc
+    return _field_int64.pack(
+        8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    )
+
+
+def _binary_date(value, tz=None):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return _field_int32.pack(4, (value - _pg_epoch_date).days)
+
+
+def _binary_time(value, tz=None):
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    elif isinstance(value, datetime):
+        value = value.time()
+    return _field_int64.pack(
+        8,
+        ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000
+        + value.microsecond,
+    )
+
+
+def _binary_interval(value, tz=None):
+    # Plain numbers represent a number of seconds
+    if isinstance(value, timedelta):
+        return _field_interval.pack(
+            16, value.seconds * 1000000 + value.microseconds, value.days, 0
+        )
+    return _field_interval.pack(16, round(float(value) * 1000000), 0, 0)
+
+
+_binary_encoders = {
+    "bool": _binary_bool,
+    "bpchar": _binary_text,
+    "date": _binary_date,
+    "float8": _binary_float8,
+    "int2": _binary_int2,
+    "int4": _binary_int4,
+    "int8": _binary_int8,
+    "interval": _binary_interval,
+    "jsonb": _binary_json,
+    "numeric": _binary_numeric,
+    "text": _binary_text,
+    "time": _binary_time,
+    "timestamp": _binary_timestamp,
+    "timestamptz": _binary_timestamptz,
+    "varchar": _binary_text,
+}
+
+
+def _text_value(value):
+    if value is None:
+        return "\\N"
+    elif isinstance(value, str):
+        return clean_value(value)
+    elif isinstance(value, bool):
+        return "t" if value else "f"
+    elif isinstance(value, (dict, list)):
+        return clean_value(json.dumps(value))
+    else:
+        return str(value)
+
+
+class CopyFromBinaryGenerator(io.RawIOBase):
+    """
+    File-like object to handle exporting data to PostgreSQL over
+    a copy command in the binary format.
+
+    The iterator returns tuples with python values rather than formatted
+    text lines. The encoders list has for each field the function converting
+    the value to its binary PostgreSQL representation.
+    """
+
+    def __init__(self, itr, encoders, tz=None):
+        self._iter = itr
+        self._encoders = encoders
+        self._tz = tz
+        self._count = _int16.pack(len(encoders))
+        self._buff = bytearray(b"PGCOPY\n\xff\r\n\x00" + _int32.pack(0) * 2)
+        self._eof = False
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _fill(self, n):
+        tz = self._tz
+        encoders = self._encoders
+        count = self._count
+        buff = self._buff
+        for row in self._iter:
+            self.rows += 1
+            buff += count
+            for encoder, value in zip(encoders, row):
+                if value is None:
+                    buff += _null_field
+                elif encoder is _binary_text and value.__class__ is str:
+                    # Inlined for performance
+                    value = value.encode("utf-8")
+                    buff += _int32.pack(len(value))
+                    buff += value
+                else:
+                    buff += encoder(value, tz)
+            if len(buff) >= n:
+                return
+        buff += _int16.pack(-1)
+        self._eof = True
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            while not self._eof:
+                self._fill(1 << 20)
+            n = len(self._buff)
+        elif not self._eof and len(self._buff) < n:
+            self._fill(n)
+        ret = bytes(self._buff[:n])
+        del self._buff[:n]
+        return ret
+
+
+def _session_timezone(cursor):
+    try:
+        return ZoneInfo(cursor.connection.info.parameter_status("TimeZone"))
+    except Exception:
+        try:
+            return ZoneInfo(settings.TIME_ZONE)
+        except Exception:
+            return None
+
+
+def copy_rows(cursor, table, columns, rows, binary=None):
+    """
+    Export an iterator of row tuples with python values into a database
+    table with a COPY command. None values are exported as null.
+
+    Unless specified otherwise, the binary COPY format is used for all
+    tables that only have column types we know how to encode. It avoids
+    formatting and escaping all values as text in python.
+    Returns the number of exported rows.
+    """
+    if binary is None:
+        binary = settings.EXPORT_BINARY_COPY
+    if binary:
+        cursor.execute(
+            """
+            select attname, typname
+            from pg_attribute
+            inner join pg_type on pg_type.oid = pg_attribute.atttypid
+            where attrelid = %s::regclass and attnum > 0 and not attisdropped
+            """,
+            (table,),
+        )
+        types = {rec[0]: rec[1] for rec in cursor.fetchall()}
+        encoders = [_binary_encoders.get(types.get(c, None), None) for c in columns]
+        if all(encoders):
+            data = CopyFromBinaryGenerator(
+                iter(rows), encoders, tz=_session_timezone(cursor)
+            )
+            cursor.copy_expert(
+                "copy %s (%s) from stdin with (format binary)"
+                % (table, ",".join(columns)),
+                data,
+                size=65536,
+            )
+            StepProfile.count(1, data.rows)
+            return data.rows
+
+    # Text format
+    counter = [0]
+
+    def getData():
+        for row in rows:
+            counter[0] += 1
+            yield "\v".join([_text_value(v) for v in row]) + "\n"
+
+    cursor.copy_from(
+        CopyFromGenerator(getData()),
+        table,
+        columns=columns,
+        size=65536,
+        sep="\v",
+    )
+    StepProfile.count(1, counter[0])
+    return counter[0]
+
+
+class _CopyRowsThread(Thread):
+    def __init__(self, database, table, columns, rows, binary=None):
+        super().__init__()
+        self.database = database
+        self.table = table
+        self.columns = columns
+        self.rows = rows
+        self.binary = binary
+        self.count = 0
+        self.exception = None
+
+    def run(self):
+        try:
+            with connections[self.database].cursor() as cursor:
+                self.count = copy_rows(
+                    cursor, self.table, self.columns, self.rows, binary=self.binary
+                )
+        except Exception as e:
+            self.exception = e
+        connections.close_all()
+
+
+def _copy_rows_process(database, table, columns, rows, binary, fd):
+    """
+    Body of a forked export process. It reports the number of exported rows
+    or the error on a pipe, and never returns.
+    """
+    status = 1
+    msg = "export process %s failed" % os.getpid()
+    try:
+        # Abandon the database connections inherited from the parent process.
+        # Closing them, also by garbage collection, would close them for the
+        # parent as well. os._exit skips the garbage collection.
+        inherited = []
+        for conn in connections.all(initialized_only=True):
+            inherited.append(conn.connection)
+            conn.connection = None
+        with connections[database].cursor() as cursor:
+            msg = "ok %d" % copy_rows(cursor, table, columns, rows, binary=binary)
+        connections[database].close()
+        status = 0
+    except BaseException as e:
+        msg = str(e) or e.__class__.__name__
+    finally:
+        os.write(fd, msg.encode("utf-8"))
+        os._exit(status)
+
+
+def copy_rows_parallel(database, table, columns, partitions, binary=None):
+    """
+    Export a list of row iterators in parallel into a database table.
+
+    Each iterator is exported over its own database connection in a forked
+    process, which generates the rows from its copy of the model. Platforms
+    without fork use a thread per iterator instead: the rows are then only
+    generated in parallel while other threads wait on the database.
+    The table needs to be visible to these connections, ie it can't be a
+    temporary table or a table created in an uncommitted transaction.
+    Returns the total number of exported rows.
+    """
+    if not hasattr(os, "fork"):
+        threads = [
+            _CopyRowsThread(database, table, columns, rows, binary=binary)
+            for rows in partitions
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for t in threads:
+            if t.exception:
+                logger.error("Exception caught on export thread to %s" % table)
+                raise t.exception
+        cnt = sum(t.count for t in threads)
+        StepProfile.count(len(threads), cnt)
+        return cnt
+
+    children = []
+    errors = []
+    cnt = 0
+    try:
+        for rows in partitions:
+            r, w = os.pipe()
+            pid = os.fork()
+            if not pid:
+                os.close(r)
+                _copy_rows_process(database, table, columns, rows, binary, w)
+            os.close(w)
+            children.append((pid, r))
+    finally:
+        for pid, r in children:
+            with os.fdopen(r, "rb") as f:
+                msg = f.read().decode("utf-8")
+            os.waitpid(pid, 0)
+            if msg.startswith("ok "):
+                cnt += int(msg[3:])
+            else:
+                errors.append(msg or "export process %s failed" % pid)
+    if errors:
+        logger.error("Exception caught on export process to %s" % table)
+        raise Exception(errors[0])
+    StepProfile.count(len(children), cnt)
+    return cnt
+
+
+def balance_partitions(weighted, count):
+    """
+    Distributes a list of (weight, object) tuples over a number of partitions
+    with a similar total weight. The heaviest objects are assigned first,
+    each to the lightest partition so far.
+    Returns the non-empty partitions.
+    """
+    heap = [(0, i, []) for i in range(count)]
+    for w, o in sorted(weighted, key=itemgetter(0), reverse=True):
+        load, i, part = heap[0]
+        part.append(o)
+        heapq.heapreplace(heap, (load + w, i, part))
+    return [part for _, _, part in heap if part]
+
+
+def stage_table(cursor, prefix):
+    """
+    Returns the name of the unlogged staging table of a parallel export.
+
+    The name ends with the process identifier of the database backend that
+    creates it. The staging tables of backends that no longer exist were
+    left behind by a crashed export, and are dropped.
+    """
+    cursor.execute(
+        """
+        select tablename from pg_tables
+        where schemaname = current_schema()
+          and tablename ~ %s
+          and substring(tablename from '[0-9]+$')::integer
+            not in (select pid from pg_stat_activity)
+        """,
+        ("^%s_[0-9]+$" % prefix,),
+    )
+    for rec in cursor.fetchall():
+        logger.info("Dropping stale staging table %s" % rec[0])
+        cursor.execute("drop table if exists %s" % rec[0])
+    cursor.execute("select pg_backend_pid()")
+    return "%s_%s" % (prefix, cursor.fetchone()[0])
+
+
+def read_rows(cursor, query, params=None, size=10000):
+    """
+    Generator over the records of a query.
+
+    The records are fetched in chunks, typically from a server side cursor.
+    The next chunk is fetched on a separate thread while the caller processes
+    the current one, so the database and the caller work in parallel. The
+    caller shouldn't use the cursor until the generator is exhausted. When
+    the caller stops before, the cursor is closed and the remaining records
+    aren't fetched.
+    """
+    q = Queue(maxsize=2)
+    stop = Event()
+    cursor.execute(query, params)
+
+    def fetch():
+        try:
+            while not stop.is_set():
+                rows = cursor.fetchmany(size)
+                q.put(rows)
+                if not rows:
+                    break
+        except Exception as e:
+            q.put(e)
+
+    t = Thread(target=fetch, daemon=True)
+    t.start()
+    exhausted = False
+    try:
+        while True:
+            rows = q.get()
+            if isinstance(rows, Exception):
+                raise rows
+            elif not rows:
+                exhausted = True
+                break
+            StepProfile.count(0, len(rows))
+            yield from rows
+    finally:
+        # Let the fetching thread finish its current chunk
+        stop.set()
+        while t.is_alive():
+            try:
+                q.get(timeout=0.1)
+            except Empty:
+                pass
+        if not exhausted:
+            cursor.close()
+
+
+def peak_memory():
+    """
+    Returns the peak memory of the process in MB, or 0 when the platform
+    doesn't report it.
+    """
+    if not resource:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1048576.0 if sys.platform == "darwin" else 1024.0)
+
+
+class StepProfile:
+    """
+    Context manager measuring the resources used by a planning step:
+      - wall time and cpu time in seconds
+      - growth of the peak memory of the process in MB
+      - SQL statements executed on the database connection of the thread
+      - records returned or affected by these statements, or copied.
+        Records read from a server side cursor are only counted when
+        they are read with the read_rows function.
+    """
+
+    _current = local()
+
+    def __init__(self, database=DEFAULT_DB_ALIAS):
+        self.database = database
+        self.statements = 0
+        self.rows = 0
+
+    @classmethod
+    def count(cls, statements, rows):
+        profile = getattr(cls._current, "profile", None)
+        if profile:
+            profile.statements += statements
+            profile.rows += rows
+
+    def __call__(self, execute, sql, params, many, context):
+        # Wrapper around all SQL statements on the connection
+        self.statements += 1
+        result = execute(sql, params, many, context)
+        cursor = context["cursor"].cursor
+        if not getattr(cursor, "name", None) and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+        return result
+
+    def __enter__(self):
+        self.parent = getattr(self._current, "profile", None)
+        self._current.profile = self
+        connections[self.database].execute_wrappers.append(self)
+        self.started = datetime.now()
+        self.walltime = perf_counter()
+        self.cputime = process_time()
+        self.memory = peak_memory()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.walltime = perf_counter() - self.walltime
+        self.cputime = process_time() - self.cputime
+        self.memory = peak_memory() - self.memory
+        connections[self.database].execute_wrappers.remove(self)
+        self._current.profile = self.parent
+
+    def save(self, task, step):
+        try:
+            TaskProfile(
+                task_id=task.id,
+                sequence=str(step.sequence),
+                step=step.description,
+                started=self.started,
+                walltime=round(self.walltime, 8),
+                cputime=round(self.cputime, 8),
+                memory=round(self.memory, 8),
+                statements=self.statements,
+                rows=self.rows,
+            ).save(using=self.database)
+        except Exception as e:
+            logger.warning(
+                "Couldn't save the profile of '%s': %s" % (step.description, e)
+            )
+
+
 class PlanTask:
     """
     Base class for steps in the plan generation process
@@ -154,16 +789,45 @@ class PlanTask:
     label = None
     export = False
 
+    # Tasks that need to have run before this task can read its data from
+    # the database. The default None means that the task depends on all
+    # tasks preceding it in the sequence.
+    dependencies = None
+
+    # Tasks that only load master data from the database set this flag. A
+    # warm engine process runs them only once, and reuses their data for all
+    # plan runs. All other tasks run in every plan run.
+    static = False
+
+    # Tasks preparing the settings or data the static tasks depend on set
+    # this flag. A warm engine process runs them before the static tasks, and
+    # every plan run runs them again.
+    warmup = False
+
     # Fields for internal use
     task = None
     thread = "main"
     parent = None
     timestamp = None
+    prefetched = None
+    warmweight = None
 
     @classmethod
     def getWeight(cls, **kwargs):
         return 1
 
+    @classmethod
+    def prefetch(cls, **kwargs):
+        """
+        Reads data from the database ahead of the run method. The return value
+        is available in the prefetched attribute while the task runs.
+
+        This method is only called for tasks that declare their dependencies.
+        It runs in a worker thread with its own database connection, and
+        can't interact with the planning engine.
+        """
+        return None
+
     @classmethod
     def run(cls, **kwargs):
         logger.warning("Warning: PlanTask doesn't implement the run method")
@@ -189,6 +853,79 @@ class PlanTask:
         pass
 
 
+class PlanWriteLock:
+    """
+    PostgreSQL advisory lock of a scenario, held while a plan run erases and
+    writes its plan.
+    The plan run holds it exclusively, and the tasks reading the plan hold it
+    shared. Advisory locks are local to a database, so the plan runs of
+    different scenarios don't block each other.
+    """
+
+    key = 0x46524550
+
+    # Connection holding the exclusive lock of this process
+    connection = None
+
+    @staticmethod
+    def _connect(database):
+        conn = connections[database].get_new_connection(
+            connections[database].get_connection_params()
+        )
+        conn.autocommit = True
+        return conn
+
+    @classmethod
+    def acquire(cls, database=DEFAULT_DB_ALIAS):
+        """
+        Waits till the running readers are done, and locks the plan for
+        writing until release is called or the process ends.
+        """
+        if cls.connection:
+            return
+        conn = cls._connect(database)
+        with conn.cursor() as cursor:
+            cursor.execute("select pg_advisory_lock(%s)", (cls.key,))
+        cls.connection = conn
+
+    @classmethod
+    def release(cls):
+        if cls.connection:
+            cls.connection.close()
+            cls.connection = None
+
+    @classmethod
+    def acquireShared(cls, database=DEFAULT_DB_ALIAS):
+        """
+        Waits till the plan isn't being written, and returns a connection
+        holding a shared lock. Closing the connection releases the lock.
+        """
+        conn = cls._connect(database)
+        with conn.cursor() as cursor:
+            cursor.execute("select pg_advisory_lock_shared(%s)", (cls.key,))
+        return conn
+
+    @classmethod
+    def isWriting(cls, database=DEFAULT_DB_ALIAS):
+        """
+        Returns True while a plan run writes the plan of the scenario, or
+        waits to do so.
+        """
+        with connections[database].cursor() as cursor:
+            cursor.execute("select pg_try_advisory_lock_shared(%s)", (cls.key,))
+            if not cursor.fetchone()[0]:
+                return True
+            cursor.execute("select pg_advisory_unlock_shared(%s)", (cls.key,))
+            return False
+
+
+class WarmEngineMismatch(Exception):
+    """
+    Raised when a plan run needs other static data than the warm engine
+    loaded.
+    """
+
+
 class PlanTaskSequence(PlanTask):
     """
     Class that runs a sequence of task in sequence.
@@ -203,13 +940,28 @@ class PlanTaskSequence(PlanTask):
         self.steps.append(task)
         task.parent = self
 
-    def getWeight(self, export=False, **kwargs):
+    def getWeight(self, export=False, warm=None, **kwargs):
         total = 0
         for s in self.steps:
             if export:
                 s.weight = 1 if s.export else -1
             else:
                 s.weight = s.getWeight(**PlanTaskRegistry.getArguments())
+                if warm == "load":
+                    # A warm engine process only runs the static tasks and
+                    # the tasks preparing them
+                    if s.static:
+                        s.warmweight = (s.weight, getattr(s, "filter", None))
+                    elif not s.warmup:
+                        s.weight = -1
+                elif warm == "plan" and s.static:
+                    # The plan runs forked from a warm engine run all other
+                    # tasks. They need the same static data.
+                    if s.warmweight != (s.weight, getattr(s, "filter", None)):
+                        raise WarmEngineMismatch(
+                            "Warm engine didn't load the data for '%s'" % s.description
+                        )
+                    s.weight = -1
             if s.weight is not None and s.weight >= 0:
                 total += s.weight
         return total
@@ -221,11 +973,18 @@ class PlanTaskSequence(PlanTask):
             task_weight = 1
 
         # Execute all tasks in the list
+        pool = None
         try:
             progress = 0
-            for step in self.steps:
-                if step.weight is None or step.weight <= 0:
-                    continue
+            steps = [s for s in self.steps if s.weight is not None and s.weight > 0]
+            prefetching = {}
+            finished = set()
+            if settings.LOAD_THREADS > 1 and any(
+                s.dependencies is not None for s in steps
+            ):
+                pool = ThreadPoolExecutor(max_workers=settings.LOAD_THREADS)
+                self._prefetch(pool, steps, prefetching, finished)
+            for step in steps:
 
                 # Update status and message
                 if self.task and not export:
@@ -253,7 +1012,19 @@ class PlanTaskSequence(PlanTask):
                         )
                     )
                 step.timestamp = self.timestamp
-                step.run(**PlanTaskRegistry.getArguments())
+                if step in prefetching:
+                    step.prefetched = prefetching.pop(step).result()
+                try:
+                    with StepProfile(database) as profile:
+                        step.run(**PlanTaskRegistry.getArguments())
+                finally:
+                    step.prefetched = None
+                if (
+                    PlanTaskRegistry.reg.task
+                    and not export
+                    and not isinstance(step, PlanTask)
+                ):
+                    profile.save(PlanTaskRegistry.reg.task, step)
                 logger.info(
                     "Finished '%s' in %s %s"
                     % (
@@ -263,6 +1034,9 @@ class PlanTaskSequence(PlanTask):
                     )
                 )
                 progress += step.weight
+                if pool:
+                    finished.add(step)
+                    self._prefetch(pool, steps, prefetching, finished)
 
             # Final task status
             if self.task and not export:
@@ -278,6 +1052,38 @@ class PlanTaskSequence(PlanTask):
                 self.task.message = str(e)
                 self.task.save(using=database)
             raise
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _prefetch(pool, steps, prefetching, finished):
+        """
+        Submits the prefetch of the tasks that declare their dependencies, as
+        soon as these dependencies have run. A task that doesn't declare its
+        dependencies blocks the prefetch of all tasks after it until it has run.
+        """
+        for s in steps:
+            if s.dependencies is None:
+                if s not in finished:
+                    break
+            elif (
+                s not in finished
+                and s not in prefetching
+                and all(d in finished or d not in steps for d in s.dependencies)
+            ):
+                prefetching[s] = pool.submit(
+                    PlanTaskSequence._prefetchTask,
+                    s,
+                    **PlanTaskRegistry.getArguments(),
+                )
+
+    @staticmethod
+    def _prefetchTask(task, **kwargs):
+        try:
+            return task.prefetch(**kwargs)
+        finally:
+            connections.close_all()
 
     def display(self, indentlevel=0, **kwargs):
         for i in self.steps:
@@ -574,6 +1380,13 @@ if __name__ == "__main__":
             settings.FREPPLE_LOGDIR, os.environ["FREPPLE_LOGFILE"]
         )
 
+    # Keep the master data loaded for the next plan runs
+    if "FREPPLE_WARM" in os.environ:
+        from freppledb.execute.warmengine import runEngine
+
+        runEngine(database)
+        sys.exit(0)
+
     # Update the task with my processid
     if "FREPPLE_TASKID" in os.environ:
         try:
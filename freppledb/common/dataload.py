@@ -21,8 +21,10 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+from collections import deque
 from datetime import timedelta, datetime
 from decimal import Decimal
+from itertools import chain, islice
 from logging import INFO, ERROR, WARNING, DEBUG
 from openpyxl.worksheet.cell_range import CellRange
 from openpyxl.worksheet.worksheet import Worksheet
@@ -31,9 +33,10 @@ import unicodedata
 from django import forms
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.core.validators import EMPTY_VALUES
-from django.db import DEFAULT_DB_ALIAS
-from django.db.models import ForeignKey
+from django.db import connections, transaction, DatabaseError, DEFAULT_DB_ALIAS
+from django.db.models import ForeignKey, Model
 from django.db.models.fields import (
     IntegerField,
     AutoField,
@@ -54,9 +57,9 @@ from django.utils import translation
 from django.utils.translation import get_language, gettext_lazy as _
 from django.utils.encoding import force_str
 from django.utils.formats import get_format
-from django.utils.text import get_text_list
+from django.utils.text import capfirst, get_text_list
 
-from .models import Comment
+from .models import AuditModel, Comment, HierarchyModel, NotificationFactory
 from .localization import parseLocalizedDateTime
 
 
@@ -461,6 +464,16 @@ def _parseData(
     processed_header = False
     rowWrapper = rowmapper()
 
+    # Rows read ahead to decide on a bulk upload are processed first
+    source = iter(data)
+    pending = deque()
+
+    def allRows():
+        for row in source:
+            yield row
+            while pending:
+                yield pending.popleft()
+
     # Detect excel autofilter data tables
     if isinstance(data, Worksheet) and data.auto_filter.ref:
         try:
@@ -470,7 +483,7 @@ def _parseData(
     else:
         bounds = None
 
-    for row in data:
+    for row in allRows():
         rownumber += 1
         if bounds:
             # Only process data in the excel auto-filter range
@@ -606,6 +619,24 @@ def _parseData(
                 ):
                     natural_key = model.natural_key
 
+            # Large files are uploaded with set-based SQL statements
+            if _canBulkUpload(model, has_pk_field, [i for i in headers if i]):
+                pending.extend(islice(source, settings.UPLOAD_BULK_THRESHOLD))
+                if len(pending) >= settings.UPLOAD_BULK_THRESHOLD:
+                    rownumber, changed, added, bulk_errors = yield from _bulkUpload(
+                        model,
+                        chain(pending, source),
+                        rowWrapper,
+                        [i for i in headers if i],
+                        rownumber,
+                        user,
+                        database,
+                        ping,
+                        skip_audit_log,
+                    )
+                    errors += bulk_errors
+                    break
+
         # Case 3: Process a data row
         else:
             try:
@@ -729,6 +760,416 @@ def _parseData(
     )
 
 
+def _canBulkUpload(model, has_pk_field, fields):
+    """
+    The set-based upload bypasses the model forms and the save method of the
+    model. It is only used for models that identify their records with the
+    primary key and don't define validation logic of their own.
+
+    A model with a save method is eligible when the class defining it
+    describes what the method does in a set-based way:
+      - bulk_upload_values is a dictionary with the value of the columns
+        that the save method always assigns.
+      - afterBulkUpload is a class method called with the primary keys of the
+        uploaded records, to apply the remaining logic of the save method.
+    """
+    if (
+        not settings.UPLOAD_BULK_THRESHOLD
+        or not has_pk_field
+        or isinstance(model._meta.pk, AutoField)
+        or hasattr(model, "getModelForm")
+        or model._meta.unique_together
+        or model._meta.constraints
+        or len({f.column for f in fields}) < len(fields)
+    ):
+        return False
+    for f in model._meta.fields:
+        if f.unique and not f.primary_key:
+            return False
+    for cls in model.__mro__:
+        if cls in (AuditModel, HierarchyModel, Model, object):
+            # The set-based upload updates the lastmodified field, and
+            # rebuilds the hierarchy
+            continue
+        for m in ("save", "clean", "clean_fields", "validate_unique", "full_clean"):
+            if m in vars(cls) and not (
+                m == "save"
+                and (
+                    "bulk_upload_values" in vars(cls) or "afterBulkUpload" in vars(cls)
+                )
+            ):
+                return False
+    return True
+
+
+def _bulkUpload(
+    model, data, rowWrapper, fields, rownumber, user, database, ping, skip_audit_log
+):
+    """
+    Uploads the data rows with set-based SQL statements:
+      - the values of each row are validated in python
+      - the valid rows are copied into a temporary staging table
+      - the foreign keys are validated with a single query per field
+      - the staging table is merged into the table of the model
+
+    Errors are yielded in the same format as the row-by-row upload. When the
+    merge fails, the rows are merged one by one to report the failing rows.
+    Returns the last row number, and the number of changed records, added
+    records and errors.
+    """
+    from .commands import copy_rows
+
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    connection = connections[database]
+    errors = 0
+    changed = 0
+    added = 0
+    now = datetime.now()
+    formfields = [
+        None if isinstance(f, RelatedField) else f.formfield(localize=True)
+        for f in fields
+    ]
+    columns = [f.column for f in fields]
+    forced = {}
+    for cls in reversed(model.__mro__):
+        forced.update(vars(cls).get("bulk_upload_values", {}))
+    inserted = [c for c in columns if c not in forced]
+    updated = [c for c in inserted if c != pk]
+    if issubclass(model, HierarchyModel):
+        reset = ["lft", "rght", "lvl"]
+    else:
+        reset = []
+
+    # New records get the default value of the fields that aren't uploaded.
+    # The lastmodified field is always set explicitly in the merge statement.
+    defaults = []
+    for f in model._meta.concrete_fields:
+        if (
+            f.column in columns
+            or f.column in forced
+            or f.column in reset
+            or f.column == "lastmodified"
+            or not f.has_default()
+        ):
+            continue
+        defaults.append((f.column, f.get_db_prep_save(f.get_default(), connection)))
+
+    def getRows():
+        nonlocal rownumber, errors
+        for row in data:
+            rownumber += 1
+            rowWrapper.setData(row)
+            if rowWrapper.empty():
+                continue
+            if ping and rownumber % 50 == 0:
+                yield (DEBUG, rownumber, None, None, None)
+            values = [rownumber]
+            for f, formfield in zip(fields, formfields):
+                value = rowWrapper[f.name]
+                try:
+                    if formfield:
+                        value = formfield.clean(value)
+                    elif value in EMPTY_VALUES:
+                        if not f.null:
+                            raise ValidationError(
+                                forms.Field.default_error_messages["required"]
+                            )
+                        value = None
+                    else:
+                        # Foreign keys are validated in the database
+                        value = f.target_field.to_python(value)
+                    if value not in f.empty_values:
+                        f.run_validators(value)
+                    values.append(value)
+                except ValidationError as e:
+                    for msg in e.messages:
+                        errors += 1
+                        yield (ERROR, rownumber, f.name, rowWrapper[f.name], msg)
+                    values = None
+                    break
+            if values:
+                yield values
+
+    try:
+        with transaction.atomic(using=database), connection.cursor() as cursor:
+            cursor.execute("drop table if exists tmp_upload")
+            cursor.execute(
+                """
+                create temporary table tmp_upload as
+                select 0 as rownumber, %s, null::text[] as changes
+                from %s
+                with no data
+                """
+                % (",".join(columns), table)
+            )
+
+            # Validate the rows in python, and copy them in chunks to the staging table
+            chunk = []
+            for rec in getRows():
+                if isinstance(rec, list):
+                    chunk.append(rec)
+                    if len(chunk) >= 10000:
+                        copy_rows(cursor, "tmp_upload", ["rownumber"] + columns, chunk)
+                        chunk = []
+                else:
+                    yield rec
+            if chunk:
+                copy_rows(cursor, "tmp_upload", ["rownumber"] + columns, chunk)
+
+            # Validate the foreign keys
+            for f in fields:
+                if not isinstance(f, RelatedField):
+                    continue
+                selfReferencing = f.remote_field.model == model
+                while True:
+                    cursor.execute(
+                        """
+                        select rownumber, %s from tmp_upload
+                        where %s is not null
+                        and not exists (
+                          select 1 from %s as target
+                          where target.%s = tmp_upload.%s
+                          )
+                        %s
+                        order by rownumber
+                        """
+                        % (
+                            f.column,
+                            f.column,
+                            f.remote_field.model._meta.db_table,
+                            f.target_field.column,
+                            f.column,
+                            (
+                                """
+                                and not exists (
+                                  select 1 from tmp_upload as other
+                                  where other.%s = tmp_upload.%s
+                                  )
+                                """
+                                % (pk, f.column)
+                                if selfReferencing
+                                else ""
+                            ),
+                        )
+                    )
+                    invalid = cursor.fetchall()
+                    if not invalid:
+                        break
+                    for rec in invalid:
+                        errors += 1
+                        yield (
+                            ERROR,
+                            rec[0],
+                            f.name,
+                            rec[1],
+                            force_str(
+                                _(
+                                    "Select a valid choice. That choice is not one of the available choices."
+                                )
+                            ),
+                        )
+                    cursor.execute(
+                        "delete from tmp_upload where rownumber = any(%s)",
+                        ([rec[0] for rec in invalid],),
+                    )
+                    if not selfReferencing:
+                        # Removing rows can't invalidate other rows
+                        break
+
+            # A proxy model can't overwrite the records of other proxy models
+            # stored in the same table
+            if model._meta.proxy:
+                query, query_params = (
+                    model._default_manager.using(database)
+                    .values_list("pk")
+                    .query.sql_with_params()
+                )
+                cursor.execute(
+                    """
+                    select rownumber, %s from tmp_upload
+                    where exists (
+                      select 1 from %s as target
+                      where target.%s = tmp_upload.%s
+                      )
+                    and %s not in (%s)
+                    order by rownumber
+                    """
+                    % (pk, table, pk, pk, pk, query),
+                    query_params,
+                )
+                invalid = cursor.fetchall()
+                for rec in invalid:
+                    errors += 1
+                    yield (
+                        ERROR,
+                        rec[0],
+                        model._meta.pk.name,
+                        rec[1],
+                        force_str(
+                            model._meta.pk.error_messages["unique"]
+                            % {
+                                "model_name": capfirst(model._meta.verbose_name),
+                                "field_label": model._meta.pk.verbose_name,
+                            }
+                        ),
+                    )
+                if invalid:
+                    cursor.execute(
+                        "delete from tmp_upload where rownumber = any(%s)",
+                        ([rec[0] for rec in invalid],),
+                    )
+
+            # When a record appears multiple times, the last row wins
+            cursor.execute(
+                """
+                delete from tmp_upload
+                using tmp_upload as later
+                where later.%s = tmp_upload.%s
+                and later.rownumber > tmp_upload.rownumber
+                """
+                % (pk, pk)
+            )
+
+            # Find the changed fields of existing records, and skip unchanged records
+            if updated:
+                cursor.execute(
+                    """
+                    update tmp_upload
+                    set changes = array_remove(array[%s], null)
+                    from %s as target
+                    where target.%s = tmp_upload.%s
+                    """
+                    % (
+                        ",".join(
+                            "case when target.%s is distinct from tmp_upload.%s then '%s' end"
+                            % (f.column, f.column, f.name)
+                            for f in fields
+                            if f.column in updated
+                        ),
+                        table,
+                        pk,
+                        pk,
+                    )
+                )
+            else:
+                cursor.execute(
+                    """
+                    update tmp_upload set changes = '{}'
+                    from %s as target
+                    where target.%s = tmp_upload.%s
+                    """
+                    % (table, pk, pk)
+                )
+            cursor.execute("delete from tmp_upload where changes = '{}'")
+
+            # Merge the staging table in the table of the model
+            merge = """
+                insert into %s (%s)
+                select %s from tmp_upload
+                %%s
+                on conflict (%s) do update set %s
+                """ % (
+                table,
+                ",".join(
+                    inserted
+                    + list(forced)
+                    + [d[0] for d in defaults]
+                    + ["lastmodified"]
+                    + reset
+                ),
+                ",".join(
+                    inserted
+                    + ["%%s"] * (len(forced) + len(defaults))
+                    + ["%%s::timestamp"]
+                    + ["null"] * len(reset)
+                ),
+                pk,
+                ",".join(
+                    ["%s = excluded.%s" % (c, c) for c in updated + list(forced)]
+                    + ["lastmodified = excluded.lastmodified"]
+                    + ["%s = null" % c for c in reset]
+                ),
+            )
+            params = list(forced.values()) + [d[1] for d in defaults] + [now]
+            try:
+                with transaction.atomic(using=database):
+                    cursor.execute(merge % "", params)
+            except DatabaseError:
+                # Merge the rows one by one to find the rows that fail
+                cursor.execute("select rownumber from tmp_upload order by rownumber")
+                for (rec,) in cursor.fetchall():
+                    try:
+                        with transaction.atomic(using=database):
+                            cursor.execute(
+                                merge % "where rownumber = %s", params + [rec]
+                            )
+                    except DatabaseError as e:
+                        errors += 1
+                        yield (
+                            ERROR,
+                            rec,
+                            None,
+                            None,
+                            "Exception during upload: %s" % e,
+                        )
+                        cursor.execute(
+                            "delete from tmp_upload where rownumber = %s", (rec,)
+                        )
+            cursor.execute(
+                "select count(*) filter (where changes is not null), count(*) filter (where changes is null) from tmp_upload"
+            )
+            changed, added = cursor.fetchone()
+
+            # Apply the rest of the save logic, and log the changes
+            content_type_id = ContentType.objects.get_for_model(
+                model, for_concrete_model=False
+            ).pk
+            cursor.execute("select %s, changes from tmp_upload order by rownumber" % pk)
+            while True:
+                recs = cursor.fetchmany(10000)
+                if not recs:
+                    break
+                if hasattr(model, "afterBulkUpload"):
+                    model.afterBulkUpload(database, [rec[0] for rec in recs])
+                if skip_audit_log or not user:
+                    continue
+                objs = model.objects.using(database).in_bulk([rec[0] for rec in recs])
+                Comment.objects.using(database).bulk_create(
+                    [
+                        Comment(
+                            user_id=user.id,
+                            content_type_id=content_type_id,
+                            object_pk=rec[0],
+                            object_repr=force_str(objs.get(rec[0], rec[0])),
+                            type="add" if rec[1] is None else "change",
+                            comment=(
+                                "Added"
+                                if rec[1] is None
+                                else "Changed %s." % get_text_list(rec[1], "and")
+                            ),
+                            lastmodified=now,
+                        )
+                        for rec in recs
+                    ]
+                )
+            cursor.execute("drop table tmp_upload")
+
+        # The set-based upload doesn't call the save method of hierarchical
+        # models, which leaves the hierarchy to be rebuilt
+        if issubclass(model, HierarchyModel) and (changed or added):
+            model.rebuildHierarchy(database=database)
+    except Exception as e:
+        errors += 1
+        changed = 0
+        added = 0
+        yield (ERROR, None, None, None, "Exception during upload: %s" % e)
+    else:
+        if not skip_audit_log and user and (changed or added):
+            NotificationFactory.launchWorker(database=database)
+    return rownumber, changed, added, errors
+
+
 class BulkForeignKeyFormField(forms.fields.Field):
     def __init__(
         self,
@@ -27,8 +27,8 @@ import json
 import logging
 from multiprocessing import Process
 import os
-from psycopg2.extras import execute_batch
 import sys
+from threading import Lock
 import time
 
 from django.conf import settings
@@ -98,107 +98,329 @@ class HierarchyModel(models.Model):
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        try:
-            # Update an arbitrary other object to trigger recalculation of the hierarchy
-            obj = self.__class__.objects.using(self._state.db).exclude(pk=self.pk)[0]
-            obj.lft = None
-            obj.rght = None
-            obj.lvl = None
-            obj.save(update_fields=["lft", "rght", "lvl"], using=self._state.db)
-        except Exception:
-            # Failure can happen when eg we delete the last record
-            pass
+        # The children lose their owner: mark them for recalculation of the hierarchy
+        self.__class__.objects.using(self._state.db).filter(owner=self).update(
+            lft=None, rght=None, lvl=None
+        )
+        table = connections[self._state.db].ops.quote_name(self._meta.db_table)
+        with connections[self._state.db].cursor() as cursor:
+            cursor.execute(
+                "delete from %s where child = %%s"
+                % connections[self._state.db].ops.quote_name(
+                    "%s_hierarchy" % self._meta.db_table
+                ),
+                (self.pk,),
+            )
+            cursor.execute(
+                "select lft, rght from %s where name = %%s" % table, (self.pk,)
+            )
+            interval = cursor.fetchone()
         # Call the real delete() method
         super().delete(*args, **kwargs)
+        # Close the gap left behind by a record without children, by shifting
+        # the records to its right. The gaps left by records with children are
+        # closed when their children are placed in the hierarchy again.
+        if interval and interval[0] is not None and interval[1] == interval[0] + 1:
+            with connections[self._state.db].cursor() as cursor:
+                cursor.execute(
+                    """
+                    update %s
+                    set lft = case when lft > %%s then lft - 2 else lft end,
+                      rght = rght - 2
+                    where rght > %%s
+                    """ % table,
+                    (interval[1], interval[1]),
+                )
 
     class Meta:
         abstract = True
 
+    # Maximum number of changed records and of records in their subtrees
+    # we update incrementally. Above this a complete rebuild is faster.
+    incremental_records = 1000
+    incremental_subtree = 100000
+
     @classmethod
-    def rebuildHierarchy(cls, database=DEFAULT_DB_ALIAS):
-        # Verify whether we need to rebuild or not.
-        # We search for the first record whose lft field is null.
-        if len(cls.objects.using(database).filter(lft__isnull=True)[:1]) == 0:
-            return
+    def rebuildHierarchy(cls, database=DEFAULT_DB_ALIAS, force=False):
+        """
+        Updates the lft, rght and lvl fields of the records whose lft field is
+        null, ie new records and records that got a different owner.
+        The subtree of such a record is moved as the last child of its owner,
+        and the nested set intervals of the other records are shifted to make
+        room for it. Finally the gaps left behind by the moved records are
+        closed. When many records changed, the complete hierarchy is
+        renumbered instead.
+
+        The table <table>_hierarchy is maintained at the same time. It has a
+        record for every (parent, child) combination in the hierarchy, with the
+        difference in level between them as depth. Every record is also its own
+        parent with depth 0.
+
+        The force argument renumbers the complete hierarchy, which is needed
+        after loading data that already has lft, rght and lvl values.
+        """
+        table = connections[database].ops.quote_name(cls._meta.db_table)
+        hierarchy = connections[database].ops.quote_name(
+            "%s_hierarchy" % cls._meta.db_table
+        )
+        with transaction.atomic(using=database):
+            with connections[database].cursor() as cursor:
+                if force:
+                    cls._renumberHierarchy(cursor, table, hierarchy)
+                    return
+                cursor.execute(
+                    "select name, owner_id from %s where lft is null limit %s"
+                    % (table, cls.incremental_records + 1)
+                )
+                changed = dict(cursor.fetchall())
+                if not changed:
+                    return
+                if len(changed) > cls.incremental_records:
+                    cls._renumberHierarchy(cursor, table, hierarchy)
+                    return
+                todo = cls.incremental_subtree
+                placed = set()
+                for name in sorted(changed):
+                    if name in placed:
+                        continue
+                    # Find the top of the changed records above this one
+                    top = name
+                    chain = {name}
+                    while changed.get(top) in changed:
+                        top = changed[top]
+                        if top in chain:
+                            # A loop in the hierarchy
+                            cls._renumberHierarchy(cursor, table, hierarchy)
+                            return
+                        chain.add(top)
+                    subtree = cls._moveSubtree(
+                        cursor, table, hierarchy, top, changed[top], todo
+                    )
+                    if subtree is None:
+                        cls._renumberHierarchy(cursor, table, hierarchy)
+                        return
+                    placed.update(subtree)
+                    todo -= len(subtree)
+                cls._closeGaps(cursor, table)
 
-        nodes = {}
+    @classmethod
+    def _moveSubtree(cls, cursor, table, hierarchy, name, owner, limit):
+        """
+        Places a record and all records below it as the last child of the
+        owner.
+        Returns the names of the records in the subtree, or None when the
+        subtree is too big or contains a loop.
+        """
+        cursor.execute(
+            """
+            with recursive subtree(name, owner_id) as (
+              select name, owner_id from %s where name = %%s
+              union
+              select child.name, child.owner_id
+              from %s as child
+              inner join subtree on child.owner_id = subtree.name
+            )
+            select name, owner_id from subtree limit %s
+            """ % (table, table, limit + 1),
+            (name,),
+        )
         children = {}
-        updates = []
-
-        def tagChildren(me, left, level):
-            right = left + 1
-            # Get all children of this node
-            for i in children.get(me, []):
-                # Recursive execution of this function for each child of this node
-                right = tagChildren(i, right, level + 1)
-
-            # After processing the children of this node now know its left and right values
-            updates.append((left, right, level, me))
+        for child, parent in cursor.fetchall():
+            if child != name:
+                children.setdefault(parent, []).append(child)
+        names = [name] + [c for l in children.values() for c in l]
+        if len(names) > limit or owner in names:
+            return None
+
+        # Make room for the subtree
+        width = 2 * len(names)
+        if owner is None:
+            cursor.execute("select coalesce(max(rght), 0) + 1 from %s" % table)
+            left = cursor.fetchone()[0]
+            level = 0
+        else:
+            cursor.execute(
+                "select rght, lvl from %s where name = %%s" % table, (owner,)
+            )
+            left, level = cursor.fetchone()
+            if left is None:
+                return None
+            level += 1
+            cursor.execute(
+                """
+                update %s
+                set lft = case when lft >= %%s then lft + %%s else lft end,
+                  rght = rght + %%s
+                where rght >= %%s and not name = any(%%s::text[])
+                """ % table,
+                (left, width, width, left, names),
+            )
+        if left + width >= 2**31:
+            return None
+
+        # Number the subtree with a depth-first walk
+        updates = ([], [], [], [])
+        pairs = ([name], [name], [0])
+        counter = left + 1
+        stack = [(name, left, level, iter(sorted(children.get(name, []))))]
+        while stack:
+            node, lft, lvl, pending = stack[-1]
+            child = next(pending, None)
+            if child is None:
+                stack.pop()
+                for u, v in zip(updates, (node, lft, counter, lvl)):
+                    u.append(v)
+            else:
+                for i in stack:
+                    for u, v in zip(pairs, (i[0], child, lvl + 1 - i[2])):
+                        u.append(v)
+                for u, v in zip(pairs, (child, child, 0)):
+                    u.append(v)
+                stack.append(
+                    (child, counter, lvl + 1, iter(sorted(children.get(child, []))))
+                )
+            counter += 1
+        cursor.execute(
+            """
+            update %s
+            set lft = v.lft, rght = v.rght, lvl = v.lvl
+            from unnest(%%s::text[], %%s::int[], %%s::int[], %%s::int[])
+              as v(name, lft, rght, lvl)
+            where %s.name = v.name
+            """ % (table, table),
+            updates,
+        )
 
-            # Remove from node list (to mark as processed)
-            del nodes[me]
+        # Replace the parents of the subtree records
+        cursor.execute(
+            "delete from %s where child = any(%%s::text[])" % hierarchy, (names,)
+        )
+        cursor.execute(
+            """
+            insert into %s (parent, child, depth)
+            select parent, child, depth
+            from unnest(%%s::text[], %%s::text[], %%s::int[]) as v(parent, child, depth)
+            union all
+            select %s.parent, v.child, %s.depth + v.depth + 1
+            from %s
+            cross join unnest(%%s::text[], %%s::int[]) as v(child, depth)
+            where %s.child = %%s
+            """ % (hierarchy, hierarchy, hierarchy, hierarchy, hierarchy),
+            (
+                *pairs,
+                [i for i, j in zip(pairs[1], pairs[0]) if j == name],
+                [d for d, j in zip(pairs[2], pairs[0]) if j == name],
+                owner,
+            ),
+        )
+        return names
 
-            # Return the right value of this node + 1
-            return right + 1
+    @classmethod
+    def _closeGaps(cls, cursor, table):
+        """
+        Closes the gaps in the lft and rght numbering left behind by moved
+        and deleted records. Every value is replaced with its rank, which
+        shifts the later values down by the width of the gaps before them.
+        """
+        cursor.execute(
+            "select count(*), max(rght) from %s where lft is not null" % table
+        )
+        count, last = cursor.fetchone()
+        if not count or last == 2 * count:
+            # No gaps
+            return
+        cursor.execute("""
+            with ranked(value, rank) as (
+              select value, row_number() over (order by value)
+              from (
+                select lft from %s where lft is not null
+                union all
+                select rght from %s where lft is not null
+              ) as v(value)
+            )
+            update %s
+            set lft = l.rank, rght = r.rank
+            from ranked as l, ranked as r
+            where l.value = %s.lft and r.value = %s.rght
+            and (%s.lft <> l.rank or %s.rght <> r.rank)
+            """ % (table, table, table, table, table, table, table))
 
-        # Load all nodes in memory
-        for i in cls.objects.using(database).values("name", "owner"):
-            if i["name"] == i["owner"]:
-                logging.error("Data error: '%s' points to itself as owner" % i["name"])
-                nodes[i["name"]] = None
-            else:
-                nodes[i["name"]] = i["owner"]
-                if i["owner"]:
-                    if not i["owner"] in children:
-                        children[i["owner"]] = set()
-                    children[i["owner"]].add(i["name"])
-        keys = sorted(nodes.items())
-
-        # Loop over nodes without parent
-        cnt = 1
-        for i, j in keys:
-            if j is None:
-                cnt = tagChildren(i, cnt, 0)
-
-        if nodes:
-            # If the nodes dictionary isn't empty, it is an indication of an
-            # invalid hierarchy.
+    @classmethod
+    def _renumberHierarchy(cls, cursor, table, hierarchy):
+        """
+        Recomputes the lft, rght and lvl fields and the hierarchy table of all
+        records with a single SQL statement.
+        Records in a loop of owners are handled as top level records.
+        """
+        cursor.execute("""
+            with recursive tree(name) as (
+              select name from %s where owner_id is null
+              union all
+              select child.name
+              from %s as child
+              inner join tree on child.owner_id = tree.name
+            )
+            select name, owner_id from %s
+            where not exists (select 1 from tree where tree.name = %s.name)
+            """ % (table, table, table, table))
+        bad = dict(cursor.fetchall())
+        if bad:
             # There are loops in your hierarchy, ie parent-chains not ending
             # at a top-level node without parent.
-            bad = nodes.copy()
-            updated = True
-            while updated:
-                updated = False
-                for i in list(bad.keys()):
-                    ok = True
-                    for j, k in bad.items():
-                        if k == i:
-                            ok = False
-                            break
-                    if ok:
-                        # If none of the bad keys points to me as a parent, I am unguilty
-                        del bad[i]
-                        updated = True
+            # Repeatedly remove the records without child to find them.
+            childcount = {}
+            for parent in bad.values():
+                childcount[parent] = childcount.get(parent, 0) + 1
+            leaves = [i for i in bad if i not in childcount]
+            while leaves:
+                parent = bad.pop(leaves.pop())
+                childcount[parent] -= 1
+                if not childcount[parent]:
+                    leaves.append(parent)
+            for i, j in bad.items():
+                if i == j:
+                    logging.error("Data error: '%s' points to itself as owner" % i)
             logging.error("Data error: Hierarchy loops among %s" % sorted(bad.keys()))
-            for i, j in sorted(bad.items()):
-                children[j].remove(i)
-                nodes[i] = None
 
-            # Continue loop over nodes without parent
-            keys = sorted(nodes.items())
-            for i, j in keys:
-                if j is None:
-                    cnt = tagChildren(i, cnt, 0)
-
-        # Write all results to the database
-        with transaction.atomic(using=database):
-            cursor = connections[database].cursor()
-            execute_batch(
-                cursor,
-                "update %s set lft=%%s, rght=%%s, lvl=%%s where name = %%s"
-                % connections[database].ops.quote_name(cls._meta.db_table),
-                updates,
+        # The left value of a record is derived from its position in a
+        # depth-first walk: every record before it adds 2, except for its
+        # ancestors that add only 1.
+        cursor.execute("delete from %s" % hierarchy)
+        cursor.execute(
+            """
+            with recursive tree(name, lvl, path) as (
+              select name, 0, array[name::text]
+              from %s where owner_id is null or name = any(%%s::text[])
+              union all
+              select child.name, tree.lvl + 1, tree.path || child.name::text
+              from %s as child
+              inner join tree on child.owner_id = tree.name
+              where not child.name = any(%%s::text[])
+            ),
+            numbered as (
+              select name, lvl, 2 * row_number() over (order by path) - lvl - 1 as lft
+              from tree
+            ),
+            sizes as (
+              select unnest(path) as name, count(*) as size from tree group by 1
+            ),
+            renumbered as (
+              update %s
+              set lft = numbered.lft, rght = numbered.lft + 2 * sizes.size - 1,
+                lvl = numbered.lvl
+              from numbered
+              inner join sizes on sizes.name = numbered.name
+              where %s.name = numbered.name
+              and (%s.lft, %s.rght, %s.lvl) is distinct from
+                (numbered.lft, numbered.lft + 2 * sizes.size - 1, numbered.lvl)
             )
+            insert into %s (parent, child, depth)
+            select parents.name, tree.name, tree.lvl + 1 - parents.position
+            from tree
+            cross join unnest(tree.path) with ordinality as parents(name, position)
+            """ % (table, table, table, table, table, table, table, hierarchy),
+            (list(bad), list(bad)),
+        )
 
     @classmethod
     def createRootObject(cls, database=DEFAULT_DB_ALIAS):
@@ -317,13 +539,97 @@ class Parameter(AuditModel):
         verbose_name = _("parameter")
         verbose_name_plural = _("parameters")
 
+    # Parameter values per database, together with the database name that
+    # loaded them and a connection listening for changes.
+    _cache = {}
+    _cachelock = Lock()
+
+    # Listening connections inherited from a parent process. These are kept
+    # around, because closing them would also close them for the parent.
+    _inherited = []
+
     @staticmethod
     def getValue(key, database=DEFAULT_DB_ALIAS, default=None):
+        values = Parameter._getCache(database)
+        if values is not None:
+            return values[key] if key in values else default
         try:
             return Parameter.objects.using(database).only("value").get(pk=key).value
         except Exception:
             return default
 
+    @staticmethod
+    def _getCache(database):
+        """
+        Returns a dictionary with all parameter values, or None when the
+        cache can't be used.
+        A trigger on the table notifies all listening connections when the
+        parameters change. Within a transaction we always read from the
+        database, since the transaction may have changed them itself.
+        The cache is disabled with the PARAMETER_CACHE setting.
+        """
+        if not settings.PARAMETER_CACHE or connections[database].in_atomic_block:
+            return None
+        owner = connections[database].settings_dict["NAME"]
+        with Parameter._cachelock:
+            key, listener, values = Parameter._cache.get(database, (None, None, None))
+            if key != owner:
+                if listener:
+                    listener.close()
+                try:
+                    listener = connections[database].get_new_connection(
+                        connections[database].get_connection_params()
+                    )
+                    listener.autocommit = True
+                    with listener.cursor() as cursor:
+                        cursor.execute("listen common_parameter")
+                except Exception as e:
+                    logger.warning("Parameters aren't cached: %s" % e)
+                    listener = None
+                values = None
+            if not listener:
+                Parameter._cache[database] = (owner, None, None)
+                return None
+            try:
+                listener.poll()
+                if listener.notifies:
+                    listener.notifies.clear()
+                    values = None
+                if values is None:
+                    values = dict(
+                        Parameter.objects.using(database).values_list("name", "value")
+                    )
+            except Exception:
+                # Try again with a new connection next time
+                listener.close()
+                Parameter._cache.pop(database, None)
+                return None
+            Parameter._cache[database] = (owner, listener, values)
+            return values
+
+    @staticmethod
+    def _afterFork():
+        """
+        A forked process opens its own listening connections.
+        """
+        Parameter._cachelock = Lock()
+        for key, listener, values in Parameter._cache.values():
+            if listener:
+                Parameter._inherited.append(listener)
+        Parameter._cache = {}
+
+    @staticmethod
+    def clearCache(database=DEFAULT_DB_ALIAS):
+        """
+        Discards the cached parameter values of this process.
+        Other processes are notified of the change when the transaction that
+        changed the parameters is committed.
+        """
+        with Parameter._cachelock:
+            key, listener, values = Parameter._cache.get(database, (None, None, None))
+            if values is not None:
+                Parameter._cache[database] = (key, listener, None)
+
     def save(
         self, force_insert=False, force_update=False, using=None, update_fields=None
     ):
@@ -385,12 +691,22 @@ class Parameter(AuditModel):
             using=using,
             update_fields=update_fields,
         )
+        Parameter.clearCache(self._state.db or DEFAULT_DB_ALIAS)
 
         if restart_webserver:
             forceWsgiReload()
 
         return ret
 
+    def delete(self, *args, **kwargs):
+        ret = super().delete(*args, **kwargs)
+        Parameter.clearCache(self._state.db or DEFAULT_DB_ALIAS)
+        return ret
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Parameter._afterFork)
+
 
 class Scenario(models.Model):
     scenarioStatus = (("free", _("free")), ("in use", _("in use")), ("busy", _("busy")))
@@ -1354,7 +1670,14 @@ class NotificationFactory:
             p.start()
 
     @classmethod
-    def register(cls, followerclass, messageclasses):
+    def register(cls, followerclass, messageclasses, pk_only=False):
+        """
+        Registers a notification function.
+        The pk_only argument declares that the function only matches
+        followers of the same model as the comment with an equal primary key.
+        Such functions are evaluated in SQL instead of calling them.
+        """
+
         def decorator(func):
             if not inspect.isclass(followerclass):
                 raise Exception("NotificationFactory needs a class as first argument")
@@ -1369,6 +1692,7 @@ class NotificationFactory:
                     cls._reg[m] = [func]
             func.messages = messageclasses
             func.follower = followerclass
+            func.pk_only = pk_only
             return func
 
         return decorator
@@ -1389,6 +1713,47 @@ class NotificationFactory:
                 ):
                     raise e
 
+    # Number of comments processed in a single transaction
+    batch_size = 1000
+
+    @classmethod
+    def _getFollowers(cls, database):
+        """
+        Returns a dictionary with the followers that can be notified of
+        comments on each content type.
+        Followers of all objects of a model are matched in SQL. Followers of
+        the same model as the comment are matched in SQL as well when all
+        notification functions are registered as primary key checks. The
+        other followers are returned together with the notification
+        functions to evaluate.
+        """
+        followers = {}
+        for flw in (
+            Follower.objects.all()
+            .using(database)
+            .filter(user__is_active=True)
+            .select_related("user", "content_type")
+            .order_by("id")
+        ):
+            flwmodel = flw.content_type.model_class()
+            for model, meta in cls._reg.items():
+                funcs = [c for c in meta if flwmodel in c.messages]
+                if not funcs:
+                    continue
+                if "view" in model._meta.default_permissions and not flw.user.has_perm(
+                    "%s.view_%s" % (model._meta.app_label, model._meta.model_name)
+                ):
+                    continue
+                content_type = ContentType.objects.db_manager(database).get_for_model(
+                    model, for_concrete_model=False
+                )
+                if flw.object_pk == "all" or (
+                    flw.content_type == content_type and all(c.pk_only for c in funcs)
+                ):
+                    funcs = None
+                followers.setdefault(content_type.id, []).append((flw, funcs))
+        return followers
+
     @classmethod
     def start(cls, url=None, database=DEFAULT_DB_ALIAS):
         """
@@ -1396,119 +1761,70 @@ class NotificationFactory:
         The worker process is spawned by the multiprocessing module and runs this method.
         """
         cls._buildRegistry()
+        starttime = time.time()
+        processed = 0
+        created = 0
         try:
             from .middleware import _thread_locals
 
             setattr(_thread_locals, "database", database)
-            followers = list(
-                Follower.objects.all()
-                .using(database)
-                .filter(user__is_active=True)
-                .order_by("id")
-            )
+            followers = cls._getFollowers(database)
             idle_loop_done = False
             while True:
                 with transaction.atomic(using=database):
                     empty = True
                     emails = []
-                    if followers:
-                        for msg in (
-                            Comment.objects.all()
-                            .using(database)
-                            .filter(processed=False)
-                            .order_by("id")
-                            .select_related("content_type")
-                            .select_for_update(skip_locked=True, of=("self",))[:50]
-                        ):
-                            empty = False
-                            recipients = set()
-                            try:
-                                created = set()
-                                model = msg.content_type.model_class()
-                                view_permission = (
-                                    "%s.view_%s"
-                                    % (model._meta.app_label, model._meta.model_name)
-                                    if "view" in model._meta.default_permissions
-                                    else None
-                                )
-                                meta = cls._reg.get(model, None)
-                                if meta:
-                                    for flw in followers:
-                                        for c in meta:
-                                            try:
-                                                if (
-                                                    flw.user not in created
-                                                    and flw.content_type.model_class()
-                                                    in c.messages
-                                                    and (
-                                                        flw.object_pk == "all"
-                                                        or c(flw, msg)
-                                                    )
-                                                    and (
-                                                        not view_permission
-                                                        or flw.user.has_perm(
-                                                            view_permission
-                                                        )
-                                                    )
-                                                ):
-                                                    Notification(
-                                                        comment=msg,
-                                                        user=flw.user,
-                                                        type=flw.type,
-                                                        follower=flw,
-                                                    ).save(using=database)
-                                                    if (
-                                                        flw.type == "M"
-                                                        and flw.user.email
-                                                        and settings.EMAIL_HOST
-                                                    ):
-                                                        recipients.add(flw.user.email)
-                                                    created.add(flw.user)
-                                                    break
-                                            except Exception as e:
-                                                logger.error(
-                                                    "Exception in notification function %s: %s"
-                                                    % (c, e)
-                                                )
-                                msg.processed = True
-                                msg.save(update_fields=["processed"], using=database)
-                                if recipients:
-                                    data = msg.getMail(url, database)
-                                    email = mail.EmailMultiAlternatives(
-                                        data[0],
-                                        data[1],
-                                        settings.DEFAULT_FROM_EMAIL,
-                                        recipients,
-                                    )
-                                    if data[2]:
-                                        email.attach_alternative(data[2], "text/html")
-                                    emails.append(email)
-                            except Exception as e:
-                                logger.error(
-                                    "Couldn't create nofications for message %s: %s"
-                                    % (msg.id, e)
-                                )
-                        if emails:
-                            connection = None
-                            try:
-                                connection = mail.get_connection()
-                                connection.open()
-                                connection.send_messages(emails)
-                            except Exception as e:
-                                logger.error("Error mailing messages: %s" % e)
-                            finally:
-                                if connection:
-                                    connection.close()
-                    else:
-                        # No followers at all -> All messages can immediately be marked processed
-                        recs = (
-                            Comment.objects.all()
-                            .using(database)
-                            .filter(processed=False)
-                            .update(processed=True)
+                    with connections[database].cursor() as cursor:
+                        # Comments on models nobody follows are marked processed
+                        cursor.execute(
+                            """
+                            update common_comment set processed = true
+                            where id in (
+                              select id from common_comment
+                              where processed = false
+                              and not content_type_id = any(%s)
+                              for update skip locked
+                              )
+                            """,
+                            (list(followers.keys()),),
                         )
-                        if recs:
+                        if cursor.rowcount > 0:
                             empty = False
+                            processed += cursor.rowcount
+
+                        cursor.execute(
+                            """
+                            select id, content_type_id from common_comment
+                            where processed = false
+                            order by id
+                            limit %s
+                            for update skip locked
+                            """,
+                            (cls.batch_size,),
+                        )
+                        batch = cursor.fetchall()
+                    if batch:
+                        empty = False
+                        created += cls._notify(
+                            [i[0] for i in batch],
+                            [i for i in batch if i[1] in followers],
+                            followers,
+                            emails,
+                            url,
+                            database,
+                        )
+                        processed += len(batch)
+                    if emails:
+                        connection = None
+                        try:
+                            connection = mail.get_connection()
+                            connection.open()
+                            connection.send_messages(emails)
+                        except Exception as e:
+                            logger.error("Error mailing messages: %s" % e)
+                        finally:
+                            if connection:
+                                connection.close()
                     if empty:
                         if idle_loop_done:
                             break
@@ -1521,6 +1837,134 @@ class NotificationFactory:
                                 time.sleep(5)
         finally:
             connections[database].close()
+            if processed:
+                duration = time.time() - starttime
+                logger.info(
+                    "Notification worker processed %d comments and created %d notifications in %.2f seconds, %.0f comments per second"
+                    % (processed, created, duration, processed / max(duration, 0.001))
+                )
+
+    @classmethod
+    def _notify(cls, ids, batch, followers, emails, url, database):
+        """
+        Creates the notifications for a batch of comments, and marks them
+        processed. Returns the number of notifications created.
+        """
+        # Evaluate the notification functions for the followers that need it
+        candidates = ([], [])
+        todo = [i for i, ct in batch if any(f[1] for f in followers[ct])]
+        if todo:
+            for msg in (
+                Comment.objects.all()
+                .using(database)
+                .filter(id__in=todo)
+                .select_related("content_type")
+            ):
+                try:
+                    for flw, funcs in followers[msg.content_type_id]:
+                        if not funcs:
+                            continue
+                        for c in funcs:
+                            try:
+                                if c(flw, msg):
+                                    candidates[0].append(msg.id)
+                                    candidates[1].append(flw.id)
+                                    break
+                            except Exception as e:
+                                logger.error(
+                                    "Exception in notification function %s: %s" % (c, e)
+                                )
+                except Exception as e:
+                    logger.error(
+                        "Couldn't create nofications for message %s: %s" % (msg.id, e)
+                    )
+
+        # The other followers are matched in SQL.
+        # Every user gets a single notification per comment, from the first
+        # follower that matches.
+        users = {}
+        for lst in followers.values():
+            for flw, funcs in lst:
+                users[flw.id] = flw.user
+        with connections[database].cursor() as cursor:
+            cursor.execute(
+                """
+                with candidates as (
+                  select common_comment.id as comment_id, common_follower.id as follower_id
+                  from common_comment
+                  inner join unnest(%s::int[], %s::int[])
+                    as allowed(follower_id, content_type_id)
+                    on allowed.content_type_id = common_comment.content_type_id
+                  inner join common_follower
+                    on common_follower.id = allowed.follower_id
+                  where common_comment.id = any(%s)
+                  and (
+                    common_follower.object_pk = 'all'
+                    or (
+                      common_follower.content_type_id = common_comment.content_type_id
+                      and common_follower.object_pk = common_comment.object_pk
+                      )
+                    )
+                  union all
+                  select comment_id, follower_id
+                  from unnest(%s::int[], %s::int[]) as evaluated(comment_id, follower_id)
+                  )
+                insert into common_notification
+                  (comment_id, user_id, status, type, follower_id)
+                select distinct on (candidates.comment_id, common_follower.user_id)
+                  candidates.comment_id, common_follower.user_id, 'U',
+                  common_follower.type, common_follower.id
+                from candidates
+                inner join common_follower
+                  on common_follower.id = candidates.follower_id
+                order by candidates.comment_id, common_follower.user_id, common_follower.id
+                returning comment_id, follower_id, type
+                """,
+                (
+                    [f[0].id for ct, lst in followers.items() for f in lst if not f[1]],
+                    [ct for ct, lst in followers.items() for f in lst if not f[1]],
+                    [i for i, ct in batch],
+                    candidates[0],
+                    candidates[1],
+                ),
+            )
+            recipients = {}
+            count = 0
+            for comment_id, follower_id, flwtype in cursor.fetchall():
+                count += 1
+                if flwtype == "M" and users[follower_id].email and settings.EMAIL_HOST:
+                    recipients.setdefault(comment_id, set()).add(
+                        users[follower_id].email
+                    )
+            cursor.execute(
+                "update common_comment set processed = true where id = any(%s)",
+                (ids,),
+            )
+
+        # Prepare the emails
+        if recipients:
+            for msg in (
+                Comment.objects.all()
+                .using(database)
+                .filter(id__in=recipients.keys())
+                .select_related("content_type")
+            ):
+                try:
+                    data = msg.getMail(url, database)
+                    email = mail.EmailMultiAlternatives(
+                        data[0],
+                        data[1],
+                        settings.DEFAULT_FROM_EMAIL,
+                        recipients[msg.id],
+                    )
+                    if data[2]:
+                        email.attach_alternative(data[2], "text/html")
+                    emails.append(email)
+                except Exception as e:
+                    logger.error(
+                        "Couldn't create nofications for message %s: %s" % (msg.id, e)
+                    )
+        return count
 
     @classmethod
     def join(cls):
@@ -24,7 +24,7 @@
 from .models import NotificationFactory, User, Bucket, BucketDetail, Parameter
 
 
-@NotificationFactory.register(User, [User])
+@NotificationFactory.register(User, [User], pk_only=True)
 def UserNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
@@ -39,11 +39,11 @@ def BucketNotification(flw, msg):
         return False
 
 
-@NotificationFactory.register(BucketDetail, [BucketDetail])
+@NotificationFactory.register(BucketDetail, [BucketDetail], pk_only=True)
 def BucketDetailNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(Parameter, [Parameter])
+@NotificationFactory.register(Parameter, [Parameter], pk_only=True)
 def ParameterNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
@@ -74,7 +74,11 @@ from django.views.decorators.csrf import csrf_protect
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.admin.utils import unquote, quote
-from django.core.exceptions import ValidationError
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
 from django.core.management.color import no_style
 from django.db import connections, transaction, models
 from django.db.models.fields import CharField, AutoField, DateField, DateTimeField
@@ -113,7 +117,11 @@ from freppledb.common.localization import (
     parseLocalizedDateTime,
     parseInterval,
 )
-from freppledb.common.utils import getStorageUsage, get_databases
+from freppledb.common.utils import (
+    getStorageUsage,
+    get_databases,
+    invalidateReportCache,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -154,10 +162,8 @@ class IsChildOfLookup(Lookup):
         return (
             """
         %s in
-        (select child.name from %s owner
-        inner join %s child on child.lft between owner.lft and owner.rght
-        where owner.name = %s)
-        """ % (lhs, objectModel, objectModel, rhs),
+        (select child from %s_hierarchy where parent = %s)
+        """ % (lhs, objectModel, rhs),
             params,
         )
 
@@ -1592,11 +1598,10 @@ class GridReport(View):
         query = cls._apply_sort(request, request.query)
         if page:
             # Display a single page
-            cnt = (page - 1) * request.pagesize + 1
             if hasattr(cls, "query"):
-                return cls.query(request, query[cnt - 1 : cnt + request.pagesize])
+                return cls.query(request, cls._getPage(request, query, page))
             else:
-                return query[cnt - 1 : cnt + request.pagesize].values(*fields)
+                return cls._getPage(request, query, page).values(*fields)
         else:
             limit = getattr(request, "limit", 0)
             if limit:
@@ -1625,13 +1630,207 @@ class GridReport(View):
                     request.database
                 )
 
-        tmp = request.query.query.get_compiler(request.database).as_sql(
+        return cls._count(request, request.query)
+
+    @classmethod
+    def _getCacheKey(cls, request, query, *args):
+        """
+        Returns a cache key for the results of a query.
+        The key includes the version of the data of the scenario. The version
+        is a sequence in the database, so that a change through the reports
+        invalidates the keys in all processes.
+        """
+        sql, params = query.query.get_compiler(request.database).as_sql(
             with_col_aliases=False
         )
+        version = getattr(request, "reportversion", None)
+        if version is None:
+            with connections[request.database].cursor() as cursor:
+                cursor.execute("select last_value, is_called from common_reportversion")
+                version = cursor.fetchone()
+            request.reportversion = version
+        return (
+            "report_%s"
+            % sha1(
+                repr(
+                    (
+                        request.database,
+                        version,
+                        sql,
+                        params,
+                        args,
+                    )
+                ).encode("utf-8")
+            ).hexdigest()
+        )
+
+    @classmethod
+    def _invalidateCache(cls, request):
+        invalidateReportCache(request.database)
+
+    @classmethod
+    def _count(cls, request, query):
+        """
+        Counts the records of a query.
+        The result is cached for a short time, so paging through a report
+        doesn't count all records again for every page.
+        """
+        try:
+            sql, params = query.query.get_compiler(request.database).as_sql(
+                with_col_aliases=False
+            )
+        except EmptyResultSet:
+            return 0
+        key = None
+        if settings.REPORT_CACHE_TIMEOUT:
+            key = cls._getCacheKey(request, query, "count")
+            recs = cache.get(key)
+            if recs is not None:
+                return recs
         with connections[request.database].cursor() as cursor:
-            cursor.execute("select count(*) from (" + tmp[0] + ") t_subquery", tmp[1])
-            cache_val = cursor.fetchone()[0]
-            return cache_val
+            cursor.execute("select count(*) from (" + sql + ") t_subquery", params)
+            recs = cursor.fetchone()[0]
+        if key:
+            cache.set(key, recs, timeout=settings.REPORT_CACHE_TIMEOUT)
+        return recs
+
+    @classmethod
+    def _getSortKeys(cls, query):
+        """
+        Returns a list of (field, descending) tuples with the sort order of a
+        query, completed with the primary key to make it unique.
+        Returns None when the sort order isn't suited for keyset pagination.
+        """
+        if query.model._meta.pk.is_relation:
+            return None
+        ordering = query.query.order_by or query.model._meta.ordering
+        keys = []
+        for o in ordering:
+            if not isinstance(o, str) or o == "?":
+                return None
+            desc = o.startswith("-")
+            path = o.lstrip("-")
+            opts = query.model._meta
+            parts = path.split("__")
+            for idx, part in enumerate(parts):
+                if part == "pk":
+                    part = opts.pk.name
+                try:
+                    f = opts.get_field(part)
+                except FieldDoesNotExist:
+                    if (
+                        idx == 0
+                        and part in query.query.annotations
+                        and not query.query.annotations[part].contains_aggregate
+                    ):
+                        break
+                    return None
+                if f.is_relation:
+                    # Sorting on a relation uses the ordering of the related model
+                    if idx == len(parts) - 1 or f.many_to_many or f.one_to_many:
+                        return None
+                    opts = f.related_model._meta
+            keys.append((path, desc))
+        if not any(k[0] in ("pk", query.model._meta.pk.name) for k in keys):
+            keys.append(("pk", False))
+        return keys
+
+    @classmethod
+    def _seek(cls, keys, values):
+        """
+        Returns a filter on the records sorted after the record with the given
+        values of the sort keys. PostgreSQL sorts null values last in
+        ascending order, and first in descending order.
+        """
+        after = []
+        equal = models.Q()
+        for (path, desc), value in zip(keys, values):
+            if desc:
+                if value is None:
+                    after.append(equal & models.Q(**{"%s__isnull" % path: False}))
+                else:
+                    after.append(equal & models.Q(**{"%s__lt" % path: value}))
+            elif value is not None:
+                after.append(
+                    equal
+                    & (
+                        models.Q(**{"%s__gt" % path: value})
+                        | models.Q(**{"%s__isnull" % path: True})
+                    )
+                )
+            if value is None:
+                equal &= models.Q(**{"%s__isnull" % path: True})
+            else:
+                equal &= models.Q(**{path: value})
+        return functools.reduce(operator.or_, after) if after else None
+
+    @classmethod
+    def _getPage(cls, request, query, page):
+        """
+        Returns the records of a page of a sorted queryset.
+
+        Retrieving a deep page with an offset is slow, because the database
+        needs to skip all records of the preceding pages. The sort key of the
+        last record of a page is cached, and the next page is retrieved with a
+        filter on the sort key instead. A page after an uncached one is found
+        by skipping records from the closest cached page, or from the end of
+        the report.
+        """
+        cnt = (page - 1) * request.pagesize
+        keys = (
+            cls._getSortKeys(query)
+            if settings.REPORT_CACHE_TIMEOUT and page > 1
+            else None
+        )
+        if not keys:
+            return query[cnt : cnt + request.pagesize]
+        query = query.order_by(*[("-%s" % k[0]) if k[1] else k[0] for k in keys])
+        try:
+            key = cls._getCacheKey(request, query, request.pagesize)
+        except EmptyResultSet:
+            return query.none()
+        paths = [k[0] for k in keys]
+
+        # Find the last record of the previous page.
+        # When it isn't cached yet, we skip records from the closest cached
+        # page before it, or from the end of the report if that is closer.
+        bookmarks = cache.get(key) or {}
+        bookmark = bookmarks.get(page - 1)
+        if bookmark is None:
+            start = max((p for p in bookmarks if p < page - 1), default=0)
+            skip = (page - 1 - start) * request.pagesize - 1
+            records = getattr(request, "records", None)
+            if records is not None and records - cnt < skip:
+                bookmark = (
+                    query.reverse()
+                    .values_list(*paths)[records - cnt : records - cnt + 1]
+                    .first()
+                )
+            else:
+                seek = cls._seek(keys, bookmarks[start]) if start else None
+                if start and seek is None:
+                    return query.none()
+                bookmark = (
+                    (query.filter(seek) if seek is not None else query)
+                    .values_list(*paths)[skip : skip + 1]
+                    .first()
+                )
+            if bookmark is None:
+                return query.none()
+        seek = cls._seek(keys, bookmark)
+        if seek is None:
+            return query.none()
+        query = query.filter(seek)
+
+        # Remember the last record of this page
+        bookmarks[page - 1] = bookmark
+        last = query.values_list(*paths)[
+            request.pagesize - 1 : request.pagesize
+        ].first()
+        if last is not None:
+            bookmarks[page] = last
+        cache.set(key, bookmarks, timeout=settings.REPORT_CACHE_TIMEOUT)
+        return query[: request.pagesize]
 
     @classmethod
     def _generate_json_data(cls, request, *args, **kwargs):
@@ -1639,6 +1838,8 @@ class GridReport(View):
             cls.getKey(request, *args, **kwargs), database=request.database
         )
         recs = cls.count_query(request, *args, **kwargs)
+        # Allows seeking deep pages from the end of the report
+        request.records = recs
         if "rows" in request.GET:
             try:
                 request.pagesize = max(int(request.GET["rows"]), 25)
@@ -2072,6 +2273,8 @@ class GridReport(View):
             request.read().decode(request.encoding or settings.DEFAULT_CHARSET)
         )
         with transaction.atomic(using=request.database, savepoint=False):
+            # Cached record counts and page positions become invalid
+            cls._invalidateCache(request)
             content_type_id = ContentType.objects.get_for_model(
                 cls.model, for_concrete_model=False
             ).pk
@@ -2568,6 +2771,9 @@ class GridReport(View):
         # Handle the complete upload as a single database transaction
         try:
             with transaction.atomic(using=request.database):
+                # Cached record counts and page positions become invalid
+                cls._invalidateCache(request)
+
                 # Erase all records and related tables
                 if "erase" in request.POST:
                     returnvalue = cls.erase(request)
@@ -2695,6 +2901,9 @@ class GridReport(View):
         # Handle the complete upload as a single database transaction
         try:
             with transaction.atomic(using=request.database):
+                # Cached record counts and page positions become invalid
+                cls._invalidateCache(request)
+
                 # Erase all records and related tables
                 if "erase" in request.POST:
                     returnvalue = cls.erase(request)
@@ -3434,8 +3643,9 @@ class GridPivot(GridReport):
                 request.basequery = cls.basequeryset
             if args and args[0] and not cls.new_arg_logic:
                 request.basequery = request.basequery.filter(pk__exact=args[0])
-        return (
-            cls.filter_items(request, request.basequery).using(request.database).count()
+        return cls._count(
+            request,
+            cls.filter_items(request, request.basequery).using(request.database),
         )
 
     @classmethod
@@ -3450,12 +3660,15 @@ class GridPivot(GridReport):
             if args and args[0] and not cls.new_arg_logic:
                 request.basequery = request.basequery.filter(pk__exact=args[0])
         if page:
-            cnt = (page - 1) * request.pagesize + 1
             return cls.query(
                 request,
-                cls._apply_sort(
-                    request, cls.filter_items(request, request.basequery)
-                ).using(request.database)[cnt - 1 : cnt + request.pagesize],
+                cls._getPage(
+                    request,
+                    cls._apply_sort(
+                        request, cls.filter_items(request, request.basequery)
+                    ).using(request.database),
+                    page,
+                ),
                 sortsql=cls._apply_sort_index(request),
             )
         else:
@@ -3474,6 +3687,8 @@ class GridPivot(GridReport):
             cls.getKey(request, *args, **kwargs), database=request.database
         )
         recs = cls.count_query(request, *args, **kwargs)
+        # Allows seeking deep pages from the end of the report
+        request.records = recs
         page = "page" in request.GET and int(request.GET["page"]) or 1
         if "rows" in request.GET:
             try:
@@ -21,11 +21,14 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+from datetime import datetime, timedelta
 import os
 
+from django.db import connection
 from django.http.response import StreamingHttpResponse
 from django.test import TestCase
 
+from freppledb.common.commands import copy_rows
 from freppledb.common.models import User, Scenario
 
 
@@ -77,3 +80,55 @@ class AppsAndAboutTest(TestCase):
         self.assertEqual(response.status_code, 200)
         response = self.client.get("/about/")
         self.assertEqual(response.status_code, 200)
+
+
+class CopyRowsTest(TestCase):
+    def test_binary_and_text_format(self):
+        rows = [
+            (
+                "a\\b\nc",
+                round(i * 1234.56789 - 5000, 8),
+                datetime(2024, 3, 31, 1, 30) + timedelta(hours=i),
+                i * 3600,
+                i % 2 == 0,
+                '{"pegging": {"a\\\\b": %s}}' % i,
+            )
+            for i in range(50)
+        ]
+        rows.append((None, None, None, None, None, None))
+        columns = ("name", "quantity", "startdate", "delay", "flag", "plan")
+        with connection.cursor() as cursor:
+            for tbl in ("tmp_binary", "tmp_text"):
+                cursor.execute(
+                    """
+                    create temporary table %s (
+                      name character varying,
+                      quantity numeric(20,8),
+                      startdate timestamp with time zone,
+                      delay interval,
+                      flag boolean,
+                      plan jsonb
+                      )
+                    """
+                    % tbl
+                )
+            self.assertEqual(
+                copy_rows(cursor, "tmp_binary", columns, rows, binary=True), 51
+            )
+            self.assertEqual(
+                copy_rows(cursor, "tmp_text", columns, rows, binary=False), 51
+            )
+            cursor.execute(
+                """
+                select count(*) from (
+                  (select * from tmp_binary except all select * from tmp_text)
+                  union all
+                  (select * from tmp_text except all select * from tmp_binary)
+                  ) d
+                """
+            )
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute("select name, plan from tmp_binary where name is not null")
+            for rec in cursor.fetchall():
+                self.assertEqual(rec[0], "a\\b\nc")
+                self.assertEqual(list(rec[1]["pegging"].keys()), ["a\\b"])
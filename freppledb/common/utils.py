@@ -32,7 +32,7 @@ import tokenize
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.db import connections, DEFAULT_DB_ALIAS
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
 from django.template import Template, Context
 
 
@@ -227,6 +227,22 @@ def sendEmail(to, subject, body, body_html=None, send=True, **context):
         return msg
 
 
+def invalidateReportCache(database=DEFAULT_DB_ALIAS):
+    """
+    Invalidates the cached record counts and page positions of the reports
+    of a scenario, in all processes.
+    This is done once the current transaction is committed. Invalidating
+    them earlier would allow a concurrent request to cache values from
+    before the change.
+    """
+
+    def newVersion():
+        with connections[database].cursor() as cursor:
+            cursor.execute("select nextval('common_reportversion')")
+
+    transaction.on_commit(newVersion, using=database)
+
+
 def vacuumAnalyze(cursor):
     """
     This method runs vacuum analyze on all tables in the public schema.
@@ -39,6 +39,7 @@ logger = logging.getLogger(__name__)
 class CheckBuckets(PlanTask):
     description = "Generation of time buckets"
     sequence = 3
+    warmup = True
 
     @classmethod
     def getWeight(cls, database=DEFAULT_DB_ALIAS, **kwargs):
@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime, timedelta
+import json
+import random
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS, transaction
+
+from freppledb.common.commands import copy_rows
+from freppledb import __version__
+
+
+class Command(BaseCommand):
+    help = """
+        This command measures the throughput of the plan export.
+
+        It exports the same synthetic operationplan and operationplanmaterial
+        records with the text and the binary COPY format into temporary tables,
+        and reports the number of rows per second of each format.
+        """
+
+    requires_system_checks = []
+
+    def get_version(self):
+        return __version__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Nominates a specific database to run the benchmark on",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000000,
+            help="Number of records to export per table (default: 1000000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Number of times to repeat each measurement (default: 1)",
+        )
+
+    def handle(self, **options):
+        database = options["database"]
+        rows = options["rows"]
+        random.seed(1)
+        now = datetime.now().replace(microsecond=0)
+
+        tables = [
+            (
+                "operationplanmaterial",
+                """
+                operationplan_id character varying,
+                item_id character varying,
+                location_id character varying,
+                quantity numeric(20,8),
+                flowdate timestamp with time zone,
+                onhand numeric(20,8),
+                minimum numeric(20,8),
+                periodofcover numeric(20,8),
+                status character varying,
+                lastmodified timestamp with time zone
+                """,
+                [
+                    (
+                        str(i),
+                        "item %s" % (i % 1000),
+                        "location %s" % (i % 10),
+                        round(random.uniform(-100, 100), 8),
+                        now + timedelta(hours=i % 10000),
+                        round(random.uniform(0, 1000), 8),
+                        round(random.uniform(0, 10), 8),
+                        round(random.uniform(0, 86400 * 30), 8),
+                        "proposed",
+                        now,
+                    )
+                    for i in range(rows)
+                ],
+            ),
+            (
+                "operationplan",
+                """
+                reference character varying,
+                name character varying,
+                type character varying,
+                status character varying,
+                quantity numeric(20,8),
+                startdate timestamp with time zone,
+                enddate timestamp with time zone,
+                criticality numeric(20,8),
+                delay interval,
+                plan jsonb,
+                lastmodified timestamp with time zone,
+                item_id character varying,
+                location_id character varying,
+                due timestamp with time zone
+                """,
+                [
+                    (
+                        str(i),
+                        "operation %s" % (i % 5000),
+                        "MO",
+                        "proposed",
+                        round(random.uniform(1, 100), 8),
+                        now + timedelta(hours=i % 10000),
+                        now + timedelta(hours=i % 10000 + 8),
+                        round(random.uniform(0, 100), 8),
+                        random.randint(0, 86400 * 5),
+                        json.dumps(
+                            {
+                                "pegging": {"demand %s" % (i % 20000): 1.0},
+                                "downstream_opplans": [[str(i + 1), 1.0, 0]],
+                                "upstream_opplans": [[str(i - 1), 1.0, 0]],
+                                "unavailable": 0,
+                                "interruptions": [],
+                            }
+                        ),
+                        now,
+                        "item %s" % (i % 1000),
+                        "location %s" % (i % 10),
+                        now + timedelta(days=i % 100),
+                    )
+                    for i in range(rows)
+                ],
+            ),
+        ]
+
+        self.stdout.write(
+            "%-24s %-8s %12s %10s %12s"
+            % ("table", "format", "rows", "seconds", "rows/sec")
+        )
+        with transaction.atomic(using=database):
+            with connections[database].cursor() as cursor:
+                for table, fields, data in tables:
+                    cursor.execute(
+                        "create temporary table benchmark_%s (%s) on commit drop"
+                        % (table, fields)
+                    )
+                    columns = [
+                        f.strip().split()[0] for f in fields.split(",") if f.strip()
+                    ]
+                    result = {}
+                    for fmt in ("text", "binary"):
+                        best = None
+                        for r in range(options["repeat"]):
+                            cursor.execute("truncate table benchmark_%s" % table)
+                            starttime = time()
+                            cnt = copy_rows(
+                                cursor,
+                                "benchmark_%s" % table,
+                                columns,
+                                iter(data),
+                                binary=(fmt == "binary"),
+                            )
+                            duration = time() - starttime
+                            if best is None or duration < best:
+                                best = duration
+                        result[fmt] = cnt / best if best else 0
+                        self.stdout.write(
+                            "%-24s %-8s %12d %10.2f %12.0f"
+                            % (table, fmt, cnt, best, result[fmt])
+                        )
+                    if result["text"]:
+                        self.stdout.write(
+                            "%-24s speedup of binary format: %.2fx"
+                            % (table, result["binary"] / result["text"])
+                        )
@@ -265,8 +265,11 @@ class Command(BaseCommand):
                 tables.add("operationplanmaterial")
                 tables.add("operationplanresource")
                 tables.add("out_problem")
+                tables.add("out_pegging")
             if "resource" in tables and "out_resourceplan" not in tables:
                 tables.add("out_resourceplan")
+            if "out_resourceplan" in tables:
+                tables.add("out_resourceplanbucket")
             if "freppledb.forecast" in settings.INSTALLED_APPS:
                 if "forecast" in tables:
                     tables.add("forecastplan")
@@ -295,6 +298,7 @@ class Command(BaseCommand):
             tables.discard("common_preference")
             tables.discard("django_content_type")
             tables.discard("execute_log")
+            tables.discard("execute_profile")
             tables.discard("execute_schedule")
             tables.discard("execute_export")
             tables.discard("common_scenario")
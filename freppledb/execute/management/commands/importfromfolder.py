@@ -22,6 +22,7 @@
 #
 
 import codecs
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from time import localtime, strftime
 import csv
@@ -81,6 +82,13 @@ class Command(BaseCommand):
             "--files",
             help="Comma-separated list of file names to import (default: all)",
         )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.IMPORT_THREADS,
+            help="Number of copy files uploaded in parallel (default: %s)"
+            % settings.IMPORT_THREADS,
+        )
 
     def get_version(self):
         return __version__
@@ -150,9 +158,12 @@ class Command(BaseCommand):
                     user=self.user,
                     logfile=logfile,
                 )
-            task.arguments = (
-                f"--files={options.get('files')}" if options.get("files") else ""
-            )
+            arguments = []
+            if options.get("files"):
+                arguments.append(f"--files={options['files']}")
+            if (options.get("threads") or 1) > 1:
+                arguments.append(f"--threads={options['threads']}")
+            task.arguments = " ".join(arguments)
             task.processid = os.getpid()
             task.save(using=self.database)
 
@@ -265,7 +276,19 @@ class Command(BaseCommand):
                     ).lower()
                     == "true"
                 )
+                threads = max(options.get("threads") or 1, 1)
+                copyfiles = []
                 for ifile, model, contenttype_id, dependencies in models:
+                    if threads > 1 and ifile.lower().endswith((".cpy", ".cpy.gz")):
+                        # Consecutive copy files are uploaded in parallel
+                        copyfiles.append((ifile, model, contenttype_id, dependencies))
+                        continue
+                    if copyfiles:
+                        errors[0] += self.executeCOPYfiles(
+                            copyfiles, threads, task, i, cnt
+                        )
+                        i += len(copyfiles)
+                        copyfiles = []
                     task.status = str(int(i / cnt * 100)) + "%"
                     task.message = "Processing data file %s" % ifile
                     task.save(using=self.database)
@@ -315,6 +338,8 @@ class Command(BaseCommand):
                             "Finished processing data in CSV file %s in %s"
                             % (ifile, timesince(starting))
                         )
+                if copyfiles:
+                    errors[0] += self.executeCOPYfiles(copyfiles, threads, task, i, cnt)
             else:
                 cnt = 0
                 logger.error("Failed, folder does not exist")
@@ -403,28 +428,17 @@ class Command(BaseCommand):
                 else:
                     raise Exception("Invalid field name '%s'" % col)
 
-            # count how many records in table before the copy operation
-            cursor.execute("select count(*) from %s" % tableName)
-            countBefore = cursor.fetchone()[0]
-
-            # Load the data records
-            copyFile = file_open(ifile)
-            cursor.copy_expert(
-                "copy %s (%s) from STDIN with delimiter ',' csv header"
-                % (tableName, ",".join(headers)),
-                copyFile,
-            )
-
-            # count how many records in table after the copy operation
-            cursor.execute("select count(*) from %s" % tableName)
-            countAfter = cursor.fetchone()[0]
+            # Load the data records.
+            # The row count of the copy command tells how many records are uploaded.
+            with file_open(ifile) as copyFile:
+                cursor.copy_expert(
+                    "copy %s (%s) from STDIN with delimiter ',' csv header"
+                    % (tableName, ",".join(headers)),
+                    copyFile,
+                )
 
             logger.info(
-                "%s records uploaded into table %s"
-                % (
-                    (countAfter - countBefore),
-                    tableName,
-                )
+                "%s records uploaded into table %s" % (cursor.rowcount, tableName)
             )
             return 0
 
@@ -436,6 +450,61 @@ class Command(BaseCommand):
             # connection in the restricted role.
             connections[self.database].close()
 
+    def executeCOPYfiles(self, files, threads, task, progress, cnt):
+        """
+        Upload a list of copy files in parallel threads. Each thread uses its
+        own database connection.
+        A file is uploaded only after the files of the models it refers to,
+        and the earlier files of the same model.
+        Returns the number of errors.
+        """
+        folder = os.path.abspath(get_databases()[self.database]["FILEUPLOADFOLDER"])
+
+        def upload(ifile, model):
+            starting = datetime.now()
+            logger.info("Started uploading copy file: %s" % ifile)
+            err = self.executeCOPYfile(model, os.path.join(folder, ifile))
+            logger.info(
+                "Finished uploading copy file %s in %s" % (ifile, timesince(starting))
+            )
+            return err
+
+        # Build the dependency graph between the files
+        predecessors = [
+            {
+                j
+                for j in range(idx)
+                if files[j][1] == files[idx][1] or files[idx][1] in files[j][3]
+            }
+            for idx in range(len(files))
+        ]
+
+        errors = 0
+        waiting = list(range(len(files)))
+        running = {}
+        finished = set()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while waiting or running:
+                # Start all files which have their dependencies uploaded
+                for idx in list(waiting):
+                    if len(running) >= threads:
+                        break
+                    if predecessors[idx] <= finished:
+                        waiting.remove(idx)
+                        running[pool.submit(upload, files[idx][0], files[idx][1])] = idx
+                        task.message = "Processing data file %s" % files[idx][0]
+                if not running:
+                    break
+                task.status = str(int((progress + len(finished)) / cnt * 100)) + "%"
+                task.save(using=self.database)
+
+                # Wait for the next file to finish
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    finished.add(running.pop(f))
+                    errors += f.result()
+        return errors
+
     def executeSQLfile(self, ifile):
         """
         Execute statements from a text with SQL statements.
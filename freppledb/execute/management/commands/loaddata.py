@@ -32,7 +32,12 @@ from django.db import connections, transaction, DEFAULT_DB_ALIAS
 from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 
-from freppledb.common.models import User, addAttributesFromDatabase
+from freppledb.common.models import (
+    HierarchyModel,
+    Parameter,
+    User,
+    addAttributesFromDatabase,
+)
 from freppledb.common.middleware import _thread_locals
 from freppledb.common.report import getCurrentDate
 from freppledb.common.utils import get_databases
@@ -144,6 +149,11 @@ class Command(loaddata.Command):
 
                 ForecastPlan.refreshTableColumns(database)
 
+            # Fixtures can contain records with lft, rght and lvl values
+            for m in apps.get_models():
+                if issubclass(m, HierarchyModel):
+                    m.rebuildHierarchy(database=database, force=True)
+
             # if the fixture doesn't contain the 'demo' word, let's not apply loaddata post-treatments
             if "FREPPLE_TEST" in os.environ:
                 return
@@ -168,6 +178,7 @@ class Command(loaddata.Command):
                     update common_parameter set value = 'today' where name = 'currentdate'
                     """
                 )
+                Parameter.clearCache(database)
 
                 # update demand due dates
                 cursor.execute(
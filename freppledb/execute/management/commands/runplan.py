@@ -42,6 +42,7 @@ from freppledb.common.middleware import _thread_locals
 from freppledb.common.models import User
 from freppledb.common.report import GridReport
 from freppledb.execute.models import Task
+from freppledb.execute.warmengine import launchEngine, submitPlan
 from freppledb.common.utils import get_databases
 from freppledb import __version__
 
@@ -341,7 +342,15 @@ class Command(BaseCommand):
                 os.environ["DJANGO_SETTINGS_MODULE"] = "freppledb.settings"
             os.environ["PYTHONPATH"] = os.path.normpath(settings.FREPPLE_APP)
 
-            if options["background"] or options["daemon"]:
+            warm = None
+            if settings.WARM_ENGINE and task.name == "runplan":
+                warm = submitPlan(database)
+            if warm:
+                # The plan runs in a process forked from the warm engine
+                if not options["background"] and not options["daemon"]:
+                    while self.process_exists(warm):
+                        sleep(1)
+            elif options["background"] or options["daemon"]:
                 subprocess.Popen(["frepple", cmd], preexec_fn=setlimits)
             else:
                 ret = subprocess.call(["frepple", cmd], preexec_fn=setlimits)
@@ -349,6 +358,8 @@ class Command(BaseCommand):
                     # Return code 0 is a successful run
                     # Return code is 2 is a run cancelled by a user. That's shown in the status field.
                     raise Exception("Failed with exit code %d" % ret)
+            if settings.WARM_ENGINE and task.name == "runplan" and not warm:
+                launchEngine(database, preexec_fn=setlimits)
 
             if options["background"]:
                 # Wait for the background task to be ready
@@ -365,6 +376,8 @@ class Command(BaseCommand):
             else:
                 # Reread the task from the database and update it
                 task = Task.objects.all().using(database).get(pk=task.id)
+                if warm and task.status == "Failed":
+                    raise Exception("Failed in warm engine process %d" % warm)
                 task.processid = None
                 task.status = "Done"
                 task.finished = datetime.now()
@@ -39,6 +39,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import DEFAULT_DB_ALIAS, connections
 
 from freppledb import __version__, runCommand
+from freppledb.common.commands import PlanWriteLock
 from freppledb.common.models import Parameter
 from freppledb.common.middleware import _thread_locals
 from freppledb.common.utils import get_databases
@@ -194,6 +195,111 @@ def runTask(task, database):
             )
 
 
+class TaskThread(Thread):
+    """
+    Thread running a task and waiting for it to finish.
+    """
+
+    def __init__(self, task, database=DEFAULT_DB_ALIAS):
+        super().__init__(name="task %s" % task.id)
+        self.task = task
+        self.database = database
+        self.concurrent = task.name in settings.WORKER_CONCURRENT_TASKS
+
+    def run(self):
+        setattr(_thread_locals, "database", self.database)
+        task = self.task
+        database = self.database
+        lock = None
+        try:
+            if self.concurrent:
+                # Concurrent tasks read the plan, and don't run while a plan
+                # run is writing it
+                lock = PlanWriteLock.acquireShared(database)
+            if "FREPPLE_TEST" not in os.environ:
+                logger.debug(
+                    "Worker %s for database '%s' starting task %d at %s"
+                    % (
+                        os.getpid(),
+                        get_databases()[database]["NAME"],
+                        task.id,
+                        datetime.now(),
+                    )
+                )
+            runTask(task, database)
+        except Exception as e:
+            try:
+                # Read the task again from the database and update.
+                task = Task.objects.all().using(database).get(pk=task.id)
+                task.status = "Failed"
+                now = datetime.now()
+                if not task.started:
+                    task.started = now
+                task.finished = now
+                task.message = str(e)
+                task.save(using=database)
+                if "FREPPLE_TEST" not in os.environ:
+                    logger.debug(
+                        "Worker %s for database '%s' finished task %d at %s: failed"
+                        % (
+                            os.getpid(),
+                            get_databases()[database]["NAME"],
+                            task.id,
+                            datetime.now(),
+                        )
+                    )
+            except Exception:
+                # It's possible the database is release by now and we can't updte the task
+                pass
+        finally:
+            if lock:
+                lock.close()
+            connections.close_all()
+
+
+def getSlots(database=DEFAULT_DB_ALIAS):
+    """
+    Returns the number of tasks that can run at the same time in a scenario.
+    The WORKER_SLOTS key of the database settings overrides the WORKER_SLOTS
+    setting.
+    """
+    return get_databases()[database].get("WORKER_SLOTS", settings.WORKER_SLOTS)
+
+
+def nextTask(database=DEFAULT_DB_ALIAS, running=None):
+    """
+    Returns the first waiting task that can start next to the running tasks,
+    or None.
+
+    The worker runs up to WORKER_SLOTS tasks of its scenario at the same time.
+    Tasks in WORKER_CONCURRENT_TASKS can run alongside any other task, except
+    while a plan run is writing the plan of the scenario. All other tasks run
+    one at a time, in the order they were submitted.
+    """
+    if running is None:
+        running = {}
+    elif len(running) >= getSlots(database):
+        return None
+    exclusive = any(not t.concurrent for t in running.values())
+    writing = None
+    for task in (
+        Task.objects.all()
+        .using(database)
+        .filter(status="Waiting")
+        .exclude(id__in=running.keys())
+        .order_by("id")
+    ):
+        if task.name not in settings.WORKER_CONCURRENT_TASKS:
+            if not exclusive:
+                return task
+        else:
+            if writing is None:
+                writing = PlanWriteLock.isWriting(database)
+            if not writing:
+                return task
+    return None
+
+
 class Command(BaseCommand):
     help = """Processes the job queue of a database.
     The command is intended only to be used internally by frePPLe, not by an API or user.
@@ -251,66 +357,39 @@ class Command(BaseCommand):
         idle_loop_done = False
         old_thread_locals = getattr(_thread_locals, "database", None)
         setattr(_thread_locals, "database", database)
+        running = {}
         while True:
+            for t in [t for t in running.values() if not t.is_alive()]:
+                del running[t.task.id]
             try:
-                task = (
-                    Task.objects.all()
-                    .using(database)
-                    .filter(status="Waiting")
-                    .order_by("id")[0]
-                )
-                idle_loop_done = False
+                task = nextTask(database, running)
             except Exception:
+                task = None
+            if task:
+                idle_loop_done = False
+                running[task.id] = TaskThread(task, database)
+                running[task.id].start()
+                if getSlots(database) <= 1:
+                    running[task.id].join()
+                continue
+            elif running:
+                # Wait for a running task to finish
+                time.sleep(1)
+                continue
+            elif continuous:
                 # No more tasks found
-                if continuous:
+                time.sleep(5)
+                continue
+            else:
+                # Special case: we need to permit a single idle loop before shutting down
+                # the worker. If we shut down immediately, a newly launched task could think
+                # that a worker is already running - while it just shut down.
+                if idle_loop_done:
+                    break
+                else:
+                    idle_loop_done = True
                     time.sleep(5)
                     continue
-                else:
-                    # Special case: we need to permit a single idle loop before shutting down
-                    # the worker. If we shut down immediately, a newly launched task could think
-                    # that a worker is already running - while it just shut down.
-                    if idle_loop_done:
-                        break
-                    else:
-                        idle_loop_done = True
-                        time.sleep(5)
-                        continue
-            try:
-                if "FREPPLE_TEST" not in os.environ:
-                    logger.debug(
-                        "Worker %s for database '%s' starting task %d at %s"
-                        % (
-                            os.getpid(),
-                            get_databases()[database]["NAME"],
-                            task.id,
-                            datetime.now(),
-                        )
-                    )
-                runTask(task, database)
-            except Exception as e:
-                try:
-                    # Read the task again from the database and update.
-                    task = Task.objects.all().using(database).get(pk=task.id)
-                    task.status = "Failed"
-                    now = datetime.now()
-                    if not task.started:
-                        task.started = now
-                    task.finished = now
-                    task.message = str(e)
-                    task.save(using=database)
-                    if "FREPPLE_TEST" not in os.environ:
-                        logger.debug(
-                            "Worker %s for database '%s' finished task %d at %s: failed"
-                            % (
-                                os.getpid(),
-                                get_databases()[database]["NAME"],
-                                task.id,
-                                datetime.now(),
-                            )
-                        )
-                except Exception:
-                    # It's possible the database is release by now and we can't updte the task
-                    pass
 
         # Remove the parameter again
         try:
@@ -21,12 +21,16 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import logging
 import os
 import shutil
 import subprocess
+import tempfile
 from datetime import datetime
+from time import time
 
 
+from django.apps import apps
 from django.db.models import Case, When, Value, IntegerField
 from django.db.models.functions import Cast, Substr, Length
 from django.core.management import call_command
@@ -39,12 +43,14 @@ from django.template.loader import render_to_string
 from freppledb.execute.models import Task, ScheduledTask
 from freppledb.execute.views import FileManager
 from freppledb.common.middleware import _thread_locals
-from freppledb.common.models import User, Scenario, Parameter
+from freppledb.common.models import User, Scenario, Parameter, HierarchyModel
 from freppledb.common.utils import getStorageUsage, get_databases, getPostgresVersion
 from freppledb.input.models import Item
 from freppledb.webservice.utils import useWebService
 from freppledb import __version__
 
+logger = logging.getLogger(__name__)
+
 
 class Command(BaseCommand):
     help = """
@@ -53,6 +59,12 @@ class Command(BaseCommand):
 
         The pg_dump and psql commands need to be in the path, otherwise
         this command will fail.
+
+        By default the fastest possible copy method is used: a clone of
+        the database when nobody is connected to the source scenario, or
+        else a dump and restore with SCENARIO_COPY_JOBS parallel jobs when
+        the log folder has room for the dump, or else a single
+        pg_dump | pg_restore pipe.
         """
 
     requires_system_checks = []
@@ -90,6 +102,12 @@ class Command(BaseCommand):
         parser.add_argument(
             "--dumpfile", default=None, help="specifies source dump file"
         )
+        parser.add_argument(
+            "--strategy",
+            default="auto",
+            choices=["auto", "template", "parallel", "pipe"],
+            help="Method used to copy the data. The default is to pick the fastest one possible",
+        )
         parser.add_argument("source", help="source database to copy")
         parser.add_argument("destination", help="destination database to copy")
 
@@ -231,6 +249,7 @@ class Command(BaseCommand):
             ]
             # look for extra tables for which the user has no ownership
             noOwnershipTables = []
+            excludedSequences = []
             with connections[source].cursor() as cursor:
                 cursor.execute(
                     """
@@ -380,135 +399,156 @@ class Command(BaseCommand):
                     )
 
             # Copying the data
+            strategy = options["strategy"]
+            phases = []
+            if strategy in ("auto", "template"):
+                phasestart = time()
+                if self.copyTemplate(
+                    source,
+                    destination,
+                    test,
+                    promote or options["dumpfile"] or noOwnershipTables,
+                ):
+                    strategy = "template"
+                    phases.append(("clone", time() - phasestart))
+                elif strategy == "template":
+                    raise CommandError(
+                        "Can't copy with a template: other users are connected or the databases are configured differently"
+                    )
+                elif self.getJobs() > 1 and self.hasDumpSpace(source):
+                    strategy = "parallel"
+                else:
+                    strategy = "pipe"
+            elif strategy == "parallel" and not self.hasDumpSpace(source):
+                raise CommandError(
+                    "Not enough free disk space in the log folder for a parallel copy"
+                )
             env = os.environ.copy()
             if get_databases()[source]["PASSWORD"]:
                 env["PGPASSWORD"] = get_databases()[source]["PASSWORD"]
-            if not options["dumpfile"]:
-                cmd = "/usr/lib/postgresql/%s/bin/pg_dump -Fc %s%s%s%s%s%s | /usr/lib/postgresql/%s/bin/pg_restore -n public -Fc %s%s%s -d %s"
-                commandline = cmd % (
-                    getPostgresVersion(),
-                    get_databases()[source]["USER"]
-                    and ("-U %s " % get_databases()[source]["USER"])
-                    or "",
-                    get_databases()[source]["HOST"]
-                    and ("-h %s " % get_databases()[source]["HOST"])
-                    or "",
-                    get_databases()[source]["PORT"]
-                    and ("-p %s " % get_databases()[source]["PORT"])
-                    or "",
-                    (
+            dumpfolder = None
+            try:
+                if options["dumpfile"]:
+                    commands = [
                         (
-                            "%s %s "
+                            "restore",
+                            "/usr/lib/postgresql/%s/bin/pg_restore -n public -Fc --no-password %s-d %s %s"
                             % (
-                                " --exclude-table ".join(
-                                    ["", *(excludedTables + excludedSequences)]
+                                getPostgresVersion(),
+                                self.getConnectionArguments(destination),
+                                self.getDatabaseName(destination, test),
+                                os.path.join(
+                                    settings.FREPPLE_LOGDIR, options["dumpfile"]
                                 ),
-                                " --exclude-table-data ".join(["", *(excludedTables)]),
-                            )
+                            ),
                         )
-                        if destination == DEFAULT_DB_ALIAS
-                        else ""
-                    ),
-                    (
-                        ("%s " % (" --exclude-table ".join(["", *noOwnershipTables])))
-                        if len(noOwnershipTables) > 0
-                        else ""
-                    ),
-                    test
-                    and get_databases()[source]["TEST"]["NAME"]
-                    or get_databases()[source]["NAME"],
-                    getPostgresVersion(),
-                    get_databases()[destination]["USER"]
-                    and ("-U %s " % get_databases()[destination]["USER"])
-                    or "",
-                    get_databases()[destination]["HOST"]
-                    and ("-h %s " % get_databases()[destination]["HOST"])
-                    or "",
-                    get_databases()[destination]["PORT"]
-                    and ("-p %s " % get_databases()[destination]["PORT"])
-                    or "",
-                    test
-                    and get_databases()[destination]["TEST"]["NAME"]
-                    or get_databases()[destination]["NAME"],
-                )
-            else:
-                cmd = "/usr/lib/postgresql/%s/bin/pg_restore -n public -Fc --no-password %s%s%s -d %s %s"
-                commandline = cmd % (
-                    getPostgresVersion(),
-                    get_databases()[destination]["USER"]
-                    and ("-U %s " % get_databases()[destination]["USER"])
-                    or "",
-                    get_databases()[destination]["HOST"]
-                    and ("-h %s " % get_databases()[destination]["HOST"])
-                    or "",
-                    get_databases()[destination]["PORT"]
-                    and ("-p %s " % get_databases()[destination]["PORT"])
-                    or "",
-                    test
-                    and get_databases()[destination]["TEST"]["NAME"]
-                    or get_databases()[destination]["NAME"],
-                    os.path.join(settings.FREPPLE_LOGDIR, options["dumpfile"]),
-                )
-
-            with subprocess.Popen(
-                commandline,
-                shell=True,
-                executable=shutil.which("bash") or "/bin/sh",
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                env=env,
-                start_new_session=True,  # new process group, bash + children
-            ) as p:
-                error_message = None
-                try:
-                    original_processid = task.processid
-                    task.processid = p.pid
-                    task.processgroupid = os.getpgid(p.pid)
-                    task.save(using=source)
-                    res = p.communicate()
-                    p.wait()
-                    task.processid = original_processid
-                    task.processgroupid = None
-                    task.save(using=source)
-                    error_message = res[1].decode().partition("\n")[0]
-                    if p.returncode != 0 or "error" in error_message.lower():
-                        raise Exception(error_message)
-
-                    if not options["dumpfile"]:
-                        # Successful copy can still leave warnings and errors
-                        # To confirm copy is ok, let's check that the scenario copy task exists
-                        # in the destination database
-                        t = Task.objects.using(destination).filter(id=task.id).first()
-                        if (
-                            not t
-                            or t.name != task.name
-                            or t.submitted != task.submitted
-                        ):
-                            destinationscenario.status = "Free"
-                            destinationscenario.save(
-                                update_fields=["status"],
-                                using=DEFAULT_DB_ALIAS,
-                            )
-                            raise Exception("Database copy failed")
-                        t.status = "Done"
-                        t.finished = datetime.now()
-                        t.message = "Scenario copied from %s" % source
-                        t.save(
-                            using=destination,
-                            update_fields=["status", "finished", "message"],
+                    ]
+                elif strategy == "parallel":
+                    # A directory format dump allows dumping and restoring
+                    # multiple tables at the same time
+                    dumpfolder = tempfile.mkdtemp(
+                        prefix="scenario_copy_", dir=settings.FREPPLE_LOGDIR
+                    )
+                    commands = [
+                        (
+                            "dump",
+                            "/usr/lib/postgresql/%s/bin/pg_dump -Fd -j %d -f %s %s%s"
+                            % (
+                                getPostgresVersion(),
+                                self.getJobs(),
+                                os.path.join(dumpfolder, "dump"),
+                                self.getDumpArguments(
+                                    source,
+                                    destination,
+                                    excludedTables,
+                                    excludedSequences,
+                                    noOwnershipTables,
+                                ),
+                                self.getDatabaseName(source, test),
+                            ),
+                        ),
+                        (
+                            "restore",
+                            "/usr/lib/postgresql/%s/bin/pg_restore -n public -Fd -j %d %s-d %s %s"
+                            % (
+                                getPostgresVersion(),
+                                self.getJobs(),
+                                self.getConnectionArguments(destination),
+                                self.getDatabaseName(destination, test),
+                                os.path.join(dumpfolder, "dump"),
+                            ),
+                        ),
+                    ]
+                elif strategy == "pipe":
+                    commands = [
+                        (
+                            "copy",
+                            "/usr/lib/postgresql/%s/bin/pg_dump -Fc %s%s | /usr/lib/postgresql/%s/bin/pg_restore -n public -Fc %s-d %s"
+                            % (
+                                getPostgresVersion(),
+                                self.getDumpArguments(
+                                    source,
+                                    destination,
+                                    excludedTables,
+                                    excludedSequences,
+                                    noOwnershipTables,
+                                ),
+                                self.getDatabaseName(source, test),
+                                getPostgresVersion(),
+                                self.getConnectionArguments(destination),
+                                self.getDatabaseName(destination, test),
+                            ),
                         )
+                    ]
+                else:
+                    commands = []
 
-                except Exception as e:
-                    p.kill()
-                    p.wait()
-                    # Consider the destination database free again
-                    if destination != DEFAULT_DB_ALIAS:
-                        destinationscenario.status = "Free"
-                        destinationscenario.save(
-                            update_fields=["status"],
-                            using=DEFAULT_DB_ALIAS,
-                        )
-                    raise Exception(e or "Database copy failed")
+                for phase, commandline in commands:
+                    phasestart = time()
+                    self.runCommand(commandline, env, task, source)
+                    phases.append((phase, time() - phasestart))
+
+                if not options["dumpfile"]:
+                    # Successful copy can still leave warnings and errors
+                    # To confirm copy is ok, let's check that the scenario copy task exists
+                    # in the destination database
+                    t = Task.objects.using(destination).filter(id=task.id).first()
+                    if not t or t.name != task.name or t.submitted != task.submitted:
+                        raise Exception("Database copy failed")
+                    t.status = "Done"
+                    t.finished = datetime.now()
+                    t.message = "Scenario copied from %s" % source
+                    t.save(
+                        using=destination,
+                        update_fields=["status", "finished", "message"],
+                    )
+
+                if strategy != "template" and not options["dumpfile"]:
+                    # The hierarchy tables are left out of the dump, and are
+                    # faster to rebuild than to copy
+                    phasestart = time()
+                    for m in apps.get_models():
+                        if issubclass(m, HierarchyModel):
+                            m.rebuildHierarchy(database=destination, force=True)
+                    phases.append(("hierarchies", time() - phasestart))
+
+            except Exception as e:
+                # Consider the destination database free again
+                if destination != DEFAULT_DB_ALIAS:
+                    destinationscenario.status = "Free"
+                    destinationscenario.save(
+                        update_fields=["status"],
+                        using=DEFAULT_DB_ALIAS,
+                    )
+                raise Exception(e or "Database copy failed")
+            finally:
+                if dumpfolder:
+                    shutil.rmtree(dumpfolder, ignore_errors=True)
+            timing = "%s copy: %s" % (
+                strategy,
+                ", ".join("%s %.1f seconds" % p for p in phases),
+            )
+            logger.info("Scenario %s copied with %s" % (destination, timing))
 
             with connections[destination].cursor() as cursor:
                 # Assure the identity sequences are bigger than the id values
@@ -679,7 +719,7 @@ class Command(BaseCommand):
                     options["dumpfile"],
                 )
             else:
-                task.message = "Scenario copied to %s" % destination
+                task.message = "Scenario copied to %s with %s" % (destination, timing)
 
             # Delete any waiting tasks in the new copy.
             # This is needed for situations where the same source is copied to
@@ -748,6 +788,219 @@ class Command(BaseCommand):
                 task.save(using=source)
             settings.DEBUG = tmp_debug
 
+    @staticmethod
+    def getJobs():
+        return max(getattr(settings, "SCENARIO_COPY_JOBS", 1) or os.cpu_count(), 1)
+
+    @staticmethod
+    def hasDumpSpace(database):
+        """
+        A parallel copy writes a dump of the database to the log folder.
+        Returns whether the disk and the storage quota have room for it. The
+        size of the database is used as an upper bound of the size of the dump.
+        """
+        with connections[database].cursor() as cursor:
+            cursor.execute("select pg_database_size(current_database())")
+            size = cursor.fetchone()[0]
+        if shutil.disk_usage(settings.FREPPLE_LOGDIR).free < size:
+            return False
+        maxstorage = getattr(settings, "MAXSTORAGE", 0) or 0
+        return not maxstorage or getStorageUsage() + size <= maxstorage * 1024 * 1024
+
+    @staticmethod
+    def getDatabaseName(database, test):
+        return (
+            test
+            and get_databases()[database]["TEST"]["NAME"]
+            or get_databases()[database]["NAME"]
+        )
+
+    @staticmethod
+    def getConnectionArguments(database):
+        return "%s%s%s" % (
+            get_databases()[database]["USER"]
+            and ("-U %s " % get_databases()[database]["USER"])
+            or "",
+            get_databases()[database]["HOST"]
+            and ("-h %s " % get_databases()[database]["HOST"])
+            or "",
+            get_databases()[database]["PORT"]
+            and ("-p %s " % get_databases()[database]["PORT"])
+            or "",
+        )
+
+    @classmethod
+    def getDumpArguments(
+        cls,
+        source,
+        destination,
+        excludedTables,
+        excludedSequences,
+        noOwnershipTables,
+    ):
+        return "%s%s%s%s" % (
+            cls.getConnectionArguments(source),
+            (
+                (
+                    "%s %s "
+                    % (
+                        " --exclude-table ".join(
+                            ["", *(excludedTables + excludedSequences)]
+                        ),
+                        " --exclude-table-data ".join(["", *(excludedTables)]),
+                    )
+                )
+                if destination == DEFAULT_DB_ALIAS
+                else ""
+            ),
+            (
+                ("%s " % (" --exclude-table ".join(["", *noOwnershipTables])))
+                if len(noOwnershipTables) > 0
+                else ""
+            ),
+            "%s "
+            % " --exclude-table-data ".join(
+                [
+                    "",
+                    *(
+                        "%s_hierarchy" % m._meta.db_table
+                        for m in apps.get_models()
+                        if issubclass(m, HierarchyModel)
+                    ),
+                ]
+            ),
+        )
+
+    @staticmethod
+    def runCommand(commandline, env, task, database):
+        """
+        Runs a shell command. The process group is stored on the task, such
+        that cancelling the task also stops the command.
+        """
+        with subprocess.Popen(
+            commandline,
+            shell=True,
+            executable=shutil.which("bash") or "/bin/sh",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=env,
+            start_new_session=True,  # new process group, bash + children
+        ) as p:
+            try:
+                original_processid = task.processid
+                task.processid = p.pid
+                task.processgroupid = os.getpgid(p.pid)
+                task.save(using=database)
+                res = p.communicate()
+                p.wait()
+                task.processid = original_processid
+                task.processgroupid = None
+                task.save(using=database)
+                error_message = res[1].decode().partition("\n")[0]
+                if p.returncode != 0 or "error" in error_message.lower():
+                    raise Exception(error_message)
+            except Exception:
+                p.kill()
+                p.wait()
+                raise
+
+    @staticmethod
+    def copyTemplate(source, destination, test, excluded):
+        """
+        Clones the source database with CREATE DATABASE ... TEMPLATE, which
+        copies the database files in the server rather than dumping and
+        restoring every record.
+        PostgreSQL only allows this when nobody else is connected to the source
+        database. On a running server the web server workers normally keep
+        connections open to the scenarios, so this mostly applies to copies
+        made while the web server is stopped. Returns False when the copy
+        isn't possible.
+        """
+        if excluded or destination == DEFAULT_DB_ALIAS:
+            # Some tables need to be left out of the copy
+            return False
+        src = get_databases()[source]
+        dest = get_databases()[destination]
+        if dest.get("SQL_ROLE", None) or any(
+            src.get(k, None) != dest.get(k, None) for k in ("HOST", "PORT", "USER")
+        ):
+            return False
+        sourcename = Command.getDatabaseName(source, test)
+        destinationname = Command.getDatabaseName(destination, test)
+        copyname = "%s_copy" % destinationname
+        oldname = "%s_old" % destinationname
+
+        # Close our own connections to both databases
+        for c in connections.all():
+            if c.settings_dict["NAME"] in (sourcename, destinationname):
+                if c.in_atomic_block:
+                    return False
+                c.close()
+
+        with connections[destination]._nodb_cursor() as cursor:
+            # The destination database is dropped and recreated. We need to be
+            # the owner of it, and it can't have access rights or settings we
+            # would lose.
+            cursor.execute(
+                """
+                select
+                  pg_get_userbyid(datdba) = current_user
+                  and datacl is null
+                  and not exists (
+                    select 1 from pg_db_role_setting
+                    where setdatabase = pg_database.oid
+                    )
+                  and (
+                    select rolcreatedb or rolsuper
+                    from pg_roles where rolname = current_user
+                    )
+                  and not exists (
+                    select 1 from pg_stat_activity
+                    where datname in (%s, %s)
+                    and backend_type != 'autovacuum worker'
+                    )
+                from pg_database
+                where datname = %s
+                """,
+                (sourcename, destinationname, destinationname),
+            )
+            res = cursor.fetchone()
+            if not res or not res[0]:
+                return False
+            quote = connections[destination].ops.quote_name
+            try:
+                cursor.execute("drop database if exists %s" % quote(copyname))
+                cursor.execute("drop database if exists %s" % quote(oldname))
+                cursor.execute(
+                    "create database %s template %s"
+                    % (quote(copyname), quote(sourcename))
+                )
+                # The destination is only dropped after the copy took its place
+                cursor.execute(
+                    "alter database %s rename to %s"
+                    % (quote(destinationname), quote(oldname))
+                )
+            except Exception as e:
+                # Most likely somebody connected in the meantime
+                logger.info("Can't copy the database with a template: %s" % e)
+                cursor.execute("drop database if exists %s" % quote(copyname))
+                return False
+            try:
+                cursor.execute(
+                    "alter database %s rename to %s"
+                    % (quote(copyname), quote(destinationname))
+                )
+            except Exception as e:
+                logger.info("Can't copy the database with a template: %s" % e)
+                cursor.execute(
+                    "alter database %s rename to %s"
+                    % (quote(oldname), quote(destinationname))
+                )
+                cursor.execute("drop database if exists %s" % quote(copyname))
+                return False
+            cursor.execute("drop database %s" % quote(oldname))
+        return True
+
     # accordion template
     title = _("scenario management")
     index = 1300
@@ -23,7 +23,7 @@
 from django.utils.translation import gettext_lazy as _
 
 from freppledb.menu import menu
-from .views import TaskReport
+from .views import TaskReport, TaskProfileReport
 
 menu.addItem(
     "admin",
@@ -33,3 +33,11 @@ menu.addItem(
     report=TaskReport,
     index=100,
 )
+menu.addItem(
+    "admin",
+    "task profile",
+    url="/execute/profile/",
+    label=_("Task profile"),
+    report=TaskProfileReport,
+    index=110,
+)
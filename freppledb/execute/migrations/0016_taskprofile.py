@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [("execute", "0015_task_processgroupid")]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskProfile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="identifier",
+                    ),
+                ),
+                (
+                    "sequence",
+                    models.CharField(editable=False, verbose_name="sequence"),
+                ),
+                (
+                    "step",
+                    models.CharField(
+                        db_index=True, editable=False, verbose_name="step"
+                    ),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(editable=False, verbose_name="started"),
+                ),
+                (
+                    "walltime",
+                    models.DecimalField(
+                        decimal_places=8,
+                        editable=False,
+                        max_digits=20,
+                        verbose_name="wall time",
+                    ),
+                ),
+                (
+                    "cputime",
+                    models.DecimalField(
+                        decimal_places=8,
+                        editable=False,
+                        max_digits=20,
+                        verbose_name="cpu time",
+                    ),
+                ),
+                (
+                    "memory",
+                    models.DecimalField(
+                        decimal_places=8,
+                        editable=False,
+                        max_digits=20,
+                        verbose_name="memory growth",
+                    ),
+                ),
+                (
+                    "statements",
+                    models.IntegerField(editable=False, verbose_name="SQL statements"),
+                ),
+                ("rows", models.BigIntegerField(editable=False, verbose_name="rows")),
+                (
+                    "task",
+                    models.ForeignKey(
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="profile",
+                        to="execute.task",
+                        verbose_name="task",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "task profile",
+                "verbose_name_plural": "task profiles",
+                "db_table": "execute_profile",
+                "default_permissions": ["view"],
+            },
+        ),
+    ]
@@ -34,6 +34,7 @@ from django.utils.translation import gettext_lazy as _
 from django.db.models.functions import Now
 
 from freppledb.common.models import User, Parameter
+from freppledb.common.utils import invalidateReportCache
 
 import logging
 
@@ -83,6 +84,12 @@ class Task(models.Model):
         verbose_name = _("task")
         default_permissions = ["view"]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.finished:
+            # The data changed by the task becomes visible in the reports
+            invalidateReportCache(self._state.db)
+
     @staticmethod
     def submitTask():
         # Add record to the database
@@ -175,6 +182,45 @@ class Task(models.Model):
         self.save(using=database)
 
 
+class TaskProfile(models.Model):
+    """
+    Resources used by each step of a plan run.
+    """
+
+    # Database fields
+    id = models.AutoField(_("identifier"), primary_key=True, editable=False)
+    task = models.ForeignKey(
+        Task,
+        verbose_name=_("task"),
+        related_name="profile",
+        editable=False,
+        on_delete=models.CASCADE,
+    )
+    sequence = models.CharField(_("sequence"), editable=False)
+    step = models.CharField(_("step"), db_index=True, editable=False)
+    started = models.DateTimeField(_("started"), editable=False)
+    walltime = models.DecimalField(
+        _("wall time"), max_digits=20, decimal_places=8, editable=False
+    )
+    cputime = models.DecimalField(
+        _("cpu time"), max_digits=20, decimal_places=8, editable=False
+    )
+    memory = models.DecimalField(
+        _("memory growth"), max_digits=20, decimal_places=8, editable=False
+    )
+    statements = models.IntegerField(_("SQL statements"), editable=False)
+    rows = models.BigIntegerField(_("rows"), editable=False)
+
+    def __str__(self):
+        return "%s - %s" % (self.task_id, self.step)
+
+    class Meta:
+        db_table = "execute_profile"
+        verbose_name_plural = _("task profiles")
+        verbose_name = _("task profile")
+        default_permissions = ["view"]
+
+
 class ScheduledTask(models.Model):
     # Database fields
     name = models.CharField("name", primary_key=True, db_index=True)
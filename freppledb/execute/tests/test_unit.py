@@ -31,7 +31,7 @@ import unittest
 from django.core import management
 from django.db import DEFAULT_DB_ALIAS, transaction
 from django.db.models import Sum, Count, Q
-from django.test import TransactionTestCase
+from django.test import SimpleTestCase, TransactionTestCase
 
 from freppledb.common.tests import TransactionTestCaseWithReportDatabases
 from freppledb.execute.models import Task
@@ -39,6 +39,7 @@ import freppledb.output as output
 import freppledb.input as input
 import freppledb.common as common
 from freppledb.common.auth import getWebserviceAuthorization
+from freppledb.common.commands import PlanTask, PlanTaskSequence, WarmEngineMismatch
 from freppledb.common.models import APIKey, Parameter, User, Notification
 from freppledb.common.utils import get_databases
 
@@ -287,6 +288,57 @@ class execute_simulation(TransactionTestCase):
         # TODO add comparison with initial_planned_late
 
 
+class warm_engine(SimpleTestCase):
+    def test_tasks(self):
+        sequence = PlanTaskSequence()
+        for name, flag in (
+            ("parameters", "warmup"),
+            ("items", "static"),
+            ("connection", None),
+            ("operations", "static"),
+            ("operationplans", None),
+            ("solve", None),
+        ):
+            sequence.addTask(
+                type(
+                    name,
+                    (PlanTask,),
+                    {
+                        "description": name,
+                        "static": flag == "static",
+                        "warmup": flag == "warmup",
+                    },
+                )
+            )
+
+        def running(**kwargs):
+            sequence.getWeight(**kwargs)
+            return [s.description for s in sequence.steps if s.weight > 0]
+
+        self.assertEqual(
+            running(),
+            [
+                "parameters",
+                "items",
+                "connection",
+                "operations",
+                "operationplans",
+                "solve",
+            ],
+        )
+        # The warm engine runs the static tasks and the tasks preparing them once
+        self.assertEqual(running(warm="load"), ["parameters", "items", "operations"])
+        # Every plan run runs all tasks that aren't static
+        self.assertEqual(
+            running(warm="plan"),
+            ["parameters", "connection", "operationplans", "solve"],
+        )
+        # A plan run needing other static data can't use the warm engine
+        sequence.steps[1].getWeight = classmethod(lambda cls, **kwargs: -1)
+        with self.assertRaises(WarmEngineMismatch):
+            running(warm="plan")
+
+
 class remote_commands(TransactionTestCase):
     fixtures = ["demo"]
 
@@ -33,6 +33,11 @@ if mode == "WSGI":
 
     urlpatterns = [
         path("execute/", views.TaskReport.as_view(), name="execute"),
+        path(
+            "execute/profile/",
+            views.TaskProfileReport.as_view(),
+            name="execute_profile",
+        ),
         re_path(
             r"^execute/logfrepple/(.+)/$",
             views.logfile,
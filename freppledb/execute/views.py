@@ -41,6 +41,7 @@ from django.conf import settings
 from django.contrib.auth import get_permission_codename
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
+from django.db.models.expressions import RawSQL
 from django.db.models.fields import AutoField
 from django.db.models.fields.related import ForeignKey
 from django.views.decorators.cache import never_cache
@@ -78,6 +79,7 @@ from freppledb.common.report import (
     GridReport,
     GridFieldText,
     GridFieldInteger,
+    GridFieldNumber,
     EXCLUDE_FROM_BULK_OPERATIONS,
     _getCellValue,
     matchesModelName,
@@ -88,7 +90,7 @@ from freppledb.common.utils import get_databases
 from freppledb.common.utils import forceWsgiReload
 from freppledb.common.views import sendStaticFile
 from .utils import updateScenarioCount, ReloadScheduler
-from .models import Task, ScheduledTask, DataExport
+from .models import Task, TaskProfile, ScheduledTask, DataExport
 from .management.commands.runworker import launchWorker
 from .management.commands.runplan import parseConstraints, constraintString
 
@@ -292,6 +294,60 @@ class TaskReport(GridReport):
             return '"lastcompleted":0,\n'
 
 
+class TaskProfileReport(GridReport):
+    """
+    A list report to compare the resources used by the steps of plan runs.
+    Each step is compared with the same step in the previous plan run.
+    """
+
+    title = _("Task profile")
+    basequeryset = TaskProfile.objects.all().annotate(
+        previous_walltime=RawSQL(
+            """
+            select prev.walltime from execute_profile prev
+            where prev.step = execute_profile.step
+            and prev.task_id < execute_profile.task_id
+            order by prev.task_id desc
+            limit 1
+            """,
+            (),
+        ),
+        previous_rows=RawSQL(
+            """
+            select prev.rows from execute_profile prev
+            where prev.step = execute_profile.step
+            and prev.task_id < execute_profile.task_id
+            order by prev.task_id desc
+            limit 1
+            """,
+            (),
+        ),
+    )
+    model = TaskProfile
+    frozenColumns = 3
+    multiselect = False
+    editable = False
+    default_sort = (0, "desc")
+    help_url = "user-interface/execute.html"
+
+    rows = (
+        GridFieldInteger("id", title=_("identifier"), key=True, hidden=True),
+        GridFieldInteger("task", title=_("task"), field_name="task_id"),
+        GridFieldText("sequence", title=_("sequence"), align="center"),
+        GridFieldText("step", title=_("step"), width=250),
+        GridFieldLocalDateTime("started", title=_("started"), align="center"),
+        GridFieldNumber("walltime", title=_("wall time")),
+        GridFieldNumber(
+            "previous_walltime", title=_("previous wall time"), search=False
+        ),
+        GridFieldNumber("cputime", title=_("cpu time")),
+        GridFieldNumber("memory", title=_("memory growth")),
+        GridFieldInteger("statements", title=_("SQL statements")),
+        GridFieldInteger("rows", title=_("rows")),
+        GridFieldInteger("previous_rows", title=_("previous rows"), search=False),
+    )
+
+
 @csrf_exempt
 @staff_member_required
 def APITask(request, action):
@@ -0,0 +1,273 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+A warm engine is a planning engine process that keeps the master data of a
+scenario in memory between plan runs.
+
+The warm engine runs the static planning tasks, which load the master data,
+once. It then waits for plan runs on a unix socket. For every plan run it forks
+a child process that runs all other tasks on a copy of the loaded model. When
+the plan run needs other static data, for instance because it imports data from
+an external system, the child process discards the model and runs all tasks.
+
+Triggers on the master data tables send a notification for every change. When
+the master data tables have changed since they were loaded, the warm engine
+refuses the plan run and exits. The plan then runs in a new engine process, and
+a new warm engine is started. The notifications aren't delivered through a
+connection pooler in transaction mode, such as pgbouncer.
+
+The parameters aren't part of the static data: every plan run reads them again.
+"""
+
+from datetime import date, datetime
+import json
+import os
+import signal
+import socket
+import struct
+from subprocess import Popen
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from freppledb.execute.models import Task
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def getSocket(database=DEFAULT_DB_ALIAS):
+    return os.path.join(settings.FREPPLE_LOGDIR, "warmengine_%s.sock" % database)
+
+
+def listenForChanges(database=DEFAULT_DB_ALIAS):
+    """
+    Returns a connection that listens for changes to the master data tables.
+    It needs to be opened before loading the data, so every change committed
+    after loading is notified.
+    """
+    listener = connections[database].get_new_connection(
+        connections[database].get_connection_params()
+    )
+    listener.autocommit = True
+    with listener.cursor() as cursor:
+        cursor.execute("listen static_data")
+    return listener
+
+
+def getChanges(listener, ignore=()):
+    """
+    Returns the list of tables changed since the previous call, except for
+    the changes made by the database sessions with a process id in the
+    ignore list.
+    A broken connection may have missed some changes.
+    """
+    try:
+        listener.poll()
+        changed = sorted({n.payload for n in listener.notifies if n.pid not in ignore})
+        listener.notifies.clear()
+        return changed
+    except Exception as e:
+        return ["unknown tables (%s)" % e]
+
+
+def submitPlan(database=DEFAULT_DB_ALIAS):
+    """
+    Hands a plan run with the current environment variables over to the warm
+    engine of the scenario.
+    Returns the process identifier of the process running the plan, or None
+    when no warm engine is available.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(60)
+            s.connect(getSocket(database))
+            s.sendall(json.dumps(dict(os.environ)).encode("utf-8") + b"\n")
+            reply = s.makefile().readline().strip()
+            return int(reply) if reply else None
+    except (OSError, ValueError):
+        return None
+
+
+def launchEngine(database=DEFAULT_DB_ALIAS, preexec_fn=None):
+    """
+    Starts a warm engine for the scenario in the background.
+    The environment of the current process needs to be prepared for running
+    the planning engine, as the runplan command does.
+    """
+    import freppledb.common.commands
+
+    env = os.environ.copy()
+    env["FREPPLE_WARM"] = "1"
+    env["FREPPLE_LOGFILE"] = "warmengine_%s.log" % database
+    env.pop("FREPPLE_TASKID", None)
+    Popen(
+        ["frepple", freppledb.common.commands.__file__],
+        env=env,
+        preexec_fn=preexec_fn,
+        start_new_session=True,
+    )
+
+
+def runEngine(database=DEFAULT_DB_ALIAS):
+    """
+    Main loop of the warm engine process.
+    """
+    from freppledb.common.commands import PlanTaskRegistry
+
+    path = getSocket(database)
+    if os.path.exists(path):
+        # Another warm engine may already serve this scenario
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+            logger.info("Warm engine already running")
+            return
+        except OSError:
+            os.remove(path)
+
+    logger.info("Warm engine loading data at %s" % datetime.now().strftime("%H:%M:%S"))
+    listener = listenForChanges(database)
+    # A current date parameter "today" is evaluated when loading the data, so
+    # the warm engine is refreshed every day
+    loaded = date.today()
+    own = set()
+    with connections[database].cursor() as cursor:
+        cursor.execute("select pg_backend_pid()")
+        own.add(cursor.fetchone()[0])
+    PlanTaskRegistry.run(database=database, warm="load")
+    with connections[database].cursor() as cursor:
+        cursor.execute("select pg_backend_pid()")
+        own.add(cursor.fetchone()[0])
+    connections.close_all()
+
+    # Some static tasks update the master data they load. Changes made by
+    # other sessions during the load may be missing from the loaded data.
+    changed = getChanges(listener, ignore=own)
+    if changed:
+        logger.info("Warm engine stopping: changed data in %s" % ", ".join(changed))
+        listener.close()
+        return
+
+    # Forked processes are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        # Only processes of the same user can submit a plan run
+        os.chmod(path, 0o600)
+        server.listen()
+        logger.info("Warm engine ready at %s" % datetime.now().strftime("%H:%M:%S"))
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                if hasattr(socket, "SO_PEERCRED"):
+                    uid = struct.unpack(
+                        "3i",
+                        conn.getsockopt(
+                            socket.SOL_SOCKET,
+                            socket.SO_PEERCRED,
+                            struct.calcsize("3i"),
+                        ),
+                    )[1]
+                    if uid != os.getuid():
+                        logger.warning("Warm engine refused a user with id %s" % uid)
+                        continue
+                env = json.loads(conn.makefile().readline())
+                changed = getChanges(listener)
+                if date.today() != loaded:
+                    changed.append("current date")
+                if changed:
+                    logger.info(
+                        "Warm engine stopping: changed data in %s" % ", ".join(changed)
+                    )
+                    conn.sendall(b"\n")
+                    break
+                pid = os.fork()
+                if not pid:
+                    server.close()
+                    conn.close()
+                    listener.close()
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    os.environ.clear()
+                    os.environ.update(env)
+                    exitcode = runPlan(database)
+                    logging.shutdown()
+                    os._exit(exitcode)
+                conn.sendall(b"%d\n" % pid)
+    finally:
+        server.close()
+        listener.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def runPlan(database=DEFAULT_DB_ALIAS):
+    """
+    Runs the planning tasks that aren't static in a process forked from the
+    warm engine. Returns the exit code of the process.
+    """
+    import frepple
+    from freppledb.common.commands import PlanTaskRegistry, WarmEngineMismatch
+
+    if "FREPPLE_LOGFILE" in os.environ:
+        frepple.settings.logfile = os.path.join(
+            settings.FREPPLE_LOGDIR, os.environ["FREPPLE_LOGFILE"]
+        )
+    task = None
+    if "FREPPLE_TASKID" in os.environ:
+        task = (
+            Task.objects.all()
+            .using(database)
+            .filter(pk=os.environ["FREPPLE_TASKID"])
+            .first()
+        )
+        if task:
+            task.processid = os.getpid()
+            task.save(update_fields=["processid"], using=database)
+
+    newstatus = "Done"
+    try:
+        try:
+            PlanTaskRegistry.run(database=database, warm="plan")
+        except WarmEngineMismatch as e:
+            logger.info("%s: running all tasks" % e)
+            frepple.erase(True)
+            PlanTaskRegistry.run(database=database)
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 0
+    except Exception as e:
+        logger.error("Error during planning: %s" % e)
+        newstatus = "Failed"
+        return 1
+    finally:
+        # Clear the processid
+        if task:
+            task = Task.objects.all().using(database).filter(pk=task.id).first()
+            if task:
+                task.processid = None
+                task.status = newstatus
+                task.save(update_fields=["processid", "status"], using=database)
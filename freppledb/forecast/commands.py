@@ -403,43 +403,11 @@ class AggregateDemand(PlanTask):
         )
         currentdate = getCurrentDate(database)
 
-        # Creating temp tables
+        # Updating the hierarchy tables
         starttime = time()
-        cursor.execute(
-            """
-            create temporary table item_hierarchy on commit preserve rows as
-            select parent.name parent, child.name child from item parent
-            inner join item child
-            on child.lft between parent.lft and parent.rght
-            """
-        )
-        cursor.execute(
-            """
-            create index item_hierarchy_idx on item_hierarchy (child)
-            """
-        )
-        cursor.execute(
-            """
-            create temporary table location_hierarchy on commit preserve rows as
-            select parent.name parent, child.name child from location parent
-            inner join location child
-            on child.lft between parent.lft and parent.rght
-            """
-        )
-        cursor.execute(
-            "create index location_hierarchy_idx on location_hierarchy (child)"
-        )
-        cursor.execute(
-            """
-            create temporary table customer_hierarchy on commit preserve rows as
-            select parent.name parent, child.name child from customer parent
-            inner join customer child
-            on child.lft between parent.lft and parent.rght
-            """
-        )
-        cursor.execute(
-            "create index customer_hierarchy_idx on customer_hierarchy (child)"
-        )
+        Item.rebuildHierarchy(database)
+        Location.rebuildHierarchy(database)
+        Customer.rebuildHierarchy(database)
         cursor.execute(
             """
             drop table if exists forecasthierarchy;
@@ -458,7 +426,8 @@ class AggregateDemand(PlanTask):
             "create unique index nodes on forecasthierarchy (item_id, location_id, customer_id)"
         )
         logger.info(
-            "Aggregate - creating temp tables in %.2f seconds" % (time() - starttime)
+            "Aggregate - creating forecast hierarchy in %.2f seconds"
+            % (time() - starttime)
         )
 
         # Delete forecastplan records for invalid dates
@@ -629,9 +598,6 @@ class AggregateDemand(PlanTask):
 
         # Wrapping up
         starttime = time()
-        cursor.execute("drop table item_hierarchy")
-        cursor.execute("drop table location_hierarchy")
-        cursor.execute("drop table customer_hierarchy")
         cursor.execute("drop table excludedcombinations")
         cursor.execute("drop table demand_agg")
         logger.info("Aggregate - wrapping up in %.2f seconds" % (time() - starttime))
@@ -1083,6 +1049,7 @@ def createForecastSolver(db, task=None):
                 "Iterations",
                 "loglevel",
                 "Skip",
+                "Threads",
                 "MovingAverage_order",
                 "Net_CustomerThenItemHierarchy",
                 "Net_MatchUsingDeliveryOperation",
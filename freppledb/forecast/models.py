@@ -845,15 +845,12 @@ class ForecastPlan(models.Model):
                 # update the forecasthierarchy table
                 cursor.execute("""
                 with cte as (
-                    select item_parent.name as item_id,
-                        location_parent.name as location_id,
-                        customer_parent.name as customer_id from forecast_combinations
-                    inner join item on item.name = forecast_combinations.item_id
-                    inner join location on location.name = forecast_combinations.location_id
-                    inner join customer on customer.name = forecast_combinations.customer_id
-                    inner join item item_parent on item.lft between item_parent.lft and item_parent.rght
-                    inner join location location_parent on location.lft between location_parent.lft and location_parent.rght
-                    inner join customer customer_parent on customer.lft between customer_parent.lft and customer_parent.rght
+                    select item_hierarchy.parent as item_id,
+                        location_hierarchy.parent as location_id,
+                        customer_hierarchy.parent as customer_id from forecast_combinations
+                    inner join item_hierarchy on item_hierarchy.child = forecast_combinations.item_id
+                    inner join location_hierarchy on location_hierarchy.child = forecast_combinations.location_id
+                    inner join customer_hierarchy on customer_hierarchy.child = forecast_combinations.customer_id
                     )
                     insert into forecasthierarchy
                     select * from cte on conflict (item_id, location_id, customer_id) do nothing;
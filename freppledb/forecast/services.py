@@ -38,7 +38,7 @@ from freppledb.common.localization import parseLocalizedDateTime
 from freppledb.common.models import Comment
 from freppledb.forecast.models import Forecast
 from freppledb.input.models import Item, Location, Customer, Buffer
-from freppledb.webservice.utils import fcst_solver
+from freppledb.webservice.utils import fcst_solver, PlanChanges
 
 
 class ForecastService(AsyncHttpConsumer):
@@ -156,6 +156,8 @@ class ForecastService(AsyncHttpConsumer):
 
                 data = json.loads(body.decode("utf-8"))
 
+                # Forecasts changed by this request
+                changed = []
                 try:
                     replan = False
                     frepple.cache.write_immediately = False
@@ -248,6 +250,7 @@ class ForecastService(AsyncHttpConsumer):
                                             args[key] = float(val)
                                     frepple.setForecast(**args)
                                     replan = True
+                                    changed.append(args)
                                 except Exception as e:
                                     errors.append("Error processing %s" % e)
                     else:
@@ -382,6 +385,7 @@ class ForecastService(AsyncHttpConsumer):
                                             if key != "forecastoverride":
                                                 replan = True
                                     frepple.setForecast(**args)
+                                    changed.append(args)
                                 except Exception as e:
                                     errors.append("Error processing %s" % e)
 
@@ -395,6 +399,34 @@ class ForecastService(AsyncHttpConsumer):
                     frepple.cache.flush()
                     frepple.cache.write_immediately = True
 
+                if changed:
+                    PlanChanges.publish(
+                        {
+                            "type": "forecast",
+                            "database": self.scope["database"],
+                            "forecasts": [
+                                {
+                                    "item": c["item"].name,
+                                    "location": c["location"].name,
+                                    "customer": c["customer"].name,
+                                    "startdate": (
+                                        c["startdate"].strftime("%Y-%m-%dT%H:%M:%S")
+                                        if "startdate" in c
+                                        else None
+                                    ),
+                                    "enddate": (
+                                        c["enddate"].strftime("%Y-%m-%dT%H:%M:%S")
+                                        if "enddate" in c
+                                        else None
+                                    ),
+                                }
+                                for c in changed
+                            ],
+                            "replanned": replan,
+                        },
+                        "forecast.view_forecast",
+                    )
+
                 # Save a new comment
                 if (
                     "commenttype" in data
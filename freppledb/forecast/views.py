@@ -1262,22 +1262,13 @@ class PeggingReport(pegging.ReportByDemand):
                         union all
                         select case when upstream_opplan.owner_id = cte.owner_id then cte.level else cte.level+1 end,
                         cte.path||'/'||coalesce(upstream_opplan.item_id,'')||'/'||upstream_opplan.reference,
-                        t1.upstream_reference::text,
-                        greatest(t1.x, t1.x + (t1.y-t1.x)/(t2.y-t2.x)*(cte.pegged_x-t2.x)) as pegged_x,
-                        least(t1.y, t1.x + (t1.y-t1.x)/(t2.y-t2.x)*(cte.pegged_x-t2.x) + (cte.pegged_y-cte.pegged_x)*(t1.y-t1.x)/(t2.y-t2.x)) as pegged_y,
+                        edge.upstream::text,
+                        greatest(edge.upstream_x, edge.upstream_x + (edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)*(cte.pegged_x-edge.downstream_x)) as pegged_x,
+                        least(edge.upstream_y, edge.upstream_x + (edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)*(cte.pegged_x-edge.downstream_x) + (cte.pegged_y-cte.pegged_x)*(edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)) as pegged_y,
                         upstream_opplan.owner_id
-                        from operationplan
-                        inner join cte on cte.reference = operationplan.reference
-                        inner join lateral
-                        (select t->>0 upstream_reference,
-                        (t->>1)::numeric + (t->>2)::numeric as y,
-                        (t->>2)::numeric as x from jsonb_array_elements(operationplan.plan->'upstream_opplans') t) t1 on true
-                        inner join operationplan upstream_opplan on upstream_opplan.reference = t1.upstream_reference
-                        inner join lateral
-                        (select t->>0 downstream_reference,
-                        (t->>1)::numeric+(t->>2)::numeric as y,
-                        (t->>2)::numeric as x from jsonb_array_elements(upstream_opplan.plan->'downstream_opplans') t) t2
-                            on t2.downstream_reference = operationplan.reference   -- overlap condition removed here
+                        from cte
+                        inner join out_pegging edge on edge.downstream = cte.reference
+                        inner join operationplan upstream_opplan on upstream_opplan.reference = edge.upstream
                         )
                         select reference
                         from cte
@@ -1347,22 +1338,13 @@ class PeggingReport(pegging.ReportByDemand):
                 union all
                 select case when upstream_opplan.owner_id = cte.owner_id then cte.level else cte.level+1 end,
                 cte.path||'/'||coalesce(upstream_opplan.item_id,'')||'/'||upstream_opplan.reference,
-                t1.upstream_reference::text,
-                greatest(t1.x, t1.x + (t1.y-t1.x)/(t2.y-t2.x)*(cte.pegged_x-t2.x)) as pegged_x,
-                least(t1.y, t1.x + (t1.y-t1.x)/(t2.y-t2.x)*(cte.pegged_x-t2.x) + (cte.pegged_y-cte.pegged_x)*(t1.y-t1.x)/(t2.y-t2.x)) as pegged_y,
+                edge.upstream::text,
+                greatest(edge.upstream_x, edge.upstream_x + (edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)*(cte.pegged_x-edge.downstream_x)) as pegged_x,
+                least(edge.upstream_y, edge.upstream_x + (edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)*(cte.pegged_x-edge.downstream_x) + (cte.pegged_y-cte.pegged_x)*(edge.upstream_y-edge.upstream_x)/(edge.downstream_y-edge.downstream_x)) as pegged_y,
                 upstream_opplan.owner_id
-                from operationplan
-                inner join cte on cte.reference = operationplan.reference
-                inner join lateral
-                (select t->>0 upstream_reference,
-                (t->>1)::numeric + (t->>2)::numeric as y,
-                (t->>2)::numeric as x from jsonb_array_elements(operationplan.plan->'upstream_opplans') t) t1 on true
-                inner join operationplan upstream_opplan on upstream_opplan.reference = t1.upstream_reference
-                inner join lateral
-                (select t->>0 downstream_reference,
-                (t->>1)::numeric+(t->>2)::numeric as y,
-                (t->>2)::numeric as x from jsonb_array_elements(upstream_opplan.plan->'downstream_opplans') t) t2
-                    on t2.downstream_reference = operationplan.reference   -- overlap condition removed here
+                from cte
+                inner join out_pegging edge on edge.downstream = cte.reference
+                inner join operationplan upstream_opplan on upstream_opplan.reference = edge.upstream
                 )
                 select level, reference, pegged_x, pegged_y, greatest(0,(pegged_y-pegged_x)) as quantity, path,
                     (pegged_y > pegged_x) as in_original_path
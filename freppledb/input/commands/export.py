@@ -30,6 +30,7 @@ from django.conf import settings
 
 from freppledb.boot import getAttributes
 from freppledb.common.commands import PlanTaskRegistry, PlanTask
+from freppledb.common.models import Parameter
 from freppledb.input.models import (
     Buffer,
     Calendar,
@@ -810,6 +811,7 @@ class exportParameters(PlanTask):
                 "update common_parameter set value=%s, lastmodified=%s where name='currentdate'",
                 (frepple.settings.current.strftime("%Y-%m-%d %H:%M:%S"), cls.timestamp),
             )
+        Parameter.clearCache(database)
 
 
 @PlanTaskRegistry.register
@@ -33,7 +33,7 @@ from django.db.utils import OperationalError
 
 from freppledb.boot import getAttributes
 from freppledb.common.models import Parameter
-from freppledb.common.commands import PlanTaskRegistry, PlanTask
+from freppledb.common.commands import PlanTaskRegistry, PlanTask, read_rows
 from freppledb.common.report import getCurrentDate
 from freppledb.common.utils import vacuumAnalyze
 from freppledb.input.models import (
@@ -69,6 +69,8 @@ class LoadTask(PlanTask):
     - low weight by default, ie fast execution assumed
     - filter attribute to load only a subset of the data
     - subclass is used by the odoo connector to recognize data loading tasks
+    - queries returned by getQueries are prefetched when the task declares
+      its dependencies
     """
 
     @staticmethod
@@ -77,6 +79,33 @@ class LoadTask(PlanTask):
 
     filter = None
 
+    @classmethod
+    def getQueries(cls, **kwargs):
+        return []
+
+    @classmethod
+    def prefetch(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        data = {}
+        queries = cls.getQueries(database=database, **kwargs)
+        if queries:
+            with transaction.atomic(using=database):
+                with connections[database].cursor() as cursor:
+                    for sql in queries:
+                        cursor.execute(sql)
+                        data[sql] = cursor.fetchall()
+        return data
+
+    @classmethod
+    def execute(cls, cursor, sql):
+        """
+        Returns the records of a query: the prefetched records when they
+        are available, and otherwise the cursor executing the query.
+        """
+        if cls.prefetched and sql in cls.prefetched:
+            return cls.prefetched.pop(sql)
+        cursor.execute(sql)
+        return cursor
+
 
 @PlanTaskRegistry.register
 class checkBuckets(CheckTask):
@@ -324,6 +353,7 @@ class checkBrokenSupplyPath(CheckTask):
     # and make sure they can be either manufactured, transported and purchased
     description = "Check broken supply paths"
     sequence = 78
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -460,6 +490,7 @@ class checkBrokenSupplyPath(CheckTask):
 class loadParameter(LoadTask):
     description = "Importing parameters"
     sequence = 90
+    warmup = True
 
     @classmethod
     def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
@@ -536,19 +567,35 @@ class loadParameter(LoadTask):
 class loadLocations(LoadTask):
     description = "Importing locations"
     sequence = 91
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return -1 if kwargs.get("skipLoad", False) else 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
         if cls.filter:
             filter_where = "where %s " % cls.filter
         else:
             filter_where = ""
+        attrs = [
+            f[0] for f in getAttributes(Location) if not f[2].startswith("foreignkey:")
+        ]
+        if attrs:
+            attrsql = ", %s" % ", ".join(attrs)
+        else:
+            attrsql = ""
+        return ["""
+            SELECT
+            name, description, owner_id, available_id, category, subcategory, source %s
+            FROM location %s
+            """ % (attrsql, filter_where)]
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
 
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
@@ -560,18 +607,9 @@ class loadLocations(LoadTask):
                     for f in getAttributes(Location)
                     if not f[2].startswith("foreignkey:")
                 ]
-                if attrs:
-                    attrsql = ", %s" % ", ".join(attrs)
-                else:
-                    attrsql = ""
-
-                cursor.execute("""
-                    SELECT
-                    name, description, owner_id, available_id, category, subcategory, source %s
-                    FROM location %s
-                    """ % (attrsql, filter_where))
-
-                for i in cursor:
+                for i in cls.execute(
+                    cursor, cls.getQueries(database=database, **kwargs)[0]
+                ):
                     cnt += 1
                     try:
                         x = frepple.location(
@@ -600,43 +638,48 @@ class loadLocations(LoadTask):
 class loadCalendars(LoadTask):
     description = "Importing calendars"
     sequence = 92
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
+        if kwargs.get("skipLoad", False):
+            return ["""
+                select
+                name, 0, 'common_bucket', 1 hidden
+                FROM common_bucket
+                order by name asc
+                """]
         if cls.filter:
             filter_where = "where %s " % cls.filter
         else:
             filter_where = ""
+        return ["""
+            select
+            name, defaultvalue, source, 0 hidden
+            FROM calendar %s
+            union
+            SELECT
+            name, 0, 'common_bucket', 1 hidden
+            FROM common_bucket
+            order by name asc
+            """ % filter_where]
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
 
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                if kwargs.get("skipLoad", False):
-                    cursor.execute("""
-                        select
-                        name, 0, 'common_bucket', 1 hidden
-                        FROM common_bucket
-                        order by name asc
-                        """)
-                else:
-                    cursor.execute("""
-                        select
-                        name, defaultvalue, source, 0 hidden
-                        FROM calendar %s
-                        union
-                        SELECT
-                        name, 0, 'common_bucket', 1 hidden
-                        FROM common_bucket
-                        order by name asc
-                        """ % filter_where)
-                for i in cursor:
+                for i in cls.execute(
+                    cursor, cls.getQueries(database=database, **kwargs)[0]
+                ):
                     cnt += 1
                     try:
                         frepple.calendar(
@@ -653,51 +696,56 @@ class loadCalendars(LoadTask):
 class loadCalendarBuckets(LoadTask):
     description = "Importing calendar buckets"
     sequence = 93
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
+        if kwargs.get("skipLoad", False):
+            return ["""
+                SELECT
+                bucket_id calendar_id, startdate, enddate, 10 priority , 0 as value,
+                't' sunday,'t' monday,'t' tuesday,'t' wednesday,'t' thurday,'t' friday,'t' saturday,
+                time '00:00:00' starttime, time '23:59:59' endtime, 'common_bucketdetail' source, lower(name)
+                FROM common_bucketdetail
+                ORDER BY calendar_id, startdate desc
+                """]
         if cls.filter:
             filter_where = "and %s " % cls.filter
         else:
             filter_where = ""
+        return ["""
+            SELECT
+            calendar_id, startdate, enddate, priority, value,
+            sunday, monday, tuesday, wednesday, thursday, friday, saturday,
+            starttime, endtime, source, null
+            FROM calendarbucket
+            WHERE (startdate < enddate or startdate is null or enddate is null) %s
+            UNION
+            SELECT
+            bucket_id calendar_id, startdate, enddate, 10 priority , 0 as value,
+            't' sunday,'t' monday,'t' tuesday,'t' wednesday,'t' thurday,'t' friday,'t' saturday,
+            time '00:00:00' starttime, time '23:59:59' endtime, 'common_bucketdetail' source, lower(name)
+            FROM common_bucketdetail
+            ORDER BY calendar_id, startdate desc
+            """ % filter_where]
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
 
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                if kwargs.get("skipLoad", False):
-                    cursor.execute("""
-                        SELECT
-                        bucket_id calendar_id, startdate, enddate, 10 priority , 0 as value,
-                        't' sunday,'t' monday,'t' tuesday,'t' wednesday,'t' thurday,'t' friday,'t' saturday,
-                        time '00:00:00' starttime, time '23:59:59' endtime, 'common_bucketdetail' source, lower(name)
-                        FROM common_bucketdetail
-                        ORDER BY calendar_id, startdate desc
-                        """)
-                else:
-                    cursor.execute("""
-                        SELECT
-                        calendar_id, startdate, enddate, priority, value,
-                        sunday, monday, tuesday, wednesday, thursday, friday, saturday,
-                        starttime, endtime, source, null
-                        FROM calendarbucket
-                        WHERE (startdate < enddate or startdate is null or enddate is null) %s
-                        UNION
-                        SELECT
-                        bucket_id calendar_id, startdate, enddate, 10 priority , 0 as value,
-                        't' sunday,'t' monday,'t' tuesday,'t' wednesday,'t' thurday,'t' friday,'t' saturday,
-                        time '00:00:00' starttime, time '23:59:59' endtime, 'common_bucketdetail' source, lower(name)
-                        FROM common_bucketdetail
-                        ORDER BY calendar_id, startdate desc
-                        """ % filter_where)
                 prevcal = None
-                for i in cursor:
+                for i in cls.execute(
+                    cursor, cls.getQueries(database=database, **kwargs)[0]
+                ):
                     cnt += 1
                     try:
                         days = 0
@@ -749,30 +797,36 @@ class loadCalendarBuckets(LoadTask):
 class loadCustomers(LoadTask):
     description = "Importing customers"
     sequence = 94
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return -1 if kwargs.get("skipLoad", False) else 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
         if cls.filter:
             filter_where = "where %s " % cls.filter
         else:
             filter_where = ""
+        return ["""
+            SELECT
+              name, description, owner_id, category, subcategory, source
+            FROM customer %s
+            """ % filter_where]
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
 
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                cursor.execute("""
-                SELECT
-                  name, description, owner_id, category, subcategory, source
-                FROM customer %s
-                """ % filter_where)
-                for i in cursor:
+                for i in cls.execute(
+                    cursor, cls.getQueries(database=database, **kwargs)[0]
+                ):
                     cnt += 1
                     try:
                         x = frepple.customer(
@@ -795,30 +849,36 @@ class loadCustomers(LoadTask):
 class loadSuppliers(LoadTask):
     description = "Importing suppliers"
     sequence = 95
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return -1 if kwargs.get("skipLoad", False) else 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
         if cls.filter:
             filter_where = "where %s " % cls.filter
         else:
             filter_where = ""
+        return ["""
+            SELECT
+              name, description, owner_id, category, subcategory, source, available_id
+            FROM supplier %s
+            """ % filter_where]
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
 
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                cursor.execute("""
-                SELECT
-                  name, description, owner_id, category, subcategory, source, available_id
-                FROM supplier %s
-                """ % filter_where)
-                for i in cursor:
+                for i in cls.execute(
+                    cursor, cls.getQueries(database=database, **kwargs)[0]
+                ):
                     cnt += 1
                     try:
                         x = frepple.supplier(
@@ -845,6 +905,7 @@ class loadSuppliers(LoadTask):
 class loadOperations(LoadTask):
     description = "Importing operations"
     sequence = 96
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1079,6 +1140,7 @@ class loadOperations(LoadTask):
 class loadSuboperations(LoadTask):
     description = "Importing suboperations"
     sequence = 97
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1145,6 +1207,7 @@ class loadSuboperations(LoadTask):
 class loadOperationDependencies(LoadTask):
     description = "Importing operation dependencies"
     sequence = 97.5
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1195,6 +1258,7 @@ class loadOperationDependencies(LoadTask):
 class loadItems(LoadTask):
     description = "Importing items"
     sequence = 98
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1270,6 +1334,7 @@ class loadItems(LoadTask):
 class loadItemSuppliers(LoadTask):
     description = "Importing item suppliers"
     sequence = 99
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1349,6 +1414,7 @@ class loadItemSuppliers(LoadTask):
 class loadItemDistributions(LoadTask):
     description = "Importing item distributions"
     sequence = 100
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1437,6 +1503,7 @@ class loadItemDistributions(LoadTask):
 class loadBuffers(LoadTask):
     description = "Importing buffers"
     sequence = 101
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1539,6 +1606,7 @@ class loadBuffers(LoadTask):
 class LinkCalendarsToBuffers(LoadTask):
     description = "Associate calendars to the buffers"
     sequence = 105.5
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1607,30 +1675,44 @@ class LinkCalendarsToBuffers(LoadTask):
 class loadSetupMatrices(LoadTask):
     description = "Importing setup matrix rules"
     sequence = 102
+    static = True
+    dependencies = ()
 
     @classmethod
     def getWeight(cls, **kwargs):
         return -1 if kwargs.get("skipLoad", False) else 1
 
     @classmethod
-    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
-        import frepple
-
+    def getQueries(cls, **kwargs):
         if cls.filter:
             filter_where = "where %s " % cls.filter
         else:
             filter_where = ""
+        return [
+            """
+            SELECT name, source
+            FROM setupmatrix %s
+            ORDER BY name
+            """ % filter_where,
+            """
+            SELECT
+              setupmatrix_id, priority, fromsetup, tosetup, duration,
+              cost, source, resource_id
+            FROM setuprule %s
+            ORDER BY setupmatrix_id, priority DESC
+            """ % filter_where,
+        ]
 
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        import frepple
+
+        queries = cls.getQueries(database=database, **kwargs)
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                cursor.execute("""
-                SELECT name, source
-                FROM setupmatrix %s
-                ORDER BY name
-                """ % filter_where)
-                for i in cursor:
+                for i in cls.execute(cursor, queries[0]):
                     cnt += 1
                     try:
                         frepple.setupmatrix(name=i[0], source=i[1])
@@ -1645,14 +1727,7 @@ class loadSetupMatrices(LoadTask):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                cursor.execute("""
-                SELECT
-                  setupmatrix_id, priority, fromsetup, tosetup, duration,
-                  cost, source, resource_id
-                FROM setuprule %s
-                ORDER BY setupmatrix_id, priority DESC
-                """ % filter_where)
-                for i in cursor:
+                for i in cls.execute(cursor, queries[1]):
                     cnt += 1
                     try:
                         r = frepple.setupmatrixrule(
@@ -1678,6 +1753,7 @@ class loadSetupMatrices(LoadTask):
 class loadResources(LoadTask):
     description = "Importing resources"
     sequence = 94.5
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1794,6 +1870,7 @@ class loadResources(LoadTask):
 class loadResourceSkills(LoadTask):
     description = "Importing resources skills"
     sequence = 104
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1843,6 +1920,7 @@ class loadResourceSkills(LoadTask):
 class loadOperationMaterials(LoadTask):
     description = "Importing operation materials"
     sequence = 105
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -1937,6 +2015,7 @@ class loadOperationMaterials(LoadTask):
 class loadOperationResources(LoadTask):
     description = "Importing operation resources"
     sequence = 106
+    static = True
 
     @classmethod
     def getWeight(cls, **kwargs):
@@ -2178,7 +2257,81 @@ class loadOperationPlans(LoadTask):
                     attrsql = ""
 
                 starttime = time()
-                cursor.execute(f"""
+
+                # The operationplans are read as rows from a server side cursor.
+                # We don't stream them as binary COPY TO output: decoding that
+                # format in Python measured about 3 times slower than the row
+                # parsing of psycopg2, which is done in C. The engine also has
+                # no entry point to create a batch of operationplans, so
+                # frepple.operationplan() is called for each record. The time
+                # saved comes from the operationplanresource query that
+                # replaces the correlated subqueries, and from fetching the
+                # next chunk of records while the engine processes the current
+                # one.
+
+                # Selection of the top level operationplans, and of the child
+                # manufacturing orders of the top level operationplans
+                parent_from = f"""
+                    FROM operationplan
+                    LEFT OUTER JOIN (select name from demand
+                    where demand.status is null or demand.status in ('open', 'quote')
+                    ) dmd
+                    on dmd.name = operationplan.demand_id
+                    {"LEFT OUTER JOIN (select name from forecast) forecast "
+                        "on forecast.name = operationplan.forecast" if with_fcst else ""}
+                    WHERE operationplan.owner_id IS NULL
+                    and operationplan.quantity >= 0 and operationplan.status <> 'closed'
+                    {filter_and} {confirmed_filter} and operationplan.type in ('PO', 'MO', 'WO', 'DO', 'DLVR')
+                    and (operationplan.startdate is null or operationplan.startdate < '2030-12-31')
+                    and (operationplan.enddate is null or operationplan.enddate < '2030-12-31')
+                    """
+                child_from = f"""
+                    FROM operationplan
+                    INNER JOIN (select reference
+                    from operationplan {parent_filter}
+                    ) opplan_parent
+                    on operationplan.owner_id = opplan_parent.reference
+                    LEFT OUTER JOIN (select name from demand
+                    where demand.status is null or demand.status in ('open', 'quote')
+                    ) dmd
+                    on dmd.name = operationplan.demand_id
+                    {"LEFT OUTER JOIN (select name from forecast) forecast "
+                    "on forecast.name = operationplan.forecast" if with_fcst else ""}
+                    WHERE operationplan.quantity >= 0
+                    and (
+                        operationplan.status <> 'closed'
+                        or exists (
+                        select 1 from operationplan as parent_opplan
+                        where parent_opplan.reference = operationplan.owner_id
+                        and parent_opplan.status <> 'closed'
+                        )
+                    )
+                    {filter_and} and operationplan.type in ('MO', 'WO')
+                    and (operationplan.startdate is null or operationplan.startdate < '2030-12-31')
+                    and (operationplan.enddate is null or operationplan.enddate < '2030-12-31')
+                    """
+
+                # Read the resources of all manufacturing orders in a single query,
+                # rather than with a correlated subquery for each operationplan
+                resources = {}
+                with connections[database].cursor() as res_cursor:
+                    res_cursor.execute(f"""
+                        select operationplan_id, resource_id
+                        from operationplanresource
+                        where operationplan_id in (
+                          select operationplan.reference {parent_from}
+                          and operationplan.type in ('MO', 'WO')
+                          union all
+                          select operationplan.reference {child_from}
+                          )
+                        order by operationplan_id, resource_id
+                        """)
+                    for i in res_cursor:
+                        resources.setdefault(i[0], []).append(i[1])
+
+                for i in read_rows(
+                    cursor,
+                    f"""
                     SELECT
                     operationplan.operation_id, operationplan.reference, operationplan.quantity,
                     case when operationplan.plan ? 'setupend'
@@ -2187,12 +2340,6 @@ class loadOperationPlans(LoadTask):
                         end, operationplan.enddate, operationplan.status, operationplan.source,
                     operationplan.type, operationplan.origin_id, operationplan.destination_id, operationplan.supplier_id,
                     operationplan.item_id, operationplan.location_id, operationplan.batch, operationplan.quantity_completed,
-                    array(
-                        select resource_id
-                        from operationplanresource
-                        where operationplan_id = operationplan.reference
-                        order by resource_id
-                    ),
                     case when operationplan.plan ? 'setupoverride'
                         then (operationplan.plan->>'setupoverride')::integer
                     end,
@@ -2201,28 +2348,17 @@ class loadOperationPlans(LoadTask):
                     plan->>'info' as info
                     {", coalesce(forecast.name, null), operationplan.due" if with_fcst else ""}
                     {attrsql}
-                    FROM operationplan
-                    LEFT OUTER JOIN (select name from demand
-                    where demand.status is null or demand.status in ('open', 'quote')
-                    ) dmd
-                    on dmd.name = operationplan.demand_id
-                    {"LEFT OUTER JOIN (select name from forecast) forecast "
-                        "on forecast.name = operationplan.forecast" if with_fcst else ""}
-                    WHERE operationplan.owner_id IS NULL
-                    and operationplan.quantity >= 0 and operationplan.status <> 'closed'
-                    {filter_and} {confirmed_filter} and operationplan.type in ('PO', 'MO', 'WO', 'DO', 'DLVR')
-                    and (operationplan.startdate is null or operationplan.startdate < '2030-12-31')
-                    and (operationplan.enddate is null or operationplan.enddate < '2030-12-31')
+                    {parent_from}
                     ORDER BY operationplan.reference ASC
-                    """)
-                for i in cursor:
+                    """,
+                ):
                     try:
-                        if i[17]:
-                            dmd = frepple.demand(name=i[17])
-                        elif with_fcst and i[20] and i[21]:
+                        if i[16]:
+                            dmd = frepple.demand(name=i[16])
+                        elif with_fcst and i[19] and i[20]:
                             dmd = frepple.demand_forecastbucket(
-                                forecast=frepple.demand_forecast(name=i[20]),
-                                start=i[21],
+                                forecast=frepple.demand_forecast(name=i[19]),
+                                start=i[20],
                             )
                         else:
                             dmd = None
@@ -2239,9 +2375,9 @@ class loadOperationPlans(LoadTask):
                                 create=create_flag,
                                 batch=i[13],
                                 quantity_completed=i[14],
-                                resources=i[15],
-                                remark=i[18],
-                                info=i[19],
+                                resources=resources.get(i[1], []),
+                                remark=i[17],
+                                info=i[18],
                             )
                             if opplan:
                                 if i[5] == "confirmed":
@@ -2252,8 +2388,8 @@ class loadOperationPlans(LoadTask):
                                 elif i[5] == "completed":
                                     if not consume_material_completed:
                                         opplan.consume_material = False
-                                if i[16] is not None:
-                                    opplan.setupoverride = i[16]
+                                if i[15] is not None:
+                                    opplan.setupoverride = i[15]
                         elif i[7] == "PO":
                             cnt_po += 1
                             opplan = frepple.operationplan(
@@ -2271,8 +2407,8 @@ class loadOperationPlans(LoadTask):
                                 source=i[6],
                                 create=create_flag,
                                 batch=i[13],
-                                remark=i[18],
-                                info=i[19],
+                                remark=i[17],
+                                info=i[18],
                             )
                             if opplan and i[5] == "confirmed":
                                 if not consume_capacity:
@@ -2292,8 +2428,8 @@ class loadOperationPlans(LoadTask):
                                 source=i[6],
                                 create=create_flag,
                                 batch=i[13],
-                                remark=i[18],
-                                info=i[19],
+                                remark=i[17],
+                                info=i[18],
                             )
                             if opplan:
                                 if i[5] == "confirmed":
@@ -2320,8 +2456,8 @@ class loadOperationPlans(LoadTask):
                                 source=i[6],
                                 create=create_flag,
                                 batch=i[13],
-                                remark=i[18],
-                                info=i[19],
+                                remark=i[17],
+                                info=i[18],
                             )
                             if opplan:
                                 if i[5] == "confirmed":
@@ -2338,7 +2474,7 @@ class loadOperationPlans(LoadTask):
                             continue
 
                         if opplan:
-                            idx = 22 if with_fcst else 20
+                            idx = 21 if with_fcst else 19
                             for a in getAttributes(OperationPlan):
                                 setattr(opplan, a[0], i[idx])
                                 idx += 1
@@ -2349,7 +2485,9 @@ class loadOperationPlans(LoadTask):
                         logger.error("**** %s ****" % e)
         with transaction.atomic(using=database):
             with connections[database].chunked_cursor() as cursor:
-                cursor.execute(f"""
+                for i in read_rows(
+                    cursor,
+                    f"""
                     SELECT
                     operationplan.operation_id, operationplan.reference, operationplan.quantity,
                     case when operationplan.plan ? 'setupend'
@@ -2357,42 +2495,14 @@ class loadOperationPlans(LoadTask):
                         else operationplan.startdate
                         end, operationplan.enddate, operationplan.status,
                     operationplan.owner_id, operationplan.source, operationplan.batch,
-                    array(
-                        select resource_id
-                        from operationplanresource
-                        where operationplan_id = operationplan.reference
-                        order by resource_id
-                    ),
                     coalesce(dmd.name, null), remark,
                     plan->>'info' as info
                     {", coalesce(forecast.name, null), operationplan.due" if with_fcst else ""}
                     {attrsql}
-                    FROM operationplan
-                    INNER JOIN (select reference
-                    from operationplan {parent_filter}
-                    ) opplan_parent
-                    on operationplan.owner_id = opplan_parent.reference
-                    LEFT OUTER JOIN (select name from demand
-                    where demand.status is null or demand.status in ('open', 'quote')
-                    ) dmd
-                    on dmd.name = operationplan.demand_id
-                    {"LEFT OUTER JOIN (select name from forecast) forecast "
-                    "on forecast.name = operationplan.forecast" if with_fcst else ""}
-                    WHERE operationplan.quantity >= 0
-                    and (
-                        operationplan.status <> 'closed'
-                        or exists (
-                        select 1 from operationplan as parent_opplan
-                        where parent_opplan.reference = operationplan.owner_id
-                        and parent_opplan.status <> 'closed'
-                        )
-                    )
-                    {filter_and} and operationplan.type in ('MO', 'WO')
-                    and (operationplan.startdate is null or operationplan.startdate < '2030-12-31')
-                    and (operationplan.enddate is null or operationplan.enddate < '2030-12-31')
+                    {child_from}
                     ORDER BY operationplan.reference ASC
-                    """)
-                for i in cursor:
+                    """,
+                ):
                     try:
                         cnt_mo += 1
                         opplan = frepple.operationplan(
@@ -2404,9 +2514,9 @@ class loadOperationPlans(LoadTask):
                             end=i[4],
                             statusNoPropagation=i[5],
                             batch=i[8],
-                            resources=i[9],
-                            remark=i[11],
-                            info=i[12],
+                            resources=resources.get(i[1], []),
+                            remark=i[10],
+                            info=i[11],
                         )
                         if opplan:
                             if i[5] == "confirmed":
@@ -2425,14 +2535,14 @@ class loadOperationPlans(LoadTask):
                                         "Reference %s: Can't set owner field to %s"
                                         % (i[1], i[6])
                                     )
-                            if i[10]:
-                                opplan.demand = frepple.demand(name=i[10])
-                            elif with_fcst and i[13] and i[14]:
+                            if i[9]:
+                                opplan.demand = frepple.demand(name=i[9])
+                            elif with_fcst and i[12] and i[13]:
                                 opplan.demand = frepple.forecastbucket(
-                                    forecast=frepple.demand_forecast(name=i[13]),
-                                    start=i[14],
+                                    forecast=frepple.demand_forecast(name=i[12]),
+                                    start=i[13],
                                 )
-                            idx = 15 if with_fcst else 13
+                            idx = 14 if with_fcst else 12
                             for a in getAttributes(OperationPlan):
                                 setattr(opplan, a[0], i[idx])
                                 idx += 1
@@ -2503,7 +2613,13 @@ class loadOperationPlanMaterials(LoadTask):
             with connections[database].chunked_cursor() as cursor:
                 cnt = 0
                 starttime = time()
-                cursor.execute(
+                # The records are sorted by operationplan, so we look up each
+                # operationplan and item only once.
+                opplan = None
+                opplan_id = None
+                items = {}
+                for i in read_rows(
+                    cursor,
                     """
                     select
                     operationplan_id, opplanmat.item_id,
@@ -2523,14 +2639,24 @@ class loadOperationPlanMaterials(LoadTask):
                             if "supply" in os.environ
                             else ""
                         ),
-                    )
-                )
-                for i in cursor:
+                    ),
+                ):
                     cnt += 1
                     try:
+                        if i[0] != opplan_id:
+                            opplan_id = i[0]
+                            opplan = None
+                            opplan = frepple.operationplan(id=opplan_id)
+                        if opplan is None:
+                            # Skip the remaining records of an operationplan
+                            # that failed to load
+                            continue
+                        item = items.get(i[1])
+                        if not item:
+                            item = items[i[1]] = frepple.item(name=i[1])
                         frepple.flowplan(
-                            operationplan=frepple.operationplan(id=i[0]),
-                            item=frepple.item(name=i[1]),
+                            operationplan=opplan,
+                            item=item,
                             status=i[2],
                             quantity=i[3],
                         )
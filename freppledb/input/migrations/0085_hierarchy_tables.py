@@ -0,0 +1,74 @@
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from django.conf import settings
+from django.db import migrations, connections
+
+hierarchies = ("item", "location", "customer", "resource", "supplier")
+
+
+def grant_read_access(apps, schema_editor):
+    db = schema_editor.connection.alias
+    role = settings.DATABASES[db].get("SQL_ROLE", "report_role")
+    if role:
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                "select count(*) from pg_roles where rolname = lower(%s)", (role,)
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "create role %s with nologin noinherit role current_user" % (role,)
+                )
+            for t in hierarchies:
+                cursor.execute("grant select on table %s_hierarchy to %s" % (t, role))
+
+
+class Migration(migrations.Migration):
+    dependencies = [("input", "0084_parameter_plan_solver")]
+
+    operations = [
+        *(
+            migrations.RunSQL(
+                """
+                create table %s_hierarchy (
+                  parent character varying not null,
+                  child character varying not null,
+                  depth integer not null,
+                  primary key (parent, child)
+                  );
+                create index %s_hierarchy_child on %s_hierarchy (child);
+                insert into %s_hierarchy (parent, child, depth)
+                select parent.name, child.name, child.lvl - parent.lvl
+                from %s parent
+                inner join %s child
+                  on child.lft between parent.lft and parent.rght
+                """
+                % ((t,) * 6),
+                "drop table %s_hierarchy" % t,
+            )
+            for t in hierarchies
+        ),
+        migrations.RunPython(
+            code=grant_read_access,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
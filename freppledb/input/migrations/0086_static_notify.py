@@ -0,0 +1,82 @@
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from django.db import migrations
+
+# Tables with the master data kept in memory by a warm engine
+static_tables = (
+    "buffer",
+    "calendar",
+    "calendarbucket",
+    "common_bucket",
+    "common_bucketdetail",
+    "customer",
+    "item",
+    "itemdistribution",
+    "itemsupplier",
+    "location",
+    "operation",
+    "operation_dependency",
+    "operationmaterial",
+    "operationresource",
+    "resource",
+    "resourceskill",
+    "setupmatrix",
+    "setuprule",
+    "suboperation",
+    "supplier",
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("common", "0045_report_version"),
+        ("input", "0085_hierarchy_tables"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            create or replace function static_data_notify() returns trigger
+            language plpgsql as $$
+            begin
+              perform pg_notify('static_data', tg_table_name);
+              return null;
+            end;
+            $$
+            """,
+            "drop function static_data_notify",
+        ),
+        *(
+            migrations.RunSQL(
+                """
+                create trigger %s_static_data_notify
+                after insert or update or delete or truncate on %s
+                for each statement execute function static_data_notify()
+                """
+                % (t, t),
+                "drop trigger %s_static_data_notify on %s" % (t, t),
+            )
+            for t in static_tables
+        ),
+    ]
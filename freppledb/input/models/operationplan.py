@@ -435,6 +435,20 @@ class OperationPlan(AuditModel):
         # Call the real save() method
         super().save(*args, **kwargs)
 
+    @classmethod
+    def afterBulkUpload(cls, database, references):
+        # The set-based upload of a data file doesn't call the save method.
+        # Propagate the status of the uploaded records that need it.
+        for obj in (
+            cls.objects.using(database)
+            .filter(reference__in=references)
+            .filter(
+                Q(status__in=("completed", "closed"))
+                | ~Q(type__in=("PO", "DO", "STCK"))
+            )
+        ):
+            obj.save(using=database)
+
     @classmethod
     def getDeleteStatements(cls):
         stmts = []
@@ -764,6 +778,15 @@ class DistributionOrder(OperationPlan):
         self.operation = self.owner = self.location = self.supplier = None
         super().save(*args, **kwargs)
 
+    # Values assigned by the save method, for the set-based upload
+    bulk_upload_values = {
+        "type": "DO",
+        "operation_id": None,
+        "owner_id": None,
+        "location_id": None,
+        "supplier_id": None,
+    }
+
     class Meta:
         proxy = True
         verbose_name = _("distribution order")
@@ -808,6 +831,15 @@ class PurchaseOrder(OperationPlan):
         self.operation = self.owner = self.origin = self.destination = None
         super().save(*args, **kwargs)
 
+    # Values assigned by the save method, for the set-based upload
+    bulk_upload_values = {
+        "type": "PO",
+        "operation_id": None,
+        "owner_id": None,
+        "origin_id": None,
+        "destination_id": None,
+    }
+
     class Meta:
         proxy = True
         verbose_name = _("purchase order")
@@ -51,7 +51,7 @@ from .models import (
 )
 
 
-@NotificationFactory.register(CalendarBucket, [CalendarBucket])
+@NotificationFactory.register(CalendarBucket, [CalendarBucket], pk_only=True)
 def CalendarBucketNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
@@ -148,12 +148,12 @@ def ItemNotification(flw, msg):
         return msg.model_name() in args if args else True
 
 
-@NotificationFactory.register(ItemSupplier, [ItemSupplier])
+@NotificationFactory.register(ItemSupplier, [ItemSupplier], pk_only=True)
 def ItemSupplierNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(ItemDistribution, [ItemDistribution])
+@NotificationFactory.register(ItemDistribution, [ItemDistribution], pk_only=True)
 def ItemDistributionNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
@@ -162,7 +162,7 @@ def ItemDistributionNotification(flw, msg):
 def OperationNotification(flw, msg):
     if flw.content_type == msg.content_type:
         return flw.object_pk == msg.object_pk or (
-            msg.content_object and flw.object_pk == msg.content_object.owner.name
+            msg.content_object and flw.object_pk == msg.content_object.owner_id
         )
     elif not msg.content_object or flw.object_pk != msg.content_object.operation_id:
         return False
@@ -171,17 +171,17 @@ def OperationNotification(flw, msg):
         return msg.model_name() in args if args else True
 
 
-@NotificationFactory.register(SubOperation, [SubOperation])
+@NotificationFactory.register(SubOperation, [SubOperation], pk_only=True)
 def SubOperationNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(Buffer, [Buffer])
+@NotificationFactory.register(Buffer, [Buffer], pk_only=True)
 def BufferNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(SetupRule, [SetupRule])
+@NotificationFactory.register(SetupRule, [SetupRule], pk_only=True)
 def SetupRuleNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
@@ -208,7 +208,7 @@ def SkillNotification(flw, msg):
         return msg.model_name() in args if args else True
 
 
-@NotificationFactory.register(ResourceSkill, [ResourceSkill])
+@NotificationFactory.register(ResourceSkill, [ResourceSkill], pk_only=True)
 def ResourceSkillNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
@@ -237,46 +237,50 @@ def ResourceNotification(flw, msg):
         return False
 
 
-@NotificationFactory.register(OperationMaterial, [OperationMaterial])
+@NotificationFactory.register(OperationMaterial, [OperationMaterial], pk_only=True)
 def OperationMaterialNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(OperationResource, [OperationResource])
+@NotificationFactory.register(OperationResource, [OperationResource], pk_only=True)
 def OperationResourceNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(ManufacturingOrder, [ManufacturingOrder])
+@NotificationFactory.register(ManufacturingOrder, [ManufacturingOrder], pk_only=True)
 def ManufacturingOrderNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(DistributionOrder, [DistributionOrder])
+@NotificationFactory.register(DistributionOrder, [DistributionOrder], pk_only=True)
 def DistributionOrderNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(PurchaseOrder, [PurchaseOrder])
+@NotificationFactory.register(PurchaseOrder, [PurchaseOrder], pk_only=True)
 def PurchaseOrderNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(DeliveryOrder, [DeliveryOrder])
+@NotificationFactory.register(DeliveryOrder, [DeliveryOrder], pk_only=True)
 def DeliveryOrderNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(Demand, [Demand])
+@NotificationFactory.register(Demand, [Demand], pk_only=True)
 def DemandNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(OperationPlanResource, [OperationPlanResource])
+@NotificationFactory.register(
+    OperationPlanResource, [OperationPlanResource], pk_only=True
+)
 def OperationPlanResourceNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
 
 
-@NotificationFactory.register(OperationPlanMaterial, [OperationPlanMaterial])
+@NotificationFactory.register(
+    OperationPlanMaterial, [OperationPlanMaterial], pk_only=True
+)
 def OperationPlanMaterialNotification(flw, msg):
     return flw.content_type == msg.content_type and flw.object_pk == msg.object_pk
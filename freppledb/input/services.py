@@ -34,8 +34,9 @@ from django.db import connections
 from freppledb.boot import getAttributes
 from freppledb.common.commands import PlanTaskRegistry
 from freppledb.common.localization import parseLocalizedDateTime, parseLocalizedDate
+from freppledb.common.utils import invalidateReportCache
 from freppledb.input.models import OperationPlan
-from freppledb.webservice.utils import lock
+from freppledb.webservice.utils import lock, PlanChanges
 
 
 @database_sync_to_async
@@ -62,11 +63,242 @@ def savePlan(
         with connections[database].cursor() as cursor:
             # This query forces Postgres to finalize all pending WAL writes
             cursor.execute("SELECT pg_current_wal_insert_lsn()")
+        invalidateReportCache(database)
     except Exception as e:
         print("Error saving plan:", e)
         raise e
 
 
+def getProfile(timeline, changed, complete, event):
+    """
+    Returns the events of the changed operationplans on a buffer or resource,
+    and the onhand profile from the earliest change on. The profile has the
+    onhand at the end of each date.
+    The complete profile is returned when operationplans were deleted, since
+    their dates are no longer known.
+    """
+    events = []
+    profile = {}
+    for e in timeline:
+        if e.operationplan.reference in changed:
+            complete = True
+            data = event(e)
+            if data:
+                events.append(data)
+        if complete:
+            profile[e.date.strftime("%Y-%m-%dT%H:%M:%S")] = round(e.onhand, 8)
+    return events, [{"date": d, "onhand": v} for d, v in profile.items()]
+
+
+def getPlanChanges(
+    deleted_opplans,
+    related_opplans,
+    related_resources,
+    related_buffers,
+    related_demands,
+    database,
+):
+    """
+    Builds the message streamed to the websocket subscribers after a change.
+    Buffers and resources come with the events of the changed operationplans
+    and their new onhand profile, so a screen can update without querying
+    the database.
+    """
+    opplans = []
+    for o in related_opplans:
+        if o.reference in deleted_opplans:
+            continue
+        opplans.append(
+            {
+                "reference": o.reference,
+                "type": o.ordertype,
+                "operation": o.operation.name if o.operation else None,
+                "status": o.status,
+                "quantity": round(o.quantity, 8),
+                "startdate": o.start.strftime("%Y-%m-%dT%H:%M:%S"),
+                "enddate": o.end.strftime("%Y-%m-%dT%H:%M:%S"),
+                "resources": sorted({lp.resource.name for lp in o.loadplans}),
+            }
+        )
+    changed = {o["reference"] for o in opplans}
+
+    buffers = []
+    for b in related_buffers:
+        flowplans, onhand = getProfile(
+            b.flowplans,
+            changed,
+            bool(deleted_opplans),
+            lambda fp: (
+                {
+                    "reference": fp.operationplan.reference,
+                    "date": fp.date.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "quantity": round(fp.quantity, 8),
+                }
+                if fp.quantity
+                else None
+            ),
+        )
+        buffers.append(
+            {
+                "name": b.name,
+                "item": b.item.name if b.item else None,
+                "location": b.location.name if b.location else None,
+                "flowplans": flowplans,
+                "onhand": onhand,
+            }
+        )
+
+    resources = []
+    for r in related_resources:
+        loadplans, onhand = getProfile(
+            r.loadplans,
+            changed,
+            bool(deleted_opplans),
+            lambda lp: (
+                {
+                    "reference": lp.operationplan.reference,
+                    "startdate": lp.startdate.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "enddate": lp.enddate.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "quantity": round(-lp.quantity, 8),
+                }
+                if lp.quantity < 0
+                else None
+            ),
+        )
+        resources.append({"name": r.name, "loadplans": loadplans, "onhand": onhand})
+
+    return {
+        "type": "operationplan",
+        "database": database,
+        "deleted": sorted(deleted_opplans),
+        "operationplans": opplans,
+        "buffers": buffers,
+        "resources": sorted(resources, key=lambda r: r["name"]),
+        "demands": sorted(d.name for d in related_demands),
+    }
+
+
+class PlanSaver:
+    """
+    Saves the changes of the web service to the database.
+    The changes of concurrent requests are combined into a single export,
+    which starts as soon as the previous export is finished.
+    """
+
+    # Batch collecting the changes of new requests
+    pending = None
+
+    # Only one export runs at a time
+    lock = asyncio.Lock()
+
+    # Exports being run. The event loop only keeps a weak reference to its
+    # tasks, so we keep them here until they are done.
+    flushing = set()
+
+    def __init__(self):
+        self.deleted_opplans = set()
+        self.related_opplans = set()
+        self.related_resources = set()
+        self.related_buffers = set()
+        self.related_demands = set()
+        self.done = asyncio.get_running_loop().create_future()
+
+    @classmethod
+    async def save(
+        cls,
+        deleted_opplans,
+        related_opplans,
+        related_resources,
+        related_buffers,
+        related_demands,
+        database,
+    ):
+        batch = cls.pending
+        if batch is None:
+            batch = cls.pending = cls()
+            task = asyncio.get_running_loop().create_task(batch.flush(database))
+            cls.flushing.add(task)
+            task.add_done_callback(cls.flushing.discard)
+        batch.deleted_opplans.update(deleted_opplans)
+        batch.related_opplans.update(related_opplans)
+        batch.related_resources.update(related_resources)
+        batch.related_buffers.update(related_buffers)
+        batch.related_demands.update(related_demands)
+        # The caller holds a lock on the model, but doesn't use it until
+        # the export is done
+        async with lock.idle():
+            await asyncio.shield(batch.done)
+
+    async def flush(self, database):
+        async with PlanSaver.lock:
+            # From now on, new changes go into the next batch
+            if PlanSaver.pending is self:
+                PlanSaver.pending = None
+            try:
+                # The export reads the model in another thread. The model
+                # can't change in the meantime.
+                async with lock.reading():
+                    await savePlan(
+                        self.deleted_opplans,
+                        self.related_opplans,
+                        self.related_resources,
+                        self.related_buffers,
+                        self.related_demands,
+                        database,
+                        -2,
+                    )
+                self.done.set_result(True)
+            except Exception as e:
+                self.done.set_exception(e)
+
+
+# Fields that can move an operationplan to another cluster
+clusterFields = (
+    "operation",
+    "supplier",
+    "item",
+    "location",
+    "origin",
+    "destination",
+    "demand",
+)
+
+
+def getClusters(data):
+    """
+    Returns the set of clusters that an update request changes.
+    Returns None when they can't be determined upfront, eg for new
+    operationplans or for changes that can move an operationplan to
+    another cluster.
+    """
+    clusters = set()
+    try:
+        for rec in data:
+            ref = rec.get(
+                "operationplan__reference",
+                rec.get("operationplan__id", rec.get("reference", rec.get("id", None))),
+            )
+            if not ref:
+                return None
+            for f in clusterFields:
+                if f in rec or "operationplan__%s" % f in rec:
+                    return None
+            for r in [ref] + list(rec.get("delete", [])):
+                opplan = frepple.operationplan(reference=r, action="C")
+                clusters.add(opplan.operation.cluster)
+            rsrcs = rec.get("resources", rec.get("resource", None))
+            if isinstance(rsrcs, str):
+                rsrcs = [[rsrcs]]
+            for r in rsrcs or []:
+                clusters.add(frepple.resource(name=r[0], action="C").cluster)
+                if len(r) > 2:
+                    opplan = frepple.operationplan(reference=r[2], action="C")
+                    clusters.add(opplan.operation.cluster)
+    except Exception:
+        return None
+    return clusters
+
+
 def collectRelated(
     opplan,
     related_opplans,
@@ -160,7 +392,7 @@ class OperationplanService(AsyncHttpConsumer):
             related_buffers = set()
             related_demands = set()
 
-            async with lock:
+            async with lock.clusters(lambda: getClusters(data)):
                 # Update the plan in memory
                 for rec in data:
                     try:
@@ -388,18 +620,29 @@ class OperationplanService(AsyncHttpConsumer):
                     or related_demands
                 ):
                     try:
-                        await savePlan(
+                        await PlanSaver.save(
                             deleted_opplans,
                             related_opplans,
                             related_resources,
                             related_buffers,
                             related_demands,
                             self.scope["database"],
-                            -2,
                         )
                     except Exception as e:
                         print("exception " % e)
                         errors.append("Error saving plan")
+                    else:
+                        PlanChanges.publish(
+                            getPlanChanges(
+                                deleted_opplans,
+                                related_opplans,
+                                related_resources,
+                                related_buffers,
+                                related_demands,
+                                self.scope["database"],
+                            ),
+                            "input.view_operationplan",
+                        )
 
             self.scope["response_headers"].append((b"Content-Type", b"text/html"))
             await asyncio.sleep(0.01)  # Allow event loop to clear pending events
@@ -23,6 +23,8 @@
 
 from datetime import date
 from itertools import chain
+import json
+from logging import ERROR, INFO
 import os
 import random
 from rest_framework.test import APIClient, APITestCase, APIRequestFactory
@@ -33,9 +35,12 @@ from unittest import skipUnless
 from django.conf import settings
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core import management
+from django.db import connection
+from django.db.models import F
 from django.http.response import StreamingHttpResponse
-from django.test import TestCase, TransactionTestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import translation
 from django.utils.formats import date_format
 
@@ -65,6 +70,7 @@ from freppledb.input.models import (
     ManufacturingOrder,
     Operation,
     OperationMaterial,
+    OperationPlan,
     OperationPlanMaterial,
     OperationPlanResource,
     OperationResource,
@@ -160,6 +166,235 @@ class DataLoadTest(TestCase):
             ],  # Test result is different in Enterprise Edition
         )
 
+    def test_csv_bulk_upload(self):
+        user = User.objects.get(username="admin")
+        header = ["name", "category", "cost", "owner"]
+        rows = []
+        for cnt in range(25):
+            rows.append(
+                [
+                    "bulk item %s" % cnt,
+                    "cat%s" % (cnt % 3),
+                    "abc" if cnt == 5 else str(cnt),
+                    (
+                        "unknown item"
+                        if cnt == 7
+                        else "bulk item 0" if cnt in (9, 10) else ""
+                    ),
+                ]
+            )
+        # A record that appears twice: the last row wins
+        rows.append(["bulk item 3", "updated", "33", ""])
+
+        def upload():
+            messages = []
+            for level, rownumber, field, value, msg in parseCSVdata(
+                Item, chain([header], rows), user=user
+            ):
+                if level == ERROR:
+                    messages.append((rownumber, field, value, str(msg)))
+                elif level == INFO:
+                    summary = str(msg)
+            items = [
+                (i.name, i.category, i.cost, i.owner_id)
+                for i in Item.objects.filter(name__startswith="bulk item").order_by(
+                    "name"
+                )
+            ]
+            return sorted(messages), summary, items
+
+        # Upload with set-based SQL statements
+        with override_settings(UPLOAD_BULK_THRESHOLD=10):
+            bulk_messages, bulk_summary, bulk_items = upload()
+        self.assertEqual(
+            bulk_messages,
+            [
+                (7, "cost", "abc", "Enter a number."),
+                (
+                    9,
+                    "owner",
+                    "unknown item",
+                    "Select a valid choice. That choice is not one of the available choices.",
+                ),
+            ],
+        )
+        self.assertEqual(
+            bulk_summary,
+            "26 data rows, changed 0 and added 23 records, 2 errors, 0 warnings",
+        )
+        self.assertEqual(len(bulk_items), 23)
+        self.assertIn(("bulk item 3", "updated", 33, None), bulk_items)
+        self.assertIn(("bulk item 9", "cat0", 9, "bulk item 0"), bulk_items)
+        self.assertFalse(
+            Item.objects.filter(
+                name__startswith="bulk item", lastmodified__isnull=True
+            ).exists()
+        )
+        self.assertEqual(
+            Comment.objects.filter(
+                content_type__model="item",
+                object_pk__startswith="bulk item",
+                object_repr=F("object_pk"),
+                type="add",
+            ).count(),
+            23,
+        )
+
+        # The hierarchy is rebuilt
+        self.assertFalse(
+            Item.objects.filter(name__startswith="bulk item", lft__isnull=True).exists()
+        )
+        parent = Item.objects.get(name="bulk item 0")
+        child = Item.objects.get(name="bulk item 9")
+        self.assertTrue(parent.lft < child.lft < child.rght < parent.rght)
+
+        # Uploading the same data again doesn't change any record
+        with override_settings(UPLOAD_BULK_THRESHOLD=10):
+            self.assertEqual(
+                upload(),
+                (
+                    bulk_messages,
+                    "26 data rows, changed 0 and added 0 records, 2 errors, 0 warnings",
+                    bulk_items,
+                ),
+            )
+
+        # The row-by-row upload gives the same records and errors
+        Item.objects.filter(name__startswith="bulk item").delete()
+        with override_settings(UPLOAD_BULK_THRESHOLD=None):
+            messages, summary, items = upload()
+        self.assertEqual(messages, bulk_messages)
+        self.assertEqual(items, bulk_items)
+
+    def test_csv_bulk_upload_purchaseorder(self):
+        user = User.objects.get(username="admin")
+        header = [
+            "reference",
+            "item",
+            "location",
+            "supplier",
+            "quantity",
+            "status",
+            "receipt date",
+        ]
+        rows = []
+        for cnt in range(12):
+            rows.append(
+                [
+                    "bulk PO %s" % cnt,
+                    "box",
+                    "factory 1",
+                    "unknown supplier" if cnt == 4 else "Cardboard manfacturer",
+                    "abc" if cnt == 6 else str(cnt + 1),
+                    "completed" if cnt == 8 else "confirmed",
+                    "2099-01-01 00:00:00" if cnt == 8 else "2014-02-01 00:00:00",
+                ]
+            )
+        # An existing purchase order is updated
+        rows.append(
+            [
+                "PO 0001",
+                "box",
+                "factory 1",
+                "Cardboard manfacturer",
+                "200",
+                "approved",
+                "2014-01-02 00:00:00",
+            ]
+        )
+        # A manufacturing order can't be overwritten
+        rows.append(
+            [
+                "MO 0001",
+                "box",
+                "factory 1",
+                "Cardboard manfacturer",
+                "1",
+                "confirmed",
+                "2014-02-01 00:00:00",
+            ]
+        )
+
+        def upload():
+            messages = []
+            for level, rownumber, field, value, msg in parseCSVdata(
+                PurchaseOrder, chain([header], rows), user=user
+            ):
+                if level == ERROR:
+                    messages.append((rownumber, field, value, str(msg)))
+                elif level == INFO:
+                    summary = str(msg)
+            orders = [
+                (
+                    i.reference,
+                    i.type,
+                    i.status,
+                    i.quantity,
+                    i.supplier_id,
+                    i.operation_id,
+                    # Completed orders can't end in the future
+                    i.enddate is None or i.enddate.year < 2099,
+                )
+                for i in OperationPlan.objects.filter(
+                    reference__in=[r[0] for r in rows]
+                ).order_by("reference")
+            ]
+            return sorted(messages), summary, orders
+
+        # Upload with set-based SQL statements
+        with override_settings(UPLOAD_BULK_THRESHOLD=10):
+            bulk_messages, bulk_summary, bulk_orders = upload()
+        self.assertEqual(
+            bulk_messages,
+            [
+                (
+                    6,
+                    "supplier",
+                    "unknown supplier",
+                    "Select a valid choice. That choice is not one of the available choices.",
+                ),
+                (8, "quantity", "abc", "Enter a number."),
+                (
+                    15,
+                    "reference",
+                    "MO 0001",
+                    "Operationplan with this Reference already exists.",
+                ),
+            ],
+        )
+        self.assertEqual(
+            bulk_summary,
+            "14 data rows, changed 1 and added 10 records, 3 errors, 0 warnings",
+        )
+        self.assertIn(
+            ("PO 0001", "PO", "approved", 200, "Cardboard manfacturer", None, True),
+            bulk_orders,
+        )
+        self.assertIn(
+            ("bulk PO 8", "PO", "completed", 9, "Cardboard manfacturer", None, True),
+            bulk_orders,
+        )
+        self.assertIn(
+            ("MO 0001", "MO", "confirmed", 1, None, "Make fabric @ factory 1", True),
+            bulk_orders,
+        )
+        self.assertEqual(
+            Comment.objects.filter(
+                content_type__model="purchaseorder",
+                object_pk__startswith="bulk PO",
+                object_repr=F("object_pk"),
+                type="add",
+            ).count(),
+            10,
+        )
+
+        # The row-by-row upload gives the same records and errors
+        OperationPlan.objects.filter(reference__startswith="bulk PO").delete()
+        with override_settings(UPLOAD_BULK_THRESHOLD=None):
+            messages, summary, orders = upload()
+        self.assertEqual(messages, bulk_messages)
+        self.assertEqual(orders, bulk_orders)
+
     def test_forms(self):
         item = Item.objects.all()[0].name
         loc1 = Location.objects.all()[0].name
@@ -237,6 +472,153 @@ class DataLoadTest(TestCase):
         )
 
 
+class ReportPagingTest(TestCase):
+    fixtures = ["demo"]
+
+    def setUp(self):
+        self.client.login(username="admin", password="admin")
+        Item.objects.bulk_create(
+            Item(
+                name="paging item %03d" % cnt,
+                category=("a", "b", None)[cnt % 3],
+                cost=cnt % 7 if cnt % 5 else None,
+            )
+            for cnt in range(130)
+        )
+        super().setUp()
+
+    def getPage(self, query, page):
+        response = self.client.get(
+            "/data/input/item/?format=json&rows=25&page=%s%s" % (page, query)
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b"".join(response.streaming_content))
+        return data["page"], data["records"], [r["name"] for r in data["rows"]]
+
+    def test_keyset_paging(self):
+        for query in (
+            "",
+            "&sidx=category&sord=desc",
+            "&sidx=cost&sord=asc",
+            "&sidx=cost&sord=desc",
+            "&category=b",
+            "&category=a&sidx=cost&sord=desc",
+        ):
+            # Pages retrieved with an offset
+            with override_settings(REPORT_CACHE_TIMEOUT=0):
+                expected = [self.getPage(query, p) for p in range(1, 8)]
+
+            with override_settings(REPORT_CACHE_TIMEOUT=10):
+                # Jumping straight to a page, from a cached page before it,
+                # and from the end of the report
+                cache.clear()
+                for p in (2, 4, 7, 3, 6):
+                    self.assertEqual(self.getPage(query, p), expected[p - 1], query)
+
+                # Paging through the report with the cached page positions
+                cache.clear()
+                for p in range(1, 8):
+                    self.assertEqual(self.getPage(query, p), expected[p - 1], query)
+
+    def test_invalidation(self):
+        query = "&sidx=name&sord=desc"
+        with override_settings(REPORT_CACHE_TIMEOUT=10):
+            cache.clear()
+            page2 = self.getPage(query, 2)
+            page3 = self.getPage(query, 3)
+            self.assertEqual(page2[1], 137)
+
+            # Deleting records on the first page shifts the next pages
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/data/input/item/",
+                    json.dumps([{"delete": ["paging item 129", "paging item 128"]}]),
+                    content_type="application/json",
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                self.getPage(query, 2), (2, 135, page2[2][2:] + page3[2][:2])
+            )
+
+            # Deleting a record through the REST API
+            page2 = self.getPage(query, 2)
+            page3 = self.getPage(query, 3)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete("/api/input/item/paging item 127/")
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(
+                self.getPage(query, 2), (2, 134, page2[2][1:] + page3[2][:1])
+            )
+
+
+class HierarchyTest(TestCase):
+    def checkHierarchy(self):
+        items = {i.name: i for i in Item.objects.all()}
+        # Every lft and rght value is used exactly once, without gaps
+        self.assertEqual(
+            sorted([i.lft for i in items.values()] + [i.rght for i in items.values()]),
+            list(range(1, 2 * len(items) + 1)),
+        )
+        for i in items.values():
+            # A record is a leaf only when it has no children
+            self.assertEqual(
+                i.lft == i.rght - 1,
+                not any(j.owner_id == i.name for j in items.values()),
+            )
+            if i.owner_id:
+                owner = items[i.owner_id]
+                self.assertTrue(owner.lft < i.lft and i.rght < owner.rght)
+                self.assertEqual(i.lvl, owner.lvl + 1)
+            else:
+                self.assertEqual(i.lvl, 0)
+        # The hierarchy table has a record for every ancestor of every record
+        expected = []
+        for i in items.values():
+            parent = i
+            depth = 0
+            while parent:
+                expected.append((parent.name, i.name, depth))
+                parent = items.get(parent.owner_id)
+                depth += 1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "select parent, child, depth from item_hierarchy order by 1, 2"
+            )
+            self.assertEqual(cursor.fetchall(), sorted(expected))
+
+    def test_move_and_delete(self):
+        for name, owner in (
+            ("all", None),
+            ("a", "all"),
+            ("a1", "a"),
+            ("a2", "a"),
+            ("b", "all"),
+            ("b1", "b"),
+            ("c", None),
+        ):
+            Item(name=name, owner_id=owner).save()
+        Item.rebuildHierarchy()
+        self.checkHierarchy()
+
+        # Move a leaf and a subtree to another owner
+        for name, owner in (("b1", "a"), ("a", "c")):
+            item = Item.objects.get(name=name)
+            item.owner_id = owner
+            item.save()
+            Item.rebuildHierarchy()
+            self.checkHierarchy()
+        self.assertEqual(
+            Item.objects.get(name="b").rght, Item.objects.get(name="b").lft + 1
+        )
+
+        # Delete a leaf and a record with children
+        for name in ("a2", "a"):
+            Item.objects.get(name=name).delete()
+            Item.rebuildHierarchy()
+            self.checkHierarchy()
+        self.assertIsNone(Item.objects.get(name="a1").owner_id)
+
+
 class ExcelTest(TransactionTestCase):
     fixtures = ["demo"]
 
@@ -891,6 +1273,47 @@ class NotificationTest(TransactionTestCase):
         NotificationFactory.start()
         self.assertEqual(Notification.objects.count(), 5)
 
+    def test_follow_operation(self):
+        user = User.objects.create_user(
+            username="test user",
+            email="tester@yourcompany.com",
+            password="big_secret12345",
+        )
+        user.user_permissions.add(
+            *Permission.objects.filter(codename__in=("view_operation",))
+        )
+        loc = Location.objects.create(name="test location")
+        routing = Operation.objects.create(
+            name="test routing", type="routing", location=loc
+        )
+        step = Operation.objects.create(name="test step", owner=routing, location=loc)
+        other = Operation.objects.create(name="other operation", location=loc)
+        Follower(
+            user=user,
+            content_type=ContentType.objects.get(model="operation"),
+            object_pk="test routing",
+        ).save()
+        for op in (routing, step, other):
+            Comment(
+                content_object=op,
+                object_repr=str(op),
+                user=user,
+                comment="test comment",
+                type="comment",
+            ).save()
+
+        # The follower of the routing is notified of comments on its steps
+        Notification.wait()
+        NotificationFactory.start()
+        self.assertEqual(
+            sorted(
+                Notification.objects.filter(user=user).values_list(
+                    "comment__object_pk", flat=True
+                )
+            ),
+            ["test routing", "test step"],
+        )
+
     def test_performance(self):
         # Admin user follows all items
         user = User.objects.get(username="admin")
@@ -74,15 +74,6 @@ class GetPlanMetrics(PlanTask):
 
                 cursor.execute(
                     """
-                    create temporary table item_hierarchy (parent character varying,
-                                                           child character varying);
-
-                    insert into item_hierarchy
-                    select parent.name, item.name from item
-                    inner join item parent on item.lft > parent.lft and item.lft < parent.rght;
-
-                    create index on item_hierarchy (child);
-
                     create temporary table demand_late_unplanned (
                        item_id varchar,
                        late_count numeric(20,8),
@@ -255,6 +246,7 @@ class GetPlanMetrics(PlanTask):
                     coalesce(sum(unplanneddemandvalue),0)
                     from item_hierarchy
                     left outer join metrics on item_hierarchy.child = metrics.item_id
+                    where item_hierarchy.depth > 0
                     group by parent;
                     """
                 )
@@ -294,7 +286,6 @@ class GetPlanMetrics(PlanTask):
 
                 cursor.execute(
                     """
-                    drop table item_hierarchy;
                     drop table demand_late_unplanned;
                     drop table metrics;
                     """
@@ -309,12 +300,11 @@ class GetPlanMetrics(PlanTask):
 
                 cursor.execute(
                     """
-                    with resource_hierarchy as (select child.name child, parent.name parent
-                    from resource child
-                    inner join resource parent on child.lft between parent.lft and parent.rght
-                    where child.lft = child.rght-1),
-                    cte as (
+                    with cte as (
                         select parent, count(out_problem.id) as overloadcount from resource_hierarchy
+                        inner join resource child
+                          on child.name = resource_hierarchy.child
+                          and child.lft = child.rght-1
                         left outer join out_problem
                           on out_problem.name = 'overload'
                           and out_problem.owner = resource_hierarchy.child
@@ -363,6 +363,7 @@ class OdooReadData(PlanTask):
                     """,
                     (frepple.settings.current.strftime("%Y-%m-%d %H:%M:%S"),),
                 )
+            Parameter.clearCache(database)
 
         # Synchronize users
         if hasattr(frepple.settings, "users") and "noexportstatic" not in os.environ:
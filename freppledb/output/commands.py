@@ -35,13 +35,34 @@ from freppledb.common.commands import (
     PlanTaskRegistry,
     PlanTask,
     clean_value,
+    balance_partitions,
+    copy_rows,
+    copy_rows_parallel,
     CopyFromGenerator,
+    stage_table,
 )
 from freppledb.input.models import OperationPlan
 from freppledb.boot import getAttributes
 
 logger = logging.getLogger(__name__)
 
+# Minimum number of records in a partition of a parallel export
+EXPORT_PARTITION_SIZE = 10000
+
+
+def getBalancedPartitions(objects, weight):
+    """
+    Splits the objects to export in at most EXPORT_PARTITIONS partitions
+    with a similar number of records.
+    Returns None when the export is too small to split.
+    """
+    weighted = [(weight(o), o) for o in objects]
+    count = min(
+        settings.EXPORT_PARTITIONS,
+        sum(w for w, o in weighted) // EXPORT_PARTITION_SIZE,
+    )
+    return balance_partitions(weighted, count) if count > 1 else None
+
 
 @PlanTaskRegistry.register
 class loadConstraints(PlanTask):
@@ -130,7 +151,9 @@ class TruncatePlan(PlanTask):
 
         cursor = connections[database].cursor()
         if cluster == -1:
-            # Complete export for the complete model
+            # Complete export for the complete model.
+            # Tasks reading the plan can't run till it is completely written.
+            PlanWriteLock.acquire(database)
             if "fcst" in os.environ:
                 cursor.execute(
                     "truncate table out_problem, out_resourceplan, out_constraint"
@@ -377,6 +400,23 @@ class TruncatePlan(PlanTask):
             cursor.execute("drop table cluster_keys")
 
 
+@PlanTaskRegistry.register
+class ReleasePlan(PlanTask):
+    description = "Release the plan to other tasks"
+    sequence = 998
+
+    @classmethod
+    def getWeight(cls, **kwargs):
+        if "supply" in os.environ and "noexport" not in os.environ:
+            return 0.1
+        else:
+            return -1
+
+    @classmethod
+    def run(cls, **kwargs):
+        PlanWriteLock.release()
+
+
 @PlanTaskRegistry.register
 class ShowPlanStats(PlanTask):
     description = "Show plan statistics"
@@ -441,13 +481,13 @@ class ExportProblems(PlanTask):
                 )
             ):
                 entity = "forecast"
-            yield "%s\v%s\v%s\v%s\v%s\v%s\n" % (
-                clean_value(entity),
-                clean_value(i.name),
-                clean_value(owner.name),
-                clean_value(i.description),
-                str(i.start),
-                str(i.end),
+            yield (
+                entity,
+                i.name,
+                owner.name,
+                i.description,
+                i.start,
+                i.end,
             )
 
     @classmethod
@@ -455,10 +495,10 @@ class ExportProblems(PlanTask):
         if cluster == -2:
             return
         with connections[database].cursor() as cursor:
-            cursor.copy_from(
-                CopyFromGenerator(cls.getData(cluster)),
+            copy_rows(
+                cursor,
                 "out_problem",
-                columns=(
+                (
                     "entity",
                     "name",
                     "owner",
@@ -466,8 +506,7 @@ class ExportProblems(PlanTask):
                     "startdate",
                     "enddate",
                 ),
-                size=1024,
-                sep="\v",
+                cls.getData(cluster),
             )
 
 
@@ -493,28 +532,24 @@ class ExportConstraints(PlanTask):
                 continue
             for i in d.constraints:
                 try:
-                    yield "%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\n" % (
+                    yield (
+                        (d.name if isinstance(d, frepple.demand_default) else None),
                         (
-                            clean_value(d.name)
+                            None
                             if isinstance(d, frepple.demand_default)
-                            else "\\N"
+                            else d.owner.name if d.owner else d.name
                         ),
-                        (
-                            "\\N"
-                            if isinstance(d, frepple.demand_default)
-                            else clean_value(d.owner.name if d.owner else d.name)
-                        ),
-                        clean_value(d.item.name),
-                        clean_value(i.entity),
-                        clean_value(i.name),
+                        d.item.name,
+                        i.entity,
+                        i.name,
                         (
                             isinstance(i.owner, frepple.operationplan)
-                            and clean_value(i.owner.operation.name)
-                            or clean_value(i.owner.name)
+                            and i.owner.operation.name
+                            or i.owner.name
                         ),
-                        clean_value(i.description),
-                        str(i.start),
-                        str(i.end),
+                        i.description,
+                        i.start,
+                        i.end,
                     )
                 except Exception:
                     print("Error exporting constraint of demand '%s': %s" % (d.name, i))
@@ -524,10 +559,10 @@ class ExportConstraints(PlanTask):
         if cluster == -2:
             return
         with connections[database].cursor() as cursor:
-            cursor.copy_from(
-                CopyFromGenerator(cls.getData(cluster=cluster)),
+            copy_rows(
+                cursor,
                 "out_constraint",
-                columns=(
+                (
                     "demand",
                     "forecast",
                     "item",
@@ -538,8 +573,7 @@ class ExportConstraints(PlanTask):
                     "startdate",
                     "enddate",
                 ),
-                size=1024,
-                sep="\v",
+                cls.getData(cluster=cluster),
             )
 
 
@@ -549,6 +583,34 @@ class ExportOperationPlans(PlanTask):
     sequence = (401, "export1", 1)
     export = True
 
+    columns = [
+        "name",
+        "type",
+        "status",
+        "quantity",
+        "startdate",
+        "enddate",
+        "criticality",
+        "delay",
+        "plan",
+        "source",
+        "lastmodified",
+        "operation_id",
+        "owner_id",
+        "item_id",
+        "destination_id",
+        "origin_id",
+        "location_id",
+        "supplier_id",
+        "demand_id",
+        "due",
+        "color",
+        "reference",
+        "batch",
+        "remark",
+        "quantity_completed",
+    ]
+
     @classmethod
     def getWeight(cls, **kwargs):
         if (
@@ -558,6 +620,28 @@ class ExportOperationPlans(PlanTask):
         else:
             return -1
 
+    @staticmethod
+    def getPartitions(cluster, database=DEFAULT_DB_ALIAS):
+        """
+        Returns the operations to export in each parallel partition, balanced
+        on their number of operationplans.
+        Returns None when the export needs to run over a single connection.
+        """
+        import frepple
+
+        if (
+            cluster == -2
+            or settings.EXPORT_PARTITIONS <= 1
+            or connections[database].in_atomic_block
+        ):
+            return None
+        operations = [
+            i for i in frepple.operations() if cluster == -1 or i.cluster in cluster
+        ]
+        return getBalancedPartitions(
+            operations, lambda i: sum(1 for j in i.operationplans)
+        )
+
     @staticmethod
     def getPegging(opplan, buffer=None):
         import frepple
@@ -633,31 +717,28 @@ class ExportOperationPlans(PlanTask):
                 pln["location"] = buffer.location.name
         if opplan.rule:
             pln["setuprule"] = [opplan.rule.setupmatrix.name, opplan.rule.priority]
-        # We need to double any backslash to assure that the string remains
-        # valid when passing it through postgresql (which eats them away)
-        return json.dumps(pln).replace("\\", "\\\\")
+        return json.dumps(pln)
 
     @classmethod
     def getData(
-        cls, with_fcst, timestamp, cluster=-1, opplans=None, accepted_status=[]
+        cls,
+        with_fcst,
+        timestamp,
+        cluster=-1,
+        opplans=None,
+        accepted_status=[],
+        operations=None,
     ):
         import frepple
 
-        linetemplate = "%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s"
-        if with_fcst:
-            linetemplate += "\v%s"
-        for unused in cls.attrs:
-            linetemplate += "\v%s"
-        linetemplate += "\n"
-
         if cluster == -2:
             for j in opplans:
                 if j.status in accepted_status:
                     data = cls.getDataOpplan(j.operation, j, with_fcst, timestamp)
                     if data:
-                        yield linetemplate % tuple(data)
+                        yield data
         else:
-            for i in frepple.operations():
+            for i in frepple.operations() if operations is None else operations:
                 if cluster != -1 and i.cluster not in cluster:
                     continue
 
@@ -665,7 +746,7 @@ class ExportOperationPlans(PlanTask):
                     if j.status in accepted_status:
                         data = cls.getDataOpplan(i, j, with_fcst, timestamp)
                         if data:
-                            yield linetemplate % tuple(data)
+                            yield data
 
     @classmethod
     def getDataOpplan(cls, i, j, with_fcst, timestamp):
@@ -704,140 +785,136 @@ class ExportOperationPlans(PlanTask):
         if isinstance(i, frepple.operation_inventory) or (
             j.demand or (j.owner and j.owner.demand)
         ):
-            color = "\\N"
+            color = None
         else:
             color = j.getColor()[0]
             if color == 999999:
-                color = "\\N"
+                color = None
 
         data = None
         if isinstance(i, frepple.operation_inventory):
             # Export inventory
             data = [
-                clean_value(i.name),
+                i.name,
                 "STCK",
                 status,
                 round(j.quantity, 8),
-                str(j.start),
-                str(j.end),
+                j.start,
+                j.end,
                 round(j.criticality, 8),
                 delay,
                 cls.getPegging(j),
-                clean_value(j.source),
+                j.source,
                 timestamp,
-                "\\N",
+                None,
                 (
-                    clean_value(j.owner.reference)
+                    j.owner.reference
                     if j.owner and not j.owner.operation.hidden
-                    else "\\N"
+                    else None
                 ),
-                clean_value(j.operation.buffer.item.name),
-                clean_value(j.operation.buffer.location.name),
-                "\\N",
-                clean_value(j.operation.buffer.location.name),
-                "\\N",
-                clean_value(j.demand.name) if demand else "\\N",
+                j.operation.buffer.item.name,
+                j.operation.buffer.location.name,
+                None,
+                j.operation.buffer.location.name,
+                None,
+                j.demand.name if demand else None,
                 (
                     j.demand.due
                     if j.demand
-                    else j.owner.demand.due if j.owner and j.owner.demand else "\\N"
+                    else j.owner.demand.due if j.owner and j.owner.demand else None
                 ),
-                "\\N",  # color is empty for stock
-                clean_value(j.reference),
-                clean_value(j.batch),
-                clean_value(j.remark),
-                "\\N",
+                None,  # color is empty for stock
+                j.reference,
+                j.batch,
+                j.remark,
+                None,
             ]
         elif isinstance(i, frepple.operation_itemdistribution):
             # Export DO
             data = [
-                clean_value(i.name),
+                i.name,
                 "DO",
                 status,
                 round(j.quantity, 8),
-                str(j.start),
-                str(j.end),
+                j.start,
+                j.end,
                 round(j.criticality, 8),
                 delay,
                 cls.getPegging(j),
-                clean_value(j.source),
+                j.source,
                 timestamp,
-                "\\N",
+                None,
                 (
-                    clean_value(j.owner.reference)
+                    j.owner.reference
                     if j.owner and not j.owner.operation.hidden
-                    else "\\N"
+                    else None
                 ),
                 (
-                    clean_value(j.operation.destination.item.name)
+                    j.operation.destination.item.name
                     if j.operation.destination
                     else j.operation.origin.item.name
                 ),
                 (
-                    clean_value(j.operation.destination.location.name)
+                    j.operation.destination.location.name
                     if j.operation.destination
-                    else "\\N"
-                ),
-                (
-                    clean_value(j.operation.origin.location.name)
-                    if j.operation.origin
-                    else "\\N"
+                    else None
                 ),
-                "\\N",
-                "\\N",
-                clean_value(j.demand.name) if demand else "\\N",
+                (j.operation.origin.location.name if j.operation.origin else None),
+                None,
+                None,
+                j.demand.name if demand else None,
                 (
                     j.demand.due
                     if j.demand
-                    else j.owner.demand.due if j.owner and j.owner.demand else "\\N"
+                    else j.owner.demand.due if j.owner and j.owner.demand else None
                 ),
                 color,  # color
-                clean_value(j.reference),
-                clean_value(j.batch),
-                clean_value(j.remark),
-                "\\N",
+                j.reference,
+                j.batch,
+                j.remark,
+                None,
             ]
         elif isinstance(i, frepple.operation_itemsupplier):
             # Export PO
             data = [
-                clean_value(i.name),
+                i.name,
                 "PO",
                 status,
                 round(j.quantity, 8),
-                str(j.start),
-                str(j.end),
+                j.start,
+                j.end,
                 round(j.criticality, 8),
                 delay,
                 cls.getPegging(j),
-                clean_value(j.source),
+                j.source,
                 timestamp,
-                "\\N",
+                None,
                 (
-                    clean_value(j.owner.reference)
+                    j.owner.reference
                     if j.owner and not j.owner.operation.hidden
-                    else "\\N"
+                    else None
                 ),
-                clean_value(j.operation.buffer.item.name),
-                "\\N",
-                "\\N",
-                clean_value(j.operation.buffer.location.name),
-                clean_value(j.operation.itemsupplier.supplier.name),
-                clean_value(j.demand.name) if demand else "\\N",
+                j.operation.buffer.item.name,
+                None,
+                None,
+                j.operation.buffer.location.name,
+                j.operation.itemsupplier.supplier.name,
+                j.demand.name if demand else None,
                 (
                     j.demand.due
                     if j.demand
-                    else j.owner.demand.due if j.owner and j.owner.demand else "\\N"
+                    else j.owner.demand.due if j.owner and j.owner.demand else None
                 ),
                 color,  # color
-                clean_value(j.reference),
-                clean_value(j.batch),
-                clean_value(j.remark),
-                "\\N",
+                j.reference,
+                j.batch,
+                j.remark,
+                None,
             ]
         elif not i.hidden:
             # Export MO
             data = [
-                clean_value(i.name),
+                i.name,
                 (
                     "WO"
                     if j.owner
@@ -846,106 +923,106 @@ class ExportOperationPlans(PlanTask):
                 ),
                 status,
                 round(j.quantity, 8),
-                str(j.start),
-                str(j.end),
+                j.start,
+                j.end,
                 round(j.criticality, 8),
                 delay,
                 cls.getPegging(j),
-                clean_value(j.source),
+                j.source,
                 timestamp,
-                clean_value(i.name),
+                i.name,
                 (
-                    clean_value(j.owner.reference)
+                    j.owner.reference
                     if j.owner and not j.owner.operation.hidden
-                    else "\\N"
+                    else None
                 ),
                 (
-                    clean_value(i.item.name)
+                    i.item.name
                     if i.item
                     else (
-                        clean_value(i.owner.item.name)
+                        i.owner.item.name
                         if i.owner and i.owner.item
                         else (
-                            clean_value(j.demand.item.name)
+                            j.demand.item.name
                             if j.demand and j.demand.item
                             else (
-                                clean_value(j.owner.demand.item.name)
+                                j.owner.demand.item.name
                                 if j.owner and j.owner.demand and j.owner.demand.item
-                                else "\\N"
+                                else None
                             )
                         )
                     )
                 ),
-                "\\N",
-                "\\N",
-                clean_value(i.location.name) if i.location else "\\N",
-                "\\N",
-                clean_value(j.demand.name) if demand and j.demand else "\\N",
+                None,
+                None,
+                i.location.name if i.location else None,
+                None,
+                j.demand.name if demand and j.demand else None,
                 (
                     j.demand.due
                     if j.demand
-                    else j.owner.demand.due if j.owner and j.owner.demand else "\\N"
+                    else j.owner.demand.due if j.owner and j.owner.demand else None
                 ),
                 color,  # color
-                clean_value(j.reference),
-                clean_value(j.batch),
-                clean_value(j.remark),
-                round(j.quantity_completed, 8) if j.quantity_completed else "\\N",
+                j.reference,
+                j.batch,
+                j.remark,
+                round(j.quantity_completed, 8) if j.quantity_completed else None,
             ]
         elif j.demand or (j.owner and j.owner.demand):
             # Export shipments (with automatically created delivery operations)
             data = [
-                clean_value(i.name),
+                i.name,
                 "DLVR",
                 status,
                 round(j.quantity, 8),
-                str(j.start),
-                str(j.end),
+                j.start,
+                j.end,
                 round(j.criticality, 8),
                 delay,
                 cls.getPegging(j),
-                clean_value(j.source),
+                j.source,
                 timestamp,
-                "\\N",
+                None,
                 (
-                    clean_value(j.owner.reference)
+                    j.owner.reference
                     if j.owner and not j.owner.operation.hidden
-                    else "\\N"
+                    else None
                 ),
-                clean_value(
+                (
                     j.owner.demand.item.name
                     if j.owner and j.owner.demand
                     else j.demand.item.name
                 ),
-                "\\N",
-                "\\N",
-                clean_value(
+                None,
+                None,
+                (
                     j.owner.demand.location.name
                     if j.owner and j.owner.demand
                     else j.demand.location.name
                 ),
-                "\\N",
-                clean_value(j.demand.name) if demand else "\\N",
+                None,
+                j.demand.name if demand else None,
                 (
                     j.demand.due
                     if j.demand
-                    else j.owner.demand.due if j.owner and j.owner.demand else "\\N"
+                    else j.owner.demand.due if j.owner and j.owner.demand else None
                 ),
-                "\\N",  # color is empty for deliver operation
-                clean_value(j.reference),
-                clean_value(j.batch),
-                clean_value(j.remark),
-                "\\N",
+                None,  # color is empty for deliver operation
+                j.reference,
+                j.batch,
+                j.remark,
+                None,
             ]
         if data:
             if with_fcst:
-                data.append(clean_value(forecast.owner.name) if forecast else "\\N")
+                data.append(forecast.owner.name if forecast else None)
             for attr in cls.attrs:
                 v = getattr(j, attr[0], None)
                 if v is None:
-                    data.append("\\N")
+                    data.append(None)
                 elif attr[2] == "boolean":
-                    data.append("t" if v != "False" else "f")
+                    data.append(v != "False")
                 elif attr[2] == "duration":
                     data.append(v)
                 elif attr[2] == "integer":
@@ -953,7 +1030,7 @@ class ExportOperationPlans(PlanTask):
                 elif attr[2] == "number":
                     data.append(round(v, 6))
                 elif attr[2] == "string":
-                    data.append(clean_value(v))
+                    data.append(v)
                 elif attr[2] == "time":
                     data.append(v)
                 elif attr[2] == "date":
@@ -971,10 +1048,18 @@ class ExportOperationPlans(PlanTask):
         with_fcst = "freppledb.forecast" in settings.INSTALLED_APPS
         cls.attrs = [x for x in getAttributes(OperationPlan) if x[0] != "forecast"]
 
-        # Export operationplans to a temporary table
+        # Export operationplans to a temporary table.
+        # When exporting in parallel partitions, we use a staging table that is
+        # visible to the connections of all partitions.
         cursor = connections[database].cursor()
-        sql = """
-            create temporary table tmp_operationplan (
+        partitions = cls.getPartitions(cluster, database)
+        if partitions:
+            stage = stage_table(cursor, "tmp_operationplan")
+            sql = "create unlogged table %s (" % stage
+        else:
+            stage = "tmp_operationplan"
+            sql = "create temporary table tmp_operationplan ("
+        sql += """
                 name character varying,
                 type character varying NOT NULL,
                 status character varying,
@@ -1025,132 +1110,133 @@ class ExportOperationPlans(PlanTask):
         sql += ")"
         cursor.execute(sql)
 
-        cursor.copy_from(
-            CopyFromGenerator(
-                cls.getData(
-                    with_fcst,
-                    cls.parent.timestamp,
-                    cluster=cluster,
-                    opplans=opplans,
-                    accepted_status=(
-                        ["confirmed", "approved", "completed", "closed"]
-                        if cluster != -2
-                        else [
-                            "proposed",
-                            "confirmed",
-                            "approved",
-                            "completed",
-                            "closed",
-                        ]
+        columns = (
+            cls.columns
+            + (["forecast"] if with_fcst else [])
+            + [a[0] for a in cls.attrs]
+        )
+        try:
+            if partitions:
+                # All operationplans, including the proposed ones, are exported
+                # to the staging table and merged in a single statement.
+                cnt = copy_rows_parallel(
+                    database,
+                    stage,
+                    columns,
+                    [
+                        cls.getData(
+                            with_fcst,
+                            cls.parent.timestamp,
+                            cluster=cluster,
+                            accepted_status=[
+                                "proposed",
+                                "confirmed",
+                                "approved",
+                                "completed",
+                                "closed",
+                            ],
+                            operations=p,
+                        )
+                        for p in partitions
+                    ],
+                )
+                logger.info(
+                    "Exported %d operationplans in %d partitions"
+                    % (cnt, len(partitions))
+                )
+            else:
+                copy_rows(
+                    cursor,
+                    stage,
+                    columns,
+                    cls.getData(
+                        with_fcst,
+                        cls.parent.timestamp,
+                        cluster=cluster,
+                        opplans=opplans,
+                        accepted_status=(
+                            ["confirmed", "approved", "completed", "closed"]
+                            if cluster != -2
+                            else [
+                                "proposed",
+                                "confirmed",
+                                "approved",
+                                "completed",
+                                "closed",
+                            ]
+                        ),
                     ),
                 )
-            ),
-            table="tmp_operationplan",
-            size=1024,
-            sep="\v",
-        )
 
-        if with_fcst:
-            forecastfield0 = " ,forecast=excluded.forecast"
-            forecastfield1 = " ,forecast"
-        else:
-            forecastfield0 = ""
-            forecastfield1 = ""
-
-        # Merge temp table into the actual table
-        sql = """
-            insert into operationplan (reference, name, type, status, quantity, startdate, enddate,
-            criticality, delay, plan, source, lastmodified, operation_id, owner_id, item_id,
-            destination_id, origin_id, location_id, supplier_id, demand_id, due%s, color, batch, remark, quantity_completed %s)
-
-            select reference, name, type, status, quantity, startdate, enddate,
-            criticality, delay * interval '1 second', plan, source, lastmodified, operation_id, owner_id, item_id,
-            destination_id, origin_id, location_id, supplier_id, demand_id, due%s, color, batch, remark, quantity_completed %s
-            from tmp_operationplan
-
-            on conflict (reference) do update
-
-            set name=excluded.name, type=excluded.type, status=excluded.status,
-                quantity=excluded.quantity, startdate=excluded.startdate, enddate=excluded.enddate,
-                criticality=excluded.criticality, delay=excluded.delay,
-                plan=excluded.plan, source=excluded.source,
-                lastmodified=excluded.lastmodified, operation_id=excluded.operation_id, owner_id=excluded.owner_id,
-                item_id=excluded.item_id, destination_id=excluded.destination_id, origin_id=excluded.origin_id,
-                location_id=excluded.location_id, supplier_id=excluded.supplier_id, demand_id=excluded.demand_id,
-                due=excluded.due%s, color=excluded.color, batch=excluded.batch, remark=excluded.remark, quantity_completed=excluded.quantity_completed%s
-            """ % (
-            forecastfield1,
-            "".join(",%s " % a[0] for a in cls.attrs),
-            forecastfield1,
-            "".join(",%s " % a[0] for a in cls.attrs),
-            forecastfield0,
-            "".join(", %s = excluded.%s" % (a[0], a[0]) for a in cls.attrs),
-        )
+            if with_fcst:
+                forecastfield0 = " ,forecast=excluded.forecast"
+                forecastfield1 = " ,forecast"
+            else:
+                forecastfield0 = ""
+                forecastfield1 = ""
+
+            # Merge temp table into the actual table
+            sql = """
+                insert into operationplan (reference, name, type, status, quantity, startdate, enddate,
+                criticality, delay, plan, source, lastmodified, operation_id, owner_id, item_id,
+                destination_id, origin_id, location_id, supplier_id, demand_id, due%s, color, batch, remark, quantity_completed %s)
+
+                select reference, name, type, status, quantity, startdate, enddate,
+                criticality, delay * interval '1 second', plan, source, lastmodified, operation_id, owner_id, item_id,
+                destination_id, origin_id, location_id, supplier_id, demand_id, due%s, color, batch, remark, quantity_completed %s
+                from %s
+
+                on conflict (reference) do update
+
+                set name=excluded.name, type=excluded.type, status=excluded.status,
+                    quantity=excluded.quantity, startdate=excluded.startdate, enddate=excluded.enddate,
+                    criticality=excluded.criticality, delay=excluded.delay,
+                    plan=excluded.plan, source=excluded.source,
+                    lastmodified=excluded.lastmodified, operation_id=excluded.operation_id, owner_id=excluded.owner_id,
+                    item_id=excluded.item_id, destination_id=excluded.destination_id, origin_id=excluded.origin_id,
+                    location_id=excluded.location_id, supplier_id=excluded.supplier_id, demand_id=excluded.demand_id,
+                    due=excluded.due%s, color=excluded.color, batch=excluded.batch, remark=excluded.remark, quantity_completed=excluded.quantity_completed%s
+                """ % (
+                forecastfield1,
+                "".join(",%s " % a[0] for a in cls.attrs),
+                forecastfield1,
+                "".join(",%s " % a[0] for a in cls.attrs),
+                stage,
+                forecastfield0,
+                "".join(", %s = excluded.%s" % (a[0], a[0]) for a in cls.attrs),
+            )
 
-        cursor.execute(sql)
+            cursor.execute(sql)
 
-        # Make sure any deleted confirmed MO from Plan Editor gets deleted in the database
-        # Only MO can currently be deleted through Plan Editor
-        if cluster != -2:
-            cursor.execute(
-                """
-                delete from operationplan
-                where status in ('confirmed','approved','completed','closed')
-                and type in ('MO','WO')
-                and not exists (select 1 from tmp_operationplan where reference = operationplan.reference)
-                """
-            )
+            # Make sure any deleted confirmed MO from Plan Editor gets deleted in the database
+            # Only MO can currently be deleted through Plan Editor
+            if cluster != -2:
+                cursor.execute(
+                    """
+                    delete from operationplan
+                    where status in ('confirmed','approved','completed','closed')
+                    and type in ('MO','WO')
+                    and not exists (select 1 from %s where reference = operationplan.reference)
+                    """
+                    % stage
+                )
+        finally:
+            if partitions:
+                cursor.execute("drop table if exists %s" % stage)
 
         # Directly injecting proposed records in operationplan table
-        if cluster != -2:
-            cursor.copy_from(
-                CopyFromGenerator(
-                    cls.getData(
-                        with_fcst,
-                        cls.parent.timestamp,
-                        cluster=cluster,
-                        opplans=opplans,
-                        accepted_status=["proposed"],
-                    )
+        if cluster != -2 and not partitions:
+            copy_rows(
+                cursor,
+                "operationplan",
+                columns,
+                cls.getData(
+                    with_fcst,
+                    cls.parent.timestamp,
+                    cluster=cluster,
+                    opplans=opplans,
+                    accepted_status=["proposed"],
                 ),
-                table="operationplan",
-                size=1024,
-                sep="\v",
-                columns=[
-                    "name",
-                    "type",
-                    "status",
-                    "quantity",
-                    "startdate",
-                    "enddate",
-                    "criticality",
-                    "delay",
-                    "plan",
-                    "source",
-                    "lastmodified",
-                    "operation_id",
-                    "owner_id",
-                    "item_id",
-                    "destination_id",
-                    "origin_id",
-                    "location_id",
-                    "supplier_id",
-                    "demand_id",
-                    "due",
-                    "color",
-                    "reference",
-                    "batch",
-                    "remark",
-                    "quantity_completed",
-                ]
-                + (
-                    [
-                        "forecast",
-                    ]
-                    if with_fcst
-                    else []
-                )
-                + [a[0] for a in cls.attrs],
             )
 
         # update demand table specific fields
@@ -1239,6 +1325,138 @@ class ExportOperationPlans(PlanTask):
             """
         )
 
+        cls.exportPeggingEdges(
+            cursor,
+            cluster=cluster,
+            timestamp=cls.parent.timestamp,
+            deleted_opplans=kwargs.get("deleted_opplans", None),
+        )
+
+    @staticmethod
+    def exportPeggingEdges(cursor, cluster=-1, timestamp=None, deleted_opplans=None):
+        """
+        Refreshes the pegging edges between operationplans in the out_pegging
+        table. Reports traverse the pegging network with this indexed table,
+        rather than with the json arrays in the plan field.
+
+        An edge exists when the downstream operationplan lists the upstream
+        operationplan in its upstream_opplans, and the upstream operationplan
+        lists the downstream operationplan in its downstream_opplans.
+        A complete export rebuilds all edges. Other exports only rebuild the
+        edges of the operationplans exported at the timestamp.
+        """
+        upstream = """
+            cross join lateral (
+              select t->>0 as reference,
+              (t->>2)::numeric as x,
+              (t->>1)::numeric + (t->>2)::numeric as y
+              from jsonb_array_elements(downstream_opplan.plan->'upstream_opplans') t
+              ) t1
+            """
+        downstream = """
+            cross join lateral (
+              select t->>0 as reference,
+              (t->>2)::numeric as x,
+              (t->>1)::numeric + (t->>2)::numeric as y
+              from jsonb_array_elements(upstream_opplan.plan->'downstream_opplans') t
+              ) t2
+            """
+        insert = """
+            insert into out_pegging
+              (downstream, upstream, downstream_x, downstream_y, upstream_x, upstream_y)
+            select
+              downstream_opplan.reference, upstream_opplan.reference,
+              t2.x, t2.y, t1.x, t1.y
+            """
+
+        if cluster == -1:
+            cursor.execute("delete from out_pegging where demand is null")
+            cursor.execute(
+                """
+                %s
+                from operationplan downstream_opplan
+                %s
+                inner join operationplan upstream_opplan
+                  on upstream_opplan.reference = t1.reference
+                %s
+                where t2.reference = downstream_opplan.reference
+                """
+                % (insert, upstream, downstream)
+            )
+            return
+
+        cursor.execute(
+            """
+            create temporary table tmp_pegging (
+              reference character varying primary key
+              )
+            """
+        )
+        cursor.execute(
+            """
+            insert into tmp_pegging
+            select reference from operationplan where lastmodified = %s
+            union
+            select unnest(%s::character varying[])
+            """,
+            (timestamp, list(deleted_opplans or [])),
+        )
+        cursor.execute("analyze tmp_pegging")
+        cursor.execute(
+            """
+            delete from out_pegging
+            where demand is null
+            and (
+              exists (select 1 from tmp_pegging where reference = out_pegging.downstream)
+              or exists (select 1 from tmp_pegging where reference = out_pegging.upstream)
+              %s
+              )
+            """
+            % (
+                # Partial exports for a cluster can delete operationplans
+                # that aren't exported any more.
+                """
+                or not exists (select 1 from operationplan where reference = out_pegging.downstream)
+                or not exists (select 1 from operationplan where reference = out_pegging.upstream)
+                """
+                if cluster != -2
+                else ""
+            )
+        )
+        cursor.execute(
+            """
+            %s
+            from tmp_pegging
+            inner join operationplan downstream_opplan
+              on downstream_opplan.reference = tmp_pegging.reference
+            %s
+            inner join operationplan upstream_opplan
+              on upstream_opplan.reference = t1.reference
+            %s
+            where t2.reference = downstream_opplan.reference
+            """
+            % (insert, upstream, downstream)
+        )
+        cursor.execute(
+            """
+            %s
+            from tmp_pegging
+            inner join operationplan upstream_opplan
+              on upstream_opplan.reference = tmp_pegging.reference
+            %s
+            inner join operationplan downstream_opplan
+              on downstream_opplan.reference = t2.reference
+            %s
+            where t1.reference = upstream_opplan.reference
+            and not exists (
+              select 1 from tmp_pegging
+              where tmp_pegging.reference = downstream_opplan.reference
+              )
+            """
+            % (insert, downstream, upstream)
+        )
+        cursor.execute("drop table tmp_pegging")
+
 
 @PlanTaskRegistry.register
 class ExportOperationPlanMaterials(PlanTask):
@@ -1259,7 +1477,7 @@ class ExportOperationPlanMaterials(PlanTask):
     def getData(timestamp, cluster=-1, buffers=None):
         import frepple
 
-        for i in buffers if cluster == -2 else frepple.buffers():
+        for i in frepple.buffers() if buffers is None else buffers:
             if cluster not in (-1, -2) and i.cluster not in cluster:
                 continue
             for j in i.flowplans:
@@ -1276,12 +1494,12 @@ class ExportOperationPlanMaterials(PlanTask):
                         )
                     )
                 else:
-                    yield "%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\n" % (
-                        clean_value(j.operationplan.reference),
-                        clean_value(j.buffer.item.name),
-                        clean_value(j.buffer.location.name),
+                    yield (
+                        j.operationplan.reference,
+                        j.buffer.item.name,
+                        j.buffer.location.name,
                         round(j.quantity, 8),
-                        str(j.date),
+                        j.date,
                         round(j.onhand, 8),
                         round(j.minimum, 8),
                         round(j.period_of_cover, 8),
@@ -1301,31 +1519,76 @@ class ExportOperationPlanMaterials(PlanTask):
         if cluster == -2 and not buffers:
             return
 
+        columns = (
+            "operationplan_id",
+            "item_id",
+            "location_id",
+            "quantity",
+            "flowdate",
+            "onhand",
+            "minimum",
+            "periodofcover",
+            "status",
+            "lastmodified",
+        )
         cursor = connections[database].cursor()
-        cursor.copy_from(
-            CopyFromGenerator(
+        if (
+            cluster == -2
+            or settings.EXPORT_PARTITIONS <= 1
+            or connections[database].in_atomic_block
+        ):
+            partitions = None
+        else:
+            import frepple
+
+            partitions = getBalancedPartitions(
+                [i for i in frepple.buffers() if cluster == -1 or i.cluster in cluster],
+                lambda i: sum(1 for j in i.flowplans),
+            )
+        if not partitions:
+            copy_rows(
+                cursor,
+                "operationplanmaterial",
+                columns,
                 cls.getData(
                     timestamp=timestamp or cls.parent.timestamp,
                     cluster=cluster,
                     buffers=buffers,
-                )
-            ),
-            "operationplanmaterial",
-            columns=(
-                "operationplan_id",
-                "item_id",
-                "location_id",
-                "quantity",
-                "flowdate",
-                "onhand",
-                "minimum",
-                "periodofcover",
-                "status",
-                "lastmodified",
-            ),
-            size=1024,
-            sep="\v",
+                ),
+            )
+            return
+
+        # Export in parallel partitions to a staging table, and merge
+        # the staging table in a single statement
+        stage = stage_table(cursor, "tmp_operationplanmaterial")
+        cursor.execute(
+            "create unlogged table %s as select %s from operationplanmaterial where false"
+            % (stage, ",".join(columns))
         )
+        try:
+            cnt = copy_rows_parallel(
+                database,
+                stage,
+                columns,
+                [
+                    cls.getData(
+                        timestamp=timestamp or cls.parent.timestamp,
+                        cluster=cluster,
+                        buffers=p,
+                    )
+                    for p in partitions
+                ],
+            )
+            cursor.execute(
+                "insert into operationplanmaterial (%s) select %s from %s"
+                % (",".join(columns), ",".join(columns), stage)
+            )
+            logger.info(
+                "Exported %d operationplanmaterials in %d partitions"
+                % (cnt, len(partitions))
+            )
+        finally:
+            cursor.execute("drop table if exists %s" % stage)
 
 
 @PlanTaskRegistry.register
@@ -1474,11 +1737,11 @@ class ExportOperationPlanResources(PlanTask):
                         )
                     )
                 else:
-                    yield "%s\v%s\v%s\v%s\v%s\v%s\n" % (
-                        clean_value(j.operationplan.reference),
-                        clean_value(j.resource.name),
+                    yield (
+                        j.operationplan.reference,
+                        j.resource.name,
                         round(-j.quantity, 8),
-                        clean_value(j.setup),
+                        j.setup,
                         j.status,
                         timestamp,
                     )
@@ -1495,17 +1758,10 @@ class ExportOperationPlanResources(PlanTask):
         if cluster == -2 and not resources:
             return
         with connections[database].cursor() as cursor:
-            cursor.copy_from(
-                CopyFromGenerator(
-                    cls.getData(
-                        timestamp=timestamp or cls.parent.timestamp,
-                        cluster=cluster,
-                        resources=resources,
-                        **kwargs,
-                    )
-                ),
+            copy_rows(
+                cursor,
                 "operationplanresource",
-                columns=(
+                (
                     "operationplan_id",
                     "resource_id",
                     "quantity",
@@ -1513,8 +1769,12 @@ class ExportOperationPlanResources(PlanTask):
                     "status",
                     "lastmodified",
                 ),
-                size=1024,
-                sep="\v",
+                cls.getData(
+                    timestamp=timestamp or cls.parent.timestamp,
+                    cluster=cluster,
+                    resources=resources,
+                    **kwargs,
+                ),
             )
 
 
@@ -1585,9 +1845,9 @@ class ExportResourcePlans(PlanTask):
                 if cluster not in (-1, -2) and cluster != i.cluster:
                     continue
                 for j in i.plan(buckets):
-                    yield "%s\v%s\v%s\v%s\v%s\v%s\v%s\v%s\n" % (
-                        clean_value(i.name),
-                        str(j["start"]),
+                    yield (
+                        i.name,
+                        j["start"],
                         round(j["available"], 8),
                         round(j["unavailable"], 8),
                         round(j["setup"], 8),
@@ -1596,10 +1856,10 @@ class ExportResourcePlans(PlanTask):
                         round(j["load_confirmed"], 8),
                     )
 
-        cursor.copy_from(
-            CopyFromGenerator(getData(resources=resources)),
+        copy_rows(
+            cursor,
             "out_resourceplan",
-            columns=(
+            (
                 "resource",
                 "startdate",
                 "available",
@@ -1609,8 +1869,58 @@ class ExportResourcePlans(PlanTask):
                 "free",
                 "load_confirmed",
             ),
-            size=1024,
-            sep="\v",
+            getData(resources=resources),
+        )
+
+        # Aggregate the resource plan for the buckets of every bucket level
+        if cluster == -1:
+            cursor.execute("truncate table out_resourceplanbucket")
+            resnames = None
+        else:
+            resnames = [
+                i.name
+                for i in resources or frepple.resources()
+                if cluster == -2 or i.cluster in cluster
+            ]
+            cursor.execute(
+                "delete from out_resourceplanbucket where resource = any(%s)",
+                (resnames,),
+            )
+        cursor.execute(
+            """
+            insert into out_resourceplanbucket
+              (resource, bucket, startdate, available, unavailable, setup, load,
+              free, load_confirmed, lastmodified)
+            select
+              out_resourceplan.resource, common_bucket.name, d.startdate,
+              sum(out_resourceplan.available), sum(out_resourceplan.unavailable),
+              sum(out_resourceplan.setup), sum(out_resourceplan.load),
+              sum(out_resourceplan.free), sum(out_resourceplan.load_confirmed),
+              %%s
+            from out_resourceplan
+            cross join common_bucket
+            cross join lateral (
+              select startdate, enddate
+              from common_bucketdetail
+              where common_bucketdetail.bucket_id = common_bucket.name
+              and common_bucketdetail.startdate <= out_resourceplan.startdate
+              order by common_bucketdetail.startdate desc
+              limit 1
+              ) d
+            where d.enddate > out_resourceplan.startdate
+            %s
+            group by out_resourceplan.resource, common_bucket.name, d.startdate
+            """
+            % (
+                "and out_resourceplan.resource = any(%s)"
+                if resnames is not None
+                else ""
+            ),
+            (
+                (cls.parent.timestamp, resnames)
+                if resnames is not None
+                else (cls.parent.timestamp,)
+            ),
         )
 
 
@@ -1654,9 +1964,48 @@ class ExportPegging(PlanTask):
     def run(cls, cluster=-1, demands=None, database=DEFAULT_DB_ALIAS, **kwargs):
         with transaction.atomic(using=database, savepoint=False):
             with connections[database].cursor() as cursor:
-                execute_batch(
+                cursor.execute(
+                    """
+                    create temporary table tmp_demandplan (
+                      plan jsonb,
+                      name character varying
+                      )
+                    on commit drop
+                    """
+                )
+                copy_rows(
                     cursor,
-                    "update demand set plan=%s where name=%s",
+                    "tmp_demandplan",
+                    ("plan", "name"),
                     cls.getDemandPlan(cluster=cluster, demands=demands),
-                    page_size=200,
+                )
+                cursor.execute(
+                    """
+                    update demand
+                    set plan = tmp_demandplan.plan
+                    from tmp_demandplan
+                    where demand.name = tmp_demandplan.name
+                    """
+                )
+
+                # Pegging edges of the demands
+                cursor.execute(
+                    """
+                    delete from out_pegging
+                    where demand is not null
+                    %s
+                    """
+                    % (
+                        "and demand in (select name from tmp_demandplan)"
+                        if cluster != -1
+                        else ""
+                    )
+                )
+                cursor.execute(
+                    """
+                    insert into out_pegging (demand, upstream, upstream_x, upstream_y)
+                    select tmp_demandplan.name, t->>'opplan', 0, (t->>'quantity')::numeric
+                    from tmp_demandplan
+                    cross join lateral jsonb_array_elements(tmp_demandplan.plan->'pegging') t
+                    """
                 )
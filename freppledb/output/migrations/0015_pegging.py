@@ -0,0 +1,158 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from django.conf import settings
+from django.db import migrations, models, connections
+
+
+def grant_read_access(apps, schema_editor):
+    db = schema_editor.connection.alias
+    role = settings.DATABASES[db].get("SQL_ROLE", "report_role")
+    if role:
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                "select count(*) from pg_roles where rolname = lower(%s)", (role,)
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "create role %s with nologin noinherit role current_user" % (role,)
+                )
+            cursor.execute("grant select on table out_pegging to %s" % (role,))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("output", "0014_constraint_and_problem_weight_corrected"),
+        ("input", "0068_squash_70"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Pegging",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "demand",
+                    models.CharField(db_index=True, null=True, verbose_name="demand"),
+                ),
+                (
+                    "downstream",
+                    models.CharField(
+                        db_index=True, null=True, verbose_name="downstream"
+                    ),
+                ),
+                (
+                    "upstream",
+                    models.CharField(db_index=True, verbose_name="upstream"),
+                ),
+                (
+                    "downstream_x",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="downstream x",
+                    ),
+                ),
+                (
+                    "downstream_y",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="downstream y",
+                    ),
+                ),
+                (
+                    "upstream_x",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="upstream x",
+                    ),
+                ),
+                (
+                    "upstream_y",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="upstream y",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "pegging",
+                "verbose_name_plural": "pegging",
+                "db_table": "out_pegging",
+                "default_permissions": [],
+            },
+        ),
+        migrations.RunPython(
+            code=grant_read_access,
+        ),
+        migrations.RunSQL(
+            """
+            insert into out_pegging
+              (downstream, upstream, downstream_x, downstream_y, upstream_x, upstream_y)
+            select
+              downstream_opplan.reference, upstream_opplan.reference,
+              t2.x, t2.y, t1.x, t1.y
+            from operationplan downstream_opplan
+            cross join lateral (
+              select t->>0 as reference,
+              (t->>2)::numeric as x,
+              (t->>1)::numeric + (t->>2)::numeric as y
+              from jsonb_array_elements(downstream_opplan.plan->'upstream_opplans') t
+              ) t1
+            inner join operationplan upstream_opplan
+              on upstream_opplan.reference = t1.reference
+            cross join lateral (
+              select t->>0 as reference,
+              (t->>2)::numeric as x,
+              (t->>1)::numeric + (t->>2)::numeric as y
+              from jsonb_array_elements(upstream_opplan.plan->'downstream_opplans') t
+              ) t2
+            where t2.reference = downstream_opplan.reference
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            insert into out_pegging (demand, upstream, upstream_x, upstream_y)
+            select demand.name, t->>'opplan', 0, (t->>'quantity')::numeric
+            from demand
+            cross join lateral jsonb_array_elements(demand.plan->'pegging') t
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
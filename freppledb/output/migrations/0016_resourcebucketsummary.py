@@ -0,0 +1,154 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from django.conf import settings
+from django.db import migrations, models, connections
+
+
+def grant_read_access(apps, schema_editor):
+    db = schema_editor.connection.alias
+    role = settings.DATABASES[db].get("SQL_ROLE", "report_role")
+    if role:
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                "select count(*) from pg_roles where rolname = lower(%s)", (role,)
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "create role %s with nologin noinherit role current_user" % (role,)
+                )
+            cursor.execute(
+                "grant select on table out_resourceplanbucket to %s" % (role,)
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("output", "0015_pegging"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResourceBucketSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resource", models.CharField(verbose_name="resource")),
+                ("bucket", models.CharField(verbose_name="bucket")),
+                ("startdate", models.DateTimeField(verbose_name="startdate")),
+                (
+                    "available",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="available",
+                    ),
+                ),
+                (
+                    "unavailable",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="unavailable",
+                    ),
+                ),
+                (
+                    "setup",
+                    models.DecimalField(
+                        decimal_places=8, max_digits=20, null=True, verbose_name="setup"
+                    ),
+                ),
+                (
+                    "load",
+                    models.DecimalField(
+                        decimal_places=8, max_digits=20, null=True, verbose_name="load"
+                    ),
+                ),
+                (
+                    "free",
+                    models.DecimalField(
+                        decimal_places=8, max_digits=20, null=True, verbose_name="free"
+                    ),
+                ),
+                (
+                    "load_confirmed",
+                    models.DecimalField(
+                        decimal_places=8,
+                        max_digits=20,
+                        null=True,
+                        verbose_name="confirmed load",
+                    ),
+                ),
+                (
+                    "lastmodified",
+                    models.DateTimeField(db_index=True, verbose_name="last modified"),
+                ),
+            ],
+            options={
+                "verbose_name": "resource bucket summary",
+                "verbose_name_plural": "resource bucket summaries",
+                "db_table": "out_resourceplanbucket",
+                "ordering": ["resource", "bucket", "startdate"],
+                "unique_together": {("resource", "bucket", "startdate")},
+                "default_permissions": [],
+            },
+        ),
+        migrations.RunPython(
+            code=grant_read_access,
+        ),
+        migrations.RunSQL(
+            """
+            insert into out_resourceplanbucket
+              (resource, bucket, startdate, available, unavailable, setup, load,
+              free, load_confirmed, lastmodified)
+            select
+              out_resourceplan.resource, common_bucket.name, d.startdate,
+              sum(out_resourceplan.available), sum(out_resourceplan.unavailable),
+              sum(out_resourceplan.setup), sum(out_resourceplan.load),
+              sum(out_resourceplan.free), sum(out_resourceplan.load_confirmed),
+              now()
+            from out_resourceplan
+            cross join common_bucket
+            cross join lateral (
+              select startdate, enddate
+              from common_bucketdetail
+              where common_bucketdetail.bucket_id = common_bucket.name
+              and common_bucketdetail.startdate <= out_resourceplan.startdate
+              order by common_bucketdetail.startdate desc
+              limit 1
+              ) d
+            where d.enddate > out_resourceplan.startdate
+            group by out_resourceplan.resource, common_bucket.name, d.startdate
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
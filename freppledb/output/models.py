@@ -99,3 +99,74 @@ class ResourceSummary(models.Model):
         )
         verbose_name_plural = "resource summaries"
         default_permissions = []
+
+
+class ResourceBucketSummary(models.Model):
+    """
+    Resource summary aggregated for the buckets of every bucket level.
+    The resource report reads these rollups rather than aggregating the
+    daily resource summary on every request.
+    """
+
+    allow_report_manager_access = True
+
+    resource = models.CharField(_("resource"))
+    bucket = models.CharField(_("bucket"))
+    startdate = models.DateTimeField(_("startdate"))
+    available = models.DecimalField(
+        _("available"), max_digits=20, decimal_places=8, null=True
+    )
+    unavailable = models.DecimalField(
+        _("unavailable"), max_digits=20, decimal_places=8, null=True
+    )
+    setup = models.DecimalField(_("setup"), max_digits=20, decimal_places=8, null=True)
+    load = models.DecimalField(_("load"), max_digits=20, decimal_places=8, null=True)
+    free = models.DecimalField(_("free"), max_digits=20, decimal_places=8, null=True)
+    load_confirmed = models.DecimalField(
+        _("confirmed load"), max_digits=20, decimal_places=8, null=True
+    )
+    lastmodified = models.DateTimeField(_("last modified"), db_index=True)
+
+    class Meta:
+        db_table = "out_resourceplanbucket"
+        ordering = ["resource", "bucket", "startdate"]
+        unique_together = (("resource", "bucket", "startdate"),)
+        verbose_name = "resource bucket summary"  # No need to translate these since only used internally
+        verbose_name_plural = "resource bucket summaries"
+        default_permissions = []
+
+
+class Pegging(models.Model):
+    """
+    Edges of the pegging network.
+    An edge links a downstream operationplan, or a demand, with an upstream
+    operationplan. The x and y fields are the start and end of the pegged
+    quantity on each side of the edge.
+    """
+
+    allow_report_manager_access = True
+
+    # Database fields
+    demand = models.CharField(_("demand"), null=True, db_index=True)
+    downstream = models.CharField(_("downstream"), null=True, db_index=True)
+    upstream = models.CharField(_("upstream"), db_index=True)
+    downstream_x = models.DecimalField(
+        _("downstream x"), max_digits=20, decimal_places=8, null=True
+    )
+    downstream_y = models.DecimalField(
+        _("downstream y"), max_digits=20, decimal_places=8, null=True
+    )
+    upstream_x = models.DecimalField(
+        _("upstream x"), max_digits=20, decimal_places=8, null=True
+    )
+    upstream_y = models.DecimalField(
+        _("upstream y"), max_digits=20, decimal_places=8, null=True
+    )
+
+    class Meta:
+        db_table = "out_pegging"
+        verbose_name = (
+            "pegging"  # No need to translate these since only used internally
+        )
+        verbose_name_plural = "pegging"
+        default_permissions = []
@@ -289,6 +289,29 @@ class OverviewReport(GridPivot):
         # Assure the item hierarchy is up to date
         Resource.rebuildHierarchy(database=basequery.db)
 
+        # Buckets within the horizon are read from the pre-aggregated resource
+        # plan, unless the buckets were changed after the plan was exported.
+        # Buckets partially in the horizon aggregate the daily resource plan.
+        with connections[request.database].cursor() as cursor:
+            cursor.execute(
+                """
+                select
+                  (select min(lastmodified) from out_resourceplanbucket)
+                  > coalesce(
+                    (select max(lastmodified) from common_bucketdetail where bucket_id = %s),
+                    '-infinity'
+                    )
+                """,
+                (request.report_bucket,),
+            )
+            if cursor.fetchone()[0]:
+                rollup = "(d.startdate >= '%s' and d.enddate <= '%s')" % (
+                    request.report_startdate,
+                    request.report_enddate,
+                )
+            else:
+                rollup = "false"
+
         # Execute the query
         query = """
       select res.name, res.description, res.category, res.subcategory,
@@ -299,11 +322,11 @@ class OverviewReport(GridPivot):
         res.owner_id,
         %s
         d.bucket as col1, d.startdate as col2,
-        coalesce(sum(out_resourceplan.available),0) / (case when res.type = 'buckets' then 1 else %f end) as available,
-        coalesce(sum(out_resourceplan.unavailable),0) / (case when res.type = 'buckets' then 1 else %f end) as unavailable,
-        coalesce(sum(out_resourceplan.load),0) / (case when res.type = 'buckets' then 1 else %f end) as loading,
-        coalesce(sum(out_resourceplan.setup),0) / (case when res.type = 'buckets' then 1 else %f end) as setup,
-        coalesce(sum(out_resourceplan.load_confirmed),0) / (case when res.type = 'buckets' then 1 else %f end) as load_confirmed
+        (coalesce(sum(out_resourceplanbucket.available),0) + coalesce(sum(out_resourceplan.available),0)) / (case when res.type = 'buckets' then 1 else %f end) as available,
+        (coalesce(sum(out_resourceplanbucket.unavailable),0) + coalesce(sum(out_resourceplan.unavailable),0)) / (case when res.type = 'buckets' then 1 else %f end) as unavailable,
+        (coalesce(sum(out_resourceplanbucket.load),0) + coalesce(sum(out_resourceplan.load),0)) / (case when res.type = 'buckets' then 1 else %f end) as loading,
+        (coalesce(sum(out_resourceplanbucket.setup),0) + coalesce(sum(out_resourceplan.setup),0)) / (case when res.type = 'buckets' then 1 else %f end) as setup,
+        (coalesce(sum(out_resourceplanbucket.load_confirmed),0) + coalesce(sum(out_resourceplan.load_confirmed),0)) / (case when res.type = 'buckets' then 1 else %f end) as load_confirmed
       from (%s) res
       left outer join location
         on res.location_id = location.name
@@ -314,8 +337,14 @@ class OverviewReport(GridPivot):
                    where bucket_id = '%s' and enddate > '%s' and startdate < '%s'
                    ) d
       -- Utilization info
+      left join out_resourceplanbucket
+      on %s
+      and res.name = out_resourceplanbucket.resource
+      and out_resourceplanbucket.bucket = '%s'
+      and out_resourceplanbucket.startdate = d.startdate
       left join out_resourceplan
-      on res.name = out_resourceplan.resource
+      on not %s
+      and res.name = out_resourceplan.resource
       and d.startdate <= out_resourceplan.startdate
       and d.enddate > out_resourceplan.startdate
       and out_resourceplan.startdate >= '%s'
@@ -339,6 +368,9 @@ class OverviewReport(GridPivot):
             request.report_bucket,
             request.report_startdate,
             request.report_enddate,
+            rollup,
+            request.report_bucket,
+            rollup,
             request.report_startdate,
             request.report_enddate,
             reportclass.attr_sql,
@@ -421,6 +421,28 @@ MAXSTORAGE = None  # limit in MB, use None for unlimited.
 # Max total log files size in MB, if the limit is reached deletes the oldest.
 MAXTOTALLOGFILESIZE = 200
 
+# Maximum number of tasks that run at the same time in a scenario.
+# A WORKER_SLOTS key in the DATABASES entry of a scenario overrides it.
+WORKER_SLOTS = 1
+
+# Tasks that can run alongside any other task when WORKER_SLOTS is larger
+# than 1, except while a plan run writes the plan of the scenario.
+# All other tasks wait for each other, and run one at a time.
+WORKER_CONCURRENT_TASKS = ("exporttofolder", "exportworkbook", "emailreport")
+
+# Cache the parameter values in each process. Every process then keeps an
+# extra database connection per scenario, which listens for changes to the
+# parameters. Disable the cache when the database is accessed through a
+# connection pooler in transaction mode, such as pgbouncer, which doesn't
+# support LISTEN.
+PARAMETER_CACHE = True
+
+# Number of seconds the record count and the page positions of a report
+# remain cached. Paging through a report then doesn't recount all records, and
+# deep pages are retrieved with a filter on the sort key rather than an offset.
+# Use 0 to disable the cache.
+REPORT_CACHE_TIMEOUT = 10
+
 # Google analytics code to report usage statistics to.
 # The default value of None disables this feature.
 GOOGLE_ANALYTICS = None
@@ -430,6 +452,55 @@ GOOGLE_ANALYTICS = None
 CACHE_MAXIMUM = 1000000
 CACHE_THREADS = 1
 
+# Use the binary COPY format to export the plan to the database.
+# Set to False to fall back to the text format.
+EXPORT_BINARY_COPY = True
+
+# Maximum number of partitions in which the operationplans and
+# operationplanmaterials are exported in parallel. Each partition is exported
+# in a forked process over its own database connection. Small exports aren't
+# split. Use 1 to export all records over a single connection.
+EXPORT_PARTITIONS = min(4, os.cpu_count() or 1)
+
+# Number of worker threads that read the input data of the plan in parallel.
+# Use 1 to read all data sequentially over a single connection.
+LOAD_THREADS = 1
+
+# Number of copy files that the importfromfolder command uploads in parallel.
+# Each file is uploaded over its own database connection.
+# Use 1 to upload all files sequentially.
+IMPORT_THREADS = 1
+
+# Data files with at least this number of rows are uploaded with set-based
+# SQL statements rather than saving every row separately. This applies to
+# models without custom forms or validation logic, such as items, locations,
+# purchase orders and distribution orders. Manufacturing orders, work orders
+# and delivery orders are always uploaded row by row. Use None to disable.
+UPLOAD_BULK_THRESHOLD = 10000
+
+# When True, a plan run keeps a warm engine process per scenario in memory.
+# The warm engine loads the master data only once, and uses a copy of it
+# for every next plan run. Changes to the master data are notified by database
+# triggers, and trigger a complete reload. The notifications don't pass through
+# a connection pooler in transaction mode.
+# The warm engine doubles the memory required for planning.
+WARM_ENGINE = False
+
+# Number of parallel jobs used to dump and restore the data when copying a
+# scenario. Use 0 to use a job per core, and 1 to copy through a single
+# pg_dump | pg_restore pipe.
+# A parallel copy writes a dump in the log folder. It is only used when the
+# disk and the MAXSTORAGE quota have room for a dump of the source database,
+# otherwise the copy goes through the pipe.
+# A copy of a scenario nobody is connected to uses the source database as a
+# template instead, which is faster still. This mostly applies when the web
+# server is stopped, since its workers keep connections to the scenarios.
+SCENARIO_COPY_JOBS = 0
+
+# Number of items, sales orders or operationplans archived in a single
+# transaction. An interrupted archiving run resumes after the last chunk.
+ARCHIVE_CHUNK_SIZE = 10000
+
 REST_FRAMEWORK = {
     # Use Django's standard `django.contrib.auth` permissions,
     # or allow read-only access for unauthenticated users.
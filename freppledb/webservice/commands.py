@@ -22,10 +22,14 @@
 #
 
 from datetime import datetime
+from http.client import HTTPConnection
 import os
 import logging
+import socket
+import struct
 import sys
-from time import sleep
+from threading import Thread
+from time import sleep, time
 from daphne.cli import CommandLineInterface
 
 from django.db import DEFAULT_DB_ALIAS, connections
@@ -37,7 +41,11 @@ from freppledb.common.commands import PlanTaskRegistry, PlanTask
 from freppledb.common.models import Parameter
 from freppledb.common.utils import get_databases
 from freppledb.execute.models import Task
-from freppledb.webservice.utils import useWebService, createSolvers
+from freppledb.webservice.utils import (
+    createSolvers,
+    getServiceAuthorization,
+    useWebService,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,16 +53,170 @@ logger = logging.getLogger(__name__)
 class WebService:
     service = None
 
+    # Processes of the previous web service. The new web service takes over
+    # their listening socket.
+    previous = []
+
+    # Seconds a previous web service waits for its open connections to finish
+    drain_timeout = 60
+
+    @staticmethod
+    def getHandoverSocket(port):
+        return os.path.join(settings.FREPPLE_LOGDIR, "webservice_%s.sock" % port)
+
+    @classmethod
+    def getSocket(cls, address, port):
+        """
+        Returns a listening socket bound to the port of the web service.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, int(port)))
+            sock.listen(128)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @classmethod
+    def canTakeOver(cls, port):
+        """
+        A new web service can take over the listening socket of the running
+        one on platforms that can pass sockets between processes.
+        """
+        return hasattr(socket, "recv_fds") and os.path.exists(
+            cls.getHandoverSocket(port)
+        )
+
+    @classmethod
+    def takeOver(cls, port):
+        """
+        Receives the listening socket of the previous web service.
+        Connections waiting in its backlog are accepted by the new web service.
+        Returns None when the handover fails.
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(10)
+                s.connect(cls.getHandoverSocket(port))
+                if hasattr(socket, "SO_PEERCRED"):
+                    pid = struct.unpack(
+                        "3i",
+                        s.getsockopt(
+                            socket.SOL_SOCKET,
+                            socket.SO_PEERCRED,
+                            struct.calcsize("3i"),
+                        ),
+                    )[0]
+                    if pid not in cls.previous:
+                        logger.warning(
+                            "Web service handover refused by process %s" % pid
+                        )
+                        return None
+                msg, fds, _, _ = socket.recv_fds(s, 16, 1)
+                if msg != b"OK" or len(fds) != 1:
+                    for fd in fds:
+                        os.close(fd)
+                    return None
+                return socket.socket(fileno=fds[0])
+        except Exception as e:
+            logger.warning("Web service handover failed: %s" % e)
+            return None
+
+    @classmethod
+    def handOver(cls, sock, port):
+        """
+        Waits for a new web service to take over the listening socket.
+        This web service then drains its open connections and stops.
+        """
+        path = cls.getHandoverSocket(port)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(path)
+            # Only processes of the same user can take over
+            os.chmod(path, 0o600)
+            server.listen()
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    if hasattr(socket, "SO_PEERCRED"):
+                        uid = struct.unpack(
+                            "3i",
+                            conn.getsockopt(
+                                socket.SOL_SOCKET,
+                                socket.SO_PEERCRED,
+                                struct.calcsize("3i"),
+                            ),
+                        )[1]
+                        if uid != os.getuid():
+                            logger.warning(
+                                "Web service handover refused a user with id %s" % uid
+                            )
+                            continue
+                    socket.send_fds(conn, [b"OK"], [sock.fileno()])
+                    break
+        except Exception as e:
+            logger.warning("Web service handover unavailable: %s" % e)
+            return
+        finally:
+            server.close()
+
+        from twisted.internet import reactor
+
+        logger.info(
+            "Web service handed over at %s" % datetime.now().strftime("%H:%M:%S")
+        )
+        reactor.callFromThread(cls.drain, time())
+
+    @classmethod
+    def drain(cls, started):
+        """
+        Stops accepting connections, and stops the web service when the open
+        connections are finished. Runs in the reactor thread.
+        """
+        from twisted.internet import reactor, tcp
+
+        busy = False
+        for reader in reactor.getReaders():
+            if isinstance(reader, tcp.Port):
+                # Only closes our copy of the socket: the new web service
+                # keeps listening on it
+                reader.stopListening()
+            elif isinstance(reader, tcp.Server):
+                busy = True
+        if busy and time() - started < cls.drain_timeout:
+            reactor.callLater(0.5, cls.drain, started)
+        else:
+            cls.stop()
+
     @classmethod
-    def start(cls, address, port):
+    def start(cls, address, port, database=DEFAULT_DB_ALIAS):
+        sock = cls.takeOver(port) if cls.previous else None
+        if not sock:
+            if cls.previous:
+                # Handover failed: stop the previous web service the old way
+                logger.info("Previous web service shutting down")
+                try:
+                    management.call_command(
+                        "stopwebservice", database=database, force=True, wait=True
+                    )
+                except Exception:
+                    pass
+            sock = cls.getSocket(address, port)
+        cls.previous = []
+        if hasattr(socket, "send_fds"):
+            Thread(target=cls.handOver, args=(sock, port), daemon=True).start()
         cls.service = CommandLineInterface()
         cls.service.run(
             (
                 ":".join(settings.ASGI_APPLICATION.rsplit(".", 1)),
-                "--bind",
-                address,
-                "--port",
-                port,
+                "--endpoint",
+                "fd:fileno=%d:domain=INET" % sock.fileno(),
             )
         )
 
@@ -105,6 +267,57 @@ class setDatabaseConnection(PlanTask):
         frepple.cache.loglevel = Parameter.getValue("cache.loglevel", database, 0)
 
 
+@PlanTaskRegistry.register
+class ReadOnlyWebService(PlanTask):
+    """
+    The web service remains available while a new plan is generated, but
+    it no longer accepts changes. They would be lost when the new plan
+    replaces the current one.
+    """
+
+    description = "Switch web service to read-only mode"
+    sequence = 1
+
+    @classmethod
+    def getWeight(cls, database=DEFAULT_DB_ALIAS, warm=None, **kwargs):
+        if (
+            useWebService(database)
+            and "nowebservice" not in os.environ
+            and "loadplan" not in os.environ
+            and warm != "load"
+        ):
+            return 0.1
+        else:
+            return -1
+
+    @classmethod
+    def run(cls, database=DEFAULT_DB_ALIAS, **kwargs):
+        if "FREPPLE_TEST" in os.environ:
+            server = get_databases()[database]["TEST"].get("FREPPLE_PORT", None)
+        else:
+            server = get_databases()[database].get("FREPPLE_PORT", None)
+        if not server:
+            return
+        try:
+            conn = HTTPConnection(server.replace("0.0.0.0", "localhost"), timeout=10)
+            conn.request(
+                "POST",
+                "/readonly/",
+                body=str(os.getpid()),
+                headers={
+                    "Authorization": "Bearer %s"
+                    % getServiceAuthorization(
+                        database=database, task=PlanTaskRegistry.reg.task
+                    )
+                },
+            )
+            conn.getresponse().read()
+            conn.close()
+        except Exception:
+            # The service isn't up
+            pass
+
+
 @PlanTaskRegistry.register
 class StopWebService(PlanTask):
     description = "Stop web service"
@@ -126,14 +339,20 @@ class StopWebService(PlanTask):
         if not server:
             return
 
-        # The previous quoting server is shut down at the start of the planning
-        # two reasons:
-        #  - During the creation of the plan we would have 2 processes both writing
-        #    to the same log file.
-        #  - Avoid doubling the memory requirements.
-        # Disadvantages are that 1) the web service is not available while the plan
-        # is being generated, and 2) if the new plan fails for some reason we won't
-        # have an active web service for a while.
+        previous = (
+            Task.objects.all()
+            .using(database)
+            .filter(processid__isnull=False, name="runplan")
+            .exclude(processid=os.getpid())
+        )
+        if WebService.canTakeOver(server.split(":", 1)[1]):
+            # The new web service takes over the listening socket of the previous
+            # one. It keeps serving requests till then.
+            logger.info("Previous web service remains active till the new one is up")
+            WebService.previous = list(previous.values_list("processid", flat=True))
+            previous.update(processid=None)
+            return
+
         logger.info("Previous web service shutting down")
 
         # Connect to the url "/stop/"
@@ -147,9 +366,7 @@ class StopWebService(PlanTask):
         # Clear the processid for extra robustness.
         # There should no longer a processid on any runplan task (except for the current task).
         # The command runwebservice expects the processid column to be correct.
-        Task.objects.all().using(database).filter(
-            processid__isnull=False, name="runplan"
-        ).exclude(processid=os.getpid()).update(processid=None)
+        previous.update(processid=None)
 
         # Give it some time to die
         sleep(2)
@@ -202,7 +419,7 @@ class RunWebService(PlanTask):
         # Running the server
         os.environ["FREPPLE_DATABASE"] = database
         freppledb.mode = "ASGI"
-        WebService.start(*server.split(":", 1))
+        WebService.start(*server.split(":", 1), database=database)
 
         # Exit immediately, to avoid that any more messages are printed to the log file
         sys.exit(0)
@@ -30,11 +30,14 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import DEFAULT_DB_ALIAS
 
 from freppledb import VERSION
-from freppledb.common.auth import getWebserviceAuthorization
 from freppledb.common.middleware import _thread_locals
 from freppledb.common.utils import get_databases
 from freppledb.execute.models import Task
-from freppledb.webservice.utils import checkRunning, waitTillNotRunning
+from freppledb.webservice.utils import (
+    checkRunning,
+    getServiceAuthorization,
+    waitTillNotRunning,
+)
 
 
 class Command(BaseCommand):
@@ -110,9 +113,7 @@ class Command(BaseCommand):
                     "/stop/force/" if options["force"] else "/stop/",
                     headers={
                         "Authorization": "Bearer %s"
-                        % getWebserviceAuthorization(
-                            database=database, user="admin", exp=600
-                        )
+                        % getServiceAuthorization(database=database, task=task)
                     },
                 )
                 response = conn.getresponse()
@@ -23,6 +23,7 @@
 
 from channels.generic.http import AsyncHttpConsumer
 from .commands import WebService
+from . import utils
 
 
 class StopService(AsyncHttpConsumer):
@@ -54,6 +55,31 @@ class StopService(AsyncHttpConsumer):
             WebService.stop()
 
 
+class ReadOnlyService(AsyncHttpConsumer):
+    """
+    Puts the service in read-only mode while the plan run with the process
+    identifier in the request body is generating a new plan.
+    """
+
+    async def handle(self, body):
+        self.scope["response_headers"].append((b"Content-Type", b"text/plain"))
+        if self.scope["method"] != "POST":
+            return await self.send_response(
+                401,
+                b"Only POST requests allowed",
+                headers=self.scope["response_headers"],
+            )
+        try:
+            utils.readonly_pid = int(body.decode("utf-8"))
+        except ValueError:
+            return await self.send_response(
+                400,
+                b"Invalid process identifier",
+                headers=self.scope["response_headers"],
+            )
+        await self.send_response(200, b"OK", headers=self.scope["response_headers"])
+
+
 class PingService(AsyncHttpConsumer):
     async def handle(self, body):
         self.scope["response_headers"].append((b"Content-Type", b"text/plain"))
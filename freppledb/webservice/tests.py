@@ -0,0 +1,228 @@
+#
+# Copyright (C) 2026 by frePPLe bv
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from django.test import SimpleTestCase
+
+from freppledb.webservice.utils import ModelLock, PlanChanges
+
+
+class ModelLockTest(SimpleTestCase):
+    async def edit(self, lock, clusters, name, log, duration=0.05):
+        async with lock.clusters(clusters):
+            log.append("start %s" % name)
+            await asyncio.sleep(duration)
+            log.append("end %s" % name)
+
+    async def test_same_cluster(self):
+        lock = ModelLock()
+        log = []
+        await asyncio.gather(
+            self.edit(lock, {1}, "a", log),
+            self.edit(lock, {1, 2}, "b", log),
+        )
+        # The second edit waits for the first one to finish
+        self.assertEqual(log, ["start a", "end a", "start b", "end b"])
+        self.assertFalse(lock.locked)
+
+    async def test_different_clusters(self):
+        lock = ModelLock()
+        log = []
+        await asyncio.gather(
+            self.edit(lock, {1}, "a", log),
+            self.edit(lock, {2, 3}, "b", log),
+        )
+        # Both edits run concurrently
+        self.assertEqual(log, ["start a", "start b", "end a", "end b"])
+        self.assertFalse(lock.locked)
+
+    async def test_complete_model(self):
+        lock = ModelLock()
+        log = []
+
+        async def full(name):
+            async with lock:
+                log.append("start %s" % name)
+                await asyncio.sleep(0.05)
+                log.append("end %s" % name)
+
+        async def delayed(coro):
+            await asyncio.sleep(0.01)
+            await coro
+
+        await asyncio.gather(
+            self.edit(lock, {1}, "a", log),
+            delayed(full("full")),
+            delayed(self.edit(lock, {2}, "b", log)),
+            delayed(self.edit(lock, None, "c", log)),
+        )
+        # A waiting lock on the complete model blocks new cluster locks
+        self.assertEqual(
+            log,
+            [
+                "start a",
+                "end a",
+                "start full",
+                "end full",
+                "start c",
+                "end c",
+                "start b",
+                "end b",
+            ],
+        )
+        self.assertFalse(lock.all)
+        self.assertFalse(lock.locked)
+
+    async def test_changed_clusters(self):
+        lock = ModelLock()
+        current = {1}
+        locked = []
+
+        async def merge():
+            async with lock.clusters({1}):
+                await asyncio.sleep(0.02)
+                # Cluster 3 is merged into cluster 1
+                current.add(3)
+
+        async def edit():
+            await asyncio.sleep(0.01)
+            async with lock.clusters(lambda: set(current)):
+                locked.append(set(lock.locked))
+
+        await asyncio.gather(merge(), edit())
+        # The clusters are read again after acquiring the lock
+        self.assertEqual(locked, [{1, 3}])
+        self.assertFalse(lock.locked)
+
+    async def test_reading(self):
+        lock = ModelLock()
+        log = []
+
+        async def saving():
+            async with lock.clusters({2}):
+                log.append("start saving")
+                async with lock.idle():
+                    await asyncio.sleep(0.02)
+                log.append("end saving")
+
+        async def read():
+            await asyncio.sleep(0.01)
+            async with lock.reading():
+                log.append("start read")
+                await asyncio.sleep(0.05)
+                log.append("end read")
+
+        async def delayed(coro):
+            await asyncio.sleep(0.03)
+            await coro
+
+        await asyncio.gather(
+            self.edit(lock, {1}, "a", log),
+            saving(),
+            read(),
+            delayed(self.edit(lock, {3}, "b", log)),
+        )
+        # The read waits for the edit in progress, but not for the idle lock
+        # holder. Nobody uses the model until the read is finished.
+        self.assertLess(log.index("end a"), log.index("start read"))
+        self.assertLess(log.index("start saving"), log.index("start read"))
+        self.assertLess(log.index("end read"), log.index("end saving"))
+        self.assertLess(log.index("end read"), log.index("start b"))
+        self.assertFalse(lock.locked)
+        self.assertEqual(lock.busy, 0)
+
+
+class PlanChangesTest(SimpleTestCase):
+    class Subscriber:
+        def __init__(self, permissions, fail=False):
+            self.scope = {"user": SimpleNamespace(has_perm=permissions.__contains__)}
+            self.fail = fail
+            self.received = []
+
+        async def send(self, text_data):
+            await asyncio.sleep(0.01)
+            if self.fail:
+                raise ConnectionError("Connection closed")
+            self.received.append(text_data)
+
+    async def test_publish(self):
+        allowed = self.Subscriber({"input.view_operationplan"})
+        denied = self.Subscriber(set())
+        failing = self.Subscriber({"input.view_operationplan"}, fail=True)
+        PlanChanges.subscribers.update((allowed, denied, failing))
+        try:
+            PlanChanges.publish(
+                {"type": "operationplan"}, permission="input.view_operationplan"
+            )
+            # The caller doesn't wait for the messages to be sent, but the
+            # tasks sending them are kept alive
+            self.assertEqual(len(PlanChanges.sending), 2)
+            self.assertEqual(allowed.received, [])
+            await asyncio.gather(*PlanChanges.sending)
+            await asyncio.sleep(0)
+            self.assertEqual(allowed.received, ['{"type": "operationplan"}'])
+            self.assertEqual(denied.received, [])
+            self.assertEqual(len(PlanChanges.sending), 0)
+            # A connection that fails is dropped
+            self.assertEqual(PlanChanges.subscribers, {allowed, denied})
+        finally:
+            PlanChanges.subscribers.clear()
+
+
+class AuthAndPermissionMiddlewareTest(SimpleTestCase):
+    async def call(self, scope, session_user):
+        from freppledb.asgi import AuthAndPermissionMiddleware
+
+        result = {}
+
+        async def app(scope, receive, send):
+            result["user"] = scope["user"]
+
+        with patch(
+            "channels.auth.get_user", AsyncMock(return_value=session_user)
+        ) as get_user:
+            await AuthAndPermissionMiddleware(app)(
+                {"type": "http", "session": {}, **scope}, None, None
+            )
+        return result["user"], get_user.await_count
+
+    def user(self, name):
+        return SimpleNamespace(
+            username=name, is_authenticated=True, is_superuser=True, is_active=True
+        )
+
+    async def test_session_user(self):
+        user, session_lookups = await self.call({}, self.user("session"))
+        self.assertEqual(user.username, "session")
+        self.assertEqual(session_lookups, 1)
+
+    async def test_token_user(self):
+        token_user = self.user("token")
+        user, session_lookups = await self.call(
+            {"user": token_user}, self.user("session")
+        )
+        self.assertIs(user, token_user)
+        self.assertEqual(session_lookups, 0)
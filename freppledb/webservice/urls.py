@@ -33,5 +33,6 @@ if mode == "ASGI":
     svcpatterns = [
         path("stop/", services.StopService.as_asgi()),
         path("stop/force/", services.StopService.as_asgi()),  # No difference
+        path("readonly/", services.ReadOnlyService.as_asgi()),
         path("ping/", services.PingService.as_asgi()),
     ]
@@ -22,8 +22,11 @@
 #
 
 import asyncio
+from contextlib import asynccontextmanager
+import json
 import os
 import portend
+import psutil
 import sys
 
 from django.conf import settings
@@ -34,17 +37,183 @@ from freppledb.common.commands import PlanTaskRegistry
 from freppledb.common.models import Parameter
 from freppledb.common.utils import get_databases
 
-# Only a single service can be making updates at the same time
+
+class ModelLock:
+    """
+    Lock on the in-memory model of the web service.
+
+    "async with lock" locks the complete model.
+    "async with lock.clusters(clusters)" only locks a set of clusters, and runs
+    concurrently with changes in other clusters. Passing None as the set
+    locks the complete model as well.
+    "async with lock.reading()" waits till no lock holder uses the model, and
+    keeps them waiting. Another thread can then read the model safely.
+    """
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.locked = set()
+        self.all = False
+        self.waiting = 0
+        # Number of lock holders using the model
+        self.busy = 0
+        # Set while another thread reads the model
+        self.reader = False
+
+    async def acquire(self, clusters=None):
+        async with self.condition:
+            if clusters is None:
+                # Waiting to lock the complete model blocks new cluster locks
+                self.waiting += 1
+                try:
+                    await self.condition.wait_for(
+                        lambda: not self.all and not self.locked and not self.reader
+                    )
+                finally:
+                    self.waiting -= 1
+                    self.condition.notify_all()
+                self.all = True
+            else:
+                await self.condition.wait_for(
+                    lambda: not self.all
+                    and not self.waiting
+                    and not self.reader
+                    and self.locked.isdisjoint(clusters)
+                )
+                self.locked.update(clusters)
+            self.busy += 1
+
+    async def release(self, clusters=None):
+        async with self.condition:
+            if clusters is None:
+                self.all = False
+            else:
+                self.locked.difference_update(clusters)
+            self.busy -= 1
+            self.condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    @asynccontextmanager
+    async def clusters(self, clusters):
+        """
+        The argument can also be a function returning the set of clusters.
+        Cluster numbers can change while waiting for the lock, so the function
+        is evaluated again once the lock is acquired. The lock is acquired
+        again when more clusters are needed.
+        """
+        if callable(clusters):
+            getClusters = clusters
+            clusters = getClusters()
+            while True:
+                await self.acquire(clusters)
+                if clusters is None:
+                    break
+                current = getClusters()
+                if current is not None and current <= clusters:
+                    break
+                await self.release(clusters)
+                clusters = current
+        else:
+            await self.acquire(clusters)
+        try:
+            yield
+        finally:
+            await self.release(clusters)
+
+    @asynccontextmanager
+    async def idle(self):
+        """
+        Used by a lock holder that doesn't use the model for a while, eg
+        while its changes are being saved. It keeps its lock.
+        """
+        async with self.condition:
+            self.busy -= 1
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            async with self.condition:
+                await self.condition.wait_for(lambda: not self.reader)
+                self.busy += 1
+
+    @asynccontextmanager
+    async def reading(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.reader)
+            # New lock holders wait from now on
+            self.reader = True
+            try:
+                await self.condition.wait_for(lambda: not self.busy)
+            except BaseException:
+                self.reader = False
+                self.condition.notify_all()
+                raise
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.reader = False
+                self.condition.notify_all()
+
+
+# Only a single service can be making updates to a cluster at the same time
 try:
-    lock = asyncio.Lock()
+    lock = ModelLock()
 except Exception:
     lock = None
 
+
+class PlanChanges:
+    """
+    Streams the changes made through the web service to the websocket
+    connections of the users.
+    Every message is a json object with a "type" field.
+    """
+
+    # Open websocket connections
+    subscribers = set()
+
+    # Messages being sent. The event loop only keeps a weak reference to
+    # its tasks, so we keep them here until they are done.
+    sending = set()
+
+    @classmethod
+    def publish(cls, message, permission=None):
+        """
+        Sends a message to all connections of users with the permission.
+        The message is sent in the background, and doesn't delay the caller.
+        """
+        if not cls.subscribers:
+            return
+        text = json.dumps(message, default=str)
+        loop = asyncio.get_running_loop()
+        for s in list(cls.subscribers):
+            if not permission or s.scope["user"].has_perm(permission):
+                task = loop.create_task(cls._send(s, text))
+                cls.sending.add(task)
+                task.add_done_callback(cls.sending.discard)
+
+    @classmethod
+    async def _send(cls, subscriber, text):
+        try:
+            await subscriber.send(text_data=text)
+        except Exception:
+            cls.subscribers.discard(subscriber)
+
+
 # Solvers reusable for all services
 mrp_solver = None
 clean_solver = None
 fcst_solver = None
 
+# Process identifier of a plan run that will replace the service
+readonly_pid = None
+
 
 def useWebService(database=DEFAULT_DB_ALIAS):
     if "FREPPLE_TEST" in os.environ:
@@ -55,6 +224,41 @@ def useWebService(database=DEFAULT_DB_ALIAS):
         return param.lower() == "true"
 
 
+def isReadOnly():
+    """
+    Returns True while a new plan is being generated to replace this service.
+    Changes aren't accepted in the meantime, as they would be lost.
+    """
+    global readonly_pid
+    if readonly_pid and not psutil.pid_exists(readonly_pid):
+        # The plan run has stopped without replacing the service
+        readonly_pid = None
+    return readonly_pid is not None
+
+
+def getServiceAuthorization(database=DEFAULT_DB_ALIAS, task=None, exp=600):
+    """
+    Returns a token for the calls of the plan run to the web service.
+    It identifies the user that launched the task. Tasks without an active
+    user use the first active superuser as service identity.
+    """
+    from freppledb.common.models import User
+
+    user = task.user if task and task.user_id else None
+    if not user or not user.is_active:
+        user = (
+            User.objects.using(database)
+            .filter(is_active=True, is_superuser=True)
+            .order_by("id")
+            .first()
+        )
+    if not user:
+        return getWebserviceAuthorization(database=database, exp=exp)
+    return getWebserviceAuthorization(
+        database=database, user=user.username, sid=user.id, exp=exp
+    )
+
+
 def checkRunning(database=DEFAULT_DB_ALIAS, timeout=1.0):
     """
     Returns True if the web service is running.
@@ -24,6 +24,7 @@
 
 #pragma once
 
+#include <atomic>
 #include <regex>
 
 #include "frepple/utils.h"
@@ -1039,7 +1040,15 @@ class Solvable {
 class Plannable : public HasProblems, public Solvable {
  public:
   /* Constructor. */
-  Plannable() : useProblemDetection(true), changed(true) { anyChange = true; }
+  Plannable() : useProblemDetection(true) { setChanged(); }
+
+  /* Destructor. */
+  virtual ~Plannable() {
+    if (changed) {
+      lock_guard<mutex> l(dirtylock);
+      dirty.erase(dirtyindex);
+    }
+  }
 
   /* Specify whether this entity reports problems. */
   void setDetectProblems(bool b);
@@ -1047,8 +1056,8 @@ class Plannable : public HasProblems, public Solvable {
   /* Returns whether or not this object needs to detect problems. */
   bool getDetectProblems() const { return useProblemDetection; }
 
-  /* Loops through all plannable objects and updates their problems if
-   * required. */
+  /* Loops through all changed plannable objects and updates their problems.
+   */
   static void computeProblems();
 
   /* See if this entity has changed since the last problem
@@ -1058,8 +1067,15 @@ class Plannable : public HasProblems, public Solvable {
   /* Mark that this entity has been updated and that the problem
    * detection needs to be redone. */
   void setChanged(bool b = true) {
+    if (b == changed) return;
+    lock_guard<mutex> l(dirtylock);
+    if (b == changed) return;
     changed = b;
-    if (b) anyChange = true;
+    if (b) {
+      dirtyindex = ++dirtycounter;
+      dirty.emplace(dirtyindex, this);
+    } else
+      dirty.erase(dirtyindex);
   }
 
   /* Implement the pure virtual function from the HasProblem class. */
@@ -1075,24 +1091,47 @@ class Plannable : public HasProblems, public Solvable {
   /* Return an iterator over the list of problems. */
   Problem::iterator getProblems() const;
 
+  /* Python function returning statistics on the incremental problem
+   * detection: the number of runs, the number of entities evaluated, the
+   * cumulative time spent and the number of entities awaiting evaluation.
+   */
+  static PyObject* getProblemStatistics(PyObject*, PyObject*);
+
  private:
   /* Stores whether this entity should be skip problem detection, or not. */
   bool useProblemDetection;
 
   /* Stores whether this entity has been updated since the last problem
-   * detection run. */
-  bool changed;
+   * detection run. It is only updated while holding the dirtylock, but can
+   * be read without it.
+   */
+  atomic<bool> changed{false};
+
+  /* Position of this entity in the list of changed entities. */
+  unsigned long dirtyindex = 0;
 
-  /* Marks whether any entity at all has changed its status since the last
-   * problem detection round.
+  /* Entities that changed since the last problem detection round, in the
+   * order they were marked as changed.
+   * Only these entities are re-evaluated by the computeProblems method.
    */
-  static bool anyChange;
+  static map<unsigned long, Plannable*> dirty;
+
+  /* Counter to number the entries in the list of changed entities. */
+  static unsigned long dirtycounter;
+
+  /* Protects the list of changed entities. */
+  static mutex dirtylock;
 
   /* This flag is set to true during the problem recomputation. It is
    * required to garantuee safe access to the problems in a multi-threaded
    * environment.
    */
-  static bool computationBusy;
+  static atomic<bool> computationBusy;
+
+  /* Statistics of the problem detection runs. */
+  static unsigned long statRuns;
+  static unsigned long statEntities;
+  static double statTime;
 };
 
 /* The purpose of this class is to compute the levels of all buffers,
@@ -1118,12 +1157,46 @@ class HasLevel {
    */
   static bool recomputeLevels;
 
+  /* Flags whether an incremental update of the levels and clusters is
+   * required. Only the clusters of the changed entities are recomputed.
+   */
+  static bool recomputeIncremental;
+
+  /* Entities whose connections have changed since the last computation,
+   * and entities created since then.
+   */
+  static set<const HasLevel*> changedOperations;
+  static set<const HasLevel*> changedBuffers;
+  static set<const HasLevel*> changedResources;
+
+  /* Clusters of the entities deleted since the last computation. */
+  static set<int> changedClusters;
+
+  /* Protects the list of changes in a multi-threaded environment. */
+  static mutex changelock;
+
   /* This flag is set to true during the computation of the levels. It is
    * required to ensure safe access to the level information in a
    * multi-threaded environment.
    */
   static bool computationBusy;
 
+  /* Delivery operations of demands in a group that isn't planned
+   * independently, and the group. All deliveries of a group belong to the
+   * same cluster.
+   */
+  static multimap<Operation*, Demand*> clustereddeliveries;
+
+  /* Delivery operations in the clustereddeliveries map. Unlike the keys of
+   * the map, deleted operations are removed from this set.
+   */
+  static set<const HasLevel*> groupeddeliveries;
+
+  /* Flags whether the members or the policy of a demand group have changed
+   * since the last computation.
+   */
+  static bool changedDemands;
+
   /* Stores the total number of clusters in the model. */
   static int numberOfClusters;
 
@@ -1164,9 +1237,10 @@ class HasLevel {
   HasLevel& operator=(const HasLevel& rhs) = delete;
 
   /* Destructor. Deleting a HasLevel object triggers recomputation of the
-   * level and cluster computation, since the network now has changed.
+   * level and cluster computation of its cluster, since the network now has
+   * changed.
    */
-  ~HasLevel() { recomputeLevels = true; }
+  ~HasLevel();
 
   /* This function recomputes all levels in the model.
    * It is called automatically when the getLevel or getCluster() function
@@ -1179,15 +1253,39 @@ class HasLevel {
    * number of operations in the model. The cluster size also has some
    * (limited) impact on the performance: a network with larger cluster
    * size will take longer to analyze.
+   * When only the "recomputeIncremental" flag is set, only the clusters
+   * connected to the changed entities are analyzed again.
    */
   static void computeLevels();
 
+  /* Recomputes the levels and clusters connected to the changed entities.
+   * Only the entities reachable from the changed entities are visited.
+   * Clusters are merged or split as required.
+   * Returns false when a full recomputation is required instead.
+   */
+  static bool computeLevelsIncremental();
+
+  /* Creates the delivery operations of all demands, and collects the
+   * deliveries of the demand groups in the clustereddeliveries map.
+   */
+  static void collectClusteredDeliveries();
+
+  /* Computes the level and cluster of all entities connected to an
+   * operation. Returns true when the new cluster number was used.
+   */
+  static bool computeCluster(Operation& oper, int cur_cluster);
+
+  /* Copies the level and cluster from the generic buffer to the mto-buffers
+   * of the same item. */
+  static void copyLevelToBatchBuffers(Buffer&);
+
  public:
   /* Returns the total number of levels.
    * If not up to date the recomputation will be triggered.
    */
   static short getNumberOfLevels() {
-    if (recomputeLevels || computationBusy) computeLevels();
+    if (recomputeLevels || recomputeIncremental || computationBusy)
+      computeLevels();
     return numberOfLevels;
   }
 
@@ -1195,19 +1293,22 @@ class HasLevel {
    * If not up to date the recomputation will be triggered.
    */
   static int getNumberOfClusters() {
-    if (recomputeLevels || computationBusy) computeLevels();
+    if (recomputeLevels || recomputeIncremental || computationBusy)
+      computeLevels();
     return numberOfClusters;
   }
 
   /* Return the level (and recompute first if required). */
   short getLevel() const {
-    if (recomputeLevels || computationBusy) computeLevels();
+    if (recomputeLevels || recomputeIncremental || computationBusy)
+      computeLevels();
     return lvl;
   }
 
   /* Return the cluster number (and recompute first if required). */
   int getCluster() const {
-    if (recomputeLevels || computationBusy) computeLevels();
+    if (recomputeLevels || recomputeIncremental || computationBusy)
+      computeLevels();
     return cluster;
   }
 
@@ -1227,6 +1328,27 @@ class HasLevel {
    * trigger the recomputation.
    */
   static void triggerLazyRecomputation() { recomputeLevels = true; }
+
+  /* This function should be called when the connections of some entities
+   * have changed. Only the clusters of these entities are recomputed.
+   * The notification doesn't immediately trigger the recomputation either.
+   */
+  static void triggerIncrementalRecomputation();
+  static void triggerIncrementalRecomputation(const Operation*);
+  static void triggerIncrementalRecomputation(const Buffer*);
+  static void triggerIncrementalRecomputation(const Resource*);
+
+  /* This function should be called when a demand is created, deleted, or
+   * changes its owner, policy or delivery operation. Only the members of
+   * demand groups impact the clusters.
+   */
+  static void triggerIncrementalRecomputation(const Demand*);
+
+  template <class A, class B>
+  static void triggerIncrementalRecomputation(const A* a, const B* b) {
+    triggerIncrementalRecomputation(a);
+    triggerIncrementalRecomputation(b);
+  }
 };
 
 /* This abstract class is used to associate buffers and resources with
@@ -2982,7 +3104,7 @@ class Operation : public HasName<Operation>,
 
  public:
   /* Default constructor. */
-  explicit Operation() {}
+  explicit Operation() { HasLevel::triggerIncrementalRecomputation(this); }
 
   /* Destructor. */
   ~Operation() override;
@@ -4356,7 +4478,7 @@ class ItemDistribution
       throw LogicException(
           "Source and destination of an ItemDistribution must be different");
     orig = s;
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   /* Updates the destination location. This method can only be called once on
@@ -4367,7 +4489,7 @@ class ItemDistribution
       throw LogicException(
           "Source and destination of an ItemDistribution must be different");
     setPtrA(i, i->getDistributions());
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   Duration getBatchWindow() const { return batchwindow; }
@@ -4381,7 +4503,7 @@ class ItemDistribution
   /* Update the resource representing the supplier capacity. */
   void setResource(Resource* r) {
     res = r;
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   /* Return the resource representing the distribution capacity. */
@@ -4781,13 +4903,13 @@ class ItemSupplier : public Object,
   /* Updates the supplier. This method can only be called on an instance. */
   void setSupplier(Supplier* s) {
     if (s) setPtrA(s, s->getItems());
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   /* Updates the item. This method can only be called on an instance. */
   void setItem(Item* i) {
     if (i) setPtrB(i, i->getSuppliers());
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   /* Sets the minimum size for procurements.
@@ -4863,7 +4985,7 @@ class ItemSupplier : public Object,
   /* Update the resource representing the supplier capacity. */
   void setResource(Resource* r) {
     res = r;
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation();
   }
 
   /* Return the resource representing the supplier capacity. */
@@ -5123,7 +5245,7 @@ class Buffer : public HasHierarchy<Buffer>, public HasLevel, public Plannable {
   typedef Association<Operation, Buffer, Flow>::ListB flowlist;
 
   /* Default constructor. */
-  explicit Buffer() {}
+  explicit Buffer() { HasLevel::triggerIncrementalRecomputation(this); }
 
   static Buffer* findOrCreate(Item*, Location*);
 
@@ -5193,13 +5315,13 @@ class Buffer : public HasHierarchy<Buffer>, public HasLevel, public Plannable {
   void setLocation(Location* i, bool recompute) {
     loc = i;
     // Trigger level recomputation
-    if (recompute) HasLevel::triggerLazyRecomputation();
+    if (recompute) HasLevel::triggerIncrementalRecomputation(this);
   }
 
   void setLocation(Location* i) {
     loc = i;
     // Trigger level recomputation
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation(this);
   }
 
   PooledString getBatch() const { return batch; }
@@ -5651,7 +5773,7 @@ class Flow : public Object,
     setBuffer(b);
     setOperation(o);
     initType(metadata);
-    if (recomputeLevels) HasLevel::triggerLazyRecomputation();
+    if (recomputeLevels) HasLevel::triggerIncrementalRecomputation(o, b);
   }
 
   /* Constructor. */
@@ -5662,7 +5784,7 @@ class Flow : public Object,
     setOperation(o);
     setEffective(e);
     initType(metadata);
-    if (recomputeLevels) HasLevel::triggerLazyRecomputation();
+    if (recomputeLevels) HasLevel::triggerIncrementalRecomputation(o, b);
   }
 
   /* Search an existing object. */
@@ -6611,7 +6733,10 @@ class Resource : public HasHierarchy<Resource>,
   static Duration defaultMaxEarly;
 
   /* Default constructor. */
-  explicit Resource() { setMaximum(1); }
+  explicit Resource() {
+    setMaximum(1);
+    HasLevel::triggerIncrementalRecomputation(this);
+  }
 
   /* Destructor. */
   ~Resource() override;
@@ -7147,7 +7272,7 @@ class Load : public Object,
     Load::setResource(r);
     setQuantity(u);
     initType(metadata);
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation(o, r);
   }
 
   /* Constructor. */
@@ -7157,7 +7282,7 @@ class Load : public Object,
     setQuantity(u);
     setEffective(e);
     initType(metadata);
-    HasLevel::triggerLazyRecomputation();
+    HasLevel::triggerIncrementalRecomputation(o, r);
   }
 
   /* Destructor. */
@@ -7607,6 +7732,16 @@ class Demand : public HasHierarchy<Demand>, public Plannable {
    */
   ~Demand() override;
 
+  /* Updates the owner of the demand.
+   * The deliveries of a demand group belong to the same cluster.
+   */
+  void setOwner(Demand* o) {
+    if (o == getOwner()) return;
+    HasLevel::triggerIncrementalRecomputation(this);
+    HasHierarchy<Demand>::setOwner(o);
+    HasLevel::triggerIncrementalRecomputation(this);
+  }
+
   /* Return the memory size. */
   size_t getSize() const override {
     auto tmp = Object::getSize() + sizeof(list<OperationPlan*>);
@@ -7647,7 +7782,7 @@ class Demand : public HasHierarchy<Demand>, public Plannable {
     if (loc == l) return;
     if (oper && oper->getHidden()) {
       oper = uninitializedDelivery;
-      HasLevel::triggerLazyRecomputation();
+      HasLevel::triggerIncrementalRecomputation(this);
     }
     loc = l;
   }
@@ -7675,6 +7810,7 @@ class Demand : public HasHierarchy<Demand>, public Plannable {
   virtual void setOperation(Operation* o) {
     if (oper == o) return;
     oper = o;
+    HasLevel::triggerIncrementalRecomputation(this);
   }
 
   virtual Duration getDeliveryDuration() { return DefaultDeliveryDuration; }
@@ -8134,6 +8270,7 @@ class DemandGroup : public Demand {
   }
 
   void setPolicyString(const string& s) {
+    auto oldpolicy = getPolicy();
     if (s == "independent" || s.empty()) {
       flags &= ~(POLICY_ALLTOGETHER + POLICY_INRATIO);
       flags |= POLICY_INDEPENDENT;
@@ -8147,6 +8284,8 @@ class DemandGroup : public Demand {
       logger << "Warning: Demand policy not recognized\n";
       return;
     }
+    if (getPolicy() != oldpolicy)
+      HasLevel::triggerIncrementalRecomputation(this);
   }
 
   int getCluster() const override {
@@ -1850,6 +1850,16 @@ class ForecastSolver : public Solver {
                                CommandManager*) = 0;
 
     virtual unsigned int getCode() = 0;
+
+    /* Creates a problem for every outlier detected during the evaluation. */
+    void createOutliers(vector<ForecastBucketData>&);
+
+   protected:
+    /* Index of the buckets detected as outlier during the evaluation.
+     * The outlier problems are only created for the method that is applied,
+     * because the evaluation of the methods can run in parallel threads.
+     */
+    vector<short> outlierbuckets;
   };
 
   /* A class to calculate a forecast based on a moving average. */
@@ -2533,6 +2543,34 @@ class ForecastSolver : public Solver {
     unsigned int getCode() override { return Forecast::METHOD_MANUAL; }
   };
 
+  /* Result of the evaluation of the forecast methods of a forecast.
+   * The forecast methods are created here rather than in stack memory,
+   * because the evaluation and applying of the forecast are separate steps.
+   */
+  struct BaselineForecast {
+    const Forecast* forecast;
+    shared_ptr<ForecastData> data;
+    MovingAverage moving_avg;
+    Croston croston;
+    SingleExponential single_exp;
+    DoubleExponential double_exp;
+    Seasonal seasonal;
+    Manual manual;
+
+    /* Method with the lowest forecast error, or nullptr if none applies. */
+    ForecastMethod* method = nullptr;
+    double smape = 0.0;
+    double deviation = 0.0;
+
+    /* Index of the first bucket to apply the forecast on. */
+    short bcktstart = 0;
+
+    /* Error message when the evaluation failed. */
+    string error;
+
+    explicit BaselineForecast(const Forecast* f) : forecast(f) {}
+  };
+
   /* Default constructor. */
   explicit ForecastSolver() {
     initType(metadata);
@@ -2652,6 +2690,19 @@ class ForecastSolver : public Solver {
    */
   unsigned long getForecastSkip() const { return Forecast_Skip; }
 
+  /* Updates the number of threads computing the baseline forecast. */
+  void setThreads(int t) {
+    if (t < 0)
+      logger << "Warning: Parameter Threads can't be negative\n";
+    else
+      threads = t;
+  }
+
+  /* Returns the number of threads computing the baseline forecast.
+   * The default value 0 uses a thread per processor core.
+   */
+  int getThreads() const { return threads; }
+
   /* Update the multiplier of the standard deviation used for detecting
    * outlier demands.
    */
@@ -2883,6 +2934,8 @@ class ForecastSolver : public Solver {
                            &Cls::setForecastSmapeAlfa);
     m->addUnsignedLongField<Cls>(ForecastSolver::tag_Skip,
                                  &Cls::getForecastSkip, &Cls::setForecastSkip);
+    m->addIntField<Cls>(ForecastSolver::tag_Threads, &Cls::getThreads,
+                        &Cls::setThreads);
     m->addDoubleField<Cls>(ForecastSolver::tag_Outlier_maxDeviation,
                            &Cls::getForecastMaxDeviation,
                            &Cls::setForecastMaxDeviation);
@@ -3071,9 +3124,32 @@ class ForecastSolver : public Solver {
    */
   void netDemandFromForecast(const Demand*, Forecast*);
 
+  /* Number of threads computing the baseline forecast. */
+  int threads = 0;
+
   /* Implements the timeseries forecasting algorithms. */
   void computeBaselineForecast(const Forecast*);
 
+  /* Computes the baseline forecast of all leaf or all parent forecasts.
+   * The forecast methods are evaluated in parallel threads for a batch of
+   * forecasts. The results are then applied one forecast at a time and in
+   * the same order as a single-threaded run, which keeps the results
+   * deterministic.
+   */
+  void computeBaselineForecasts(bool leaf, int cluster);
+
+  /* Evaluates all forecast methods on the history of a forecast, and
+   * selects the one with the lowest error.
+   * This method doesn't update any data, and can run in parallel threads.
+   */
+  void evaluateBaselineForecast(BaselineForecast&);
+
+  /* Thread function evaluating the forecast methods. */
+  static void evaluateBaselineForecast(void*, int, void*);
+
+  /* Updates the forecast with the result of the evaluation. */
+  void applyBaselineForecast(BaselineForecast&);
+
   /* Deletes all outliers found by a forecasting method that is not applied */
   static void deleteOutliers(
       const Forecast* forecast,
@@ -3107,6 +3183,7 @@ class ForecastSolver : public Solver {
   static const Keyword tag_Iterations;
   static const Keyword tag_SmapeAlfa;
   static const Keyword tag_Skip;
+  static const Keyword tag_Threads;
   static const Keyword tag_MovingAverage_order;
   static const Keyword tag_SingleExponential_initialAlfa;
   static const Keyword tag_SingleExponential_minAlfa;
@@ -49,6 +49,7 @@ const Keyword ForecastSolver::tag_Net_IgnoreLocation("Net_IgnoreLocation");
 const Keyword ForecastSolver::tag_Iterations("Iterations");
 const Keyword ForecastSolver::tag_SmapeAlfa("SmapeAlfa");
 const Keyword ForecastSolver::tag_Skip("Skip");
+const Keyword ForecastSolver::tag_Threads("Threads");
 const Keyword ForecastSolver::tag_MovingAverage_order("MovingAverage_order");
 const Keyword ForecastSolver::tag_SingleExponential_initialAlfa(
     "SingleExponential_initialAlfa");
@@ -181,6 +182,76 @@ void ForecastSolver::solve(const Demand* l, void*) {
   }
 }
 
+void ForecastSolver::computeBaselineForecasts(bool leaf, int cluster) {
+  // The evaluation runs single-threaded when logging is active, to keep the
+  // log file readable.
+  int numthreads = 1;
+  if (!getLogLevel() && getAutocommit())
+    numthreads = threads ? threads : Environment::getProcessorCores();
+
+  // Process the forecasts in batches, to limit the memory usage
+  vector<unique_ptr<BaselineForecast>> batch;
+  size_t batchsize = 100 * numthreads;
+  auto fcst_iter = Forecast::getForecasts().begin();
+  auto fcst_end = Forecast::getForecasts().end();
+  while (fcst_iter != fcst_end) {
+    // Collect the next batch of forecasts.
+    // The data is loaded in the main thread, as the cache isn't thread-safe.
+    for (; fcst_iter != fcst_end && batch.size() < batchsize; ++fcst_iter) {
+      auto fcst = static_cast<Forecast*>(&**fcst_iter);
+      if (!fcst->getMethods() || fcst->isLeaf() != leaf ||
+          (cluster != -1 && fcst->getCluster() != cluster))
+        continue;
+      batch.push_back(make_unique<BaselineForecast>(fcst));
+      try {
+        batch.back()->data = fcst->getData();
+      } catch (const exception& e) {
+        batch.back()->error = e.what();
+      } catch (...) {
+        batch.back()->error = "Unknown type";
+      }
+    }
+
+    // Evaluate the forecast methods in parallel
+    ThreadGroup grp(numthreads);
+    for (auto& b : batch)
+      if (b->error.empty()) grp.add(evaluateBaselineForecast, this, 0, &*b);
+    grp.execute();
+
+    // Apply the results in the original sequence of the forecasts
+    for (auto& b : batch) {
+      try {
+        if (!b->error.empty()) throw RuntimeException(b->error);
+        applyBaselineForecast(*b);
+      } catch (...) {
+        logger << "Error: Caught an exception while forecasting '"
+               << b->forecast << "':\n";
+        try {
+          throw;
+        } catch (const bad_exception&) {
+          logger << "  bad exception\n";
+        } catch (const exception& e) {
+          logger << "  " << e.what() << '\n';
+        } catch (...) {
+          logger << "  Unknown type\n";
+        }
+      }
+    }
+    batch.clear();
+  }
+}
+
+void ForecastSolver::evaluateBaselineForecast(void* solver, int, void* result) {
+  auto res = static_cast<BaselineForecast*>(result);
+  try {
+    static_cast<ForecastSolver*>(solver)->evaluateBaselineForecast(*res);
+  } catch (const exception& e) {
+    res->error = e.what();
+  } catch (...) {
+    res->error = "Unknown type";
+  }
+}
+
 PyObject* ForecastSolver::solve(PyObject* self, PyObject* args,
                                 PyObject* kwargs) {
   static const char* kwlist[] = {"run_fcst", "cluster", "run_netting", "demand",
@@ -272,50 +343,12 @@ void ForecastSolver::solve(bool run_fcst, bool run_netting, int cluster) {
     // Time series forecasting for all leaf forecasts
     // TODO Assumes that the lowest forecasting level is a leaf forecast.
     if (getLogLevel() > 5) logger << "Start forecasting for leaf forecasts\n";
-    for (auto& x : Forecast::getForecasts()) {
-      try {
-        if (x->getMethods() && x->isLeaf() &&
-            (cluster == -1 ||
-             static_cast<Forecast*>(&*x)->getCluster() == cluster))
-          solve(static_cast<Forecast*>(&*x), nullptr);
-      } catch (...) {
-        logger << "Error: Caught an exception while forecasting '"
-               << static_cast<Forecast*>(&*x) << "':\n";
-        try {
-          throw;
-        } catch (const bad_exception&) {
-          logger << "  bad exception\n";
-        } catch (const exception& e) {
-          logger << "  " << e.what() << '\n';
-        } catch (...) {
-          logger << "  Unknown type\n";
-        }
-      }
-    }
+    computeBaselineForecasts(true, cluster);
     if (getLogLevel() > 5) logger << "End forecasting for leaf forecasts\n";
 
     // Time series forecasting for all middle-out parent forecasts
     if (getLogLevel() > 5) logger << "Start forecasting for parent forecasts\n";
-    for (auto& x : Forecast::getForecasts()) {
-      try {
-        if (x->getMethods() && !x->isLeaf() &&
-            (cluster == -1 ||
-             static_cast<Forecast*>(&*x)->getCluster() == cluster))
-          solve(static_cast<Forecast*>(&*x), nullptr);
-      } catch (...) {
-        logger << "Error: Caught an exception while forecasting '"
-               << static_cast<Forecast*>(&*x)->getName() << "':\n";
-        try {
-          throw;
-        } catch (const bad_exception&) {
-          logger << "  bad exception\n";
-        } catch (const exception& e) {
-          logger << "  " << e.what() << '\n';
-        } catch (...) {
-          logger << "  Unknown type\n";
-        }
-      }
-    }
+    computeBaselineForecasts(false, cluster);
     if (getLogLevel() > 5) logger << "End forecasting for parent forecasts\n";
   }
 
@@ -38,12 +38,16 @@ double ForecastSolver::weight[ForecastSolver::MAXBUCKETS];
 const MetaClass* ProblemOutlier::metadata = nullptr;
 
 void ForecastSolver::computeBaselineForecast(const Forecast* fcst) {
-  // Load history data in memory
-  auto data = fcst->getData();
-  lock_guard<recursive_mutex> exclusive(data->lock);
+  BaselineForecast result(fcst);
+  result.data = fcst->getData();
+  evaluateBaselineForecast(result);
+  applyBaselineForecast(result);
+}
 
-  // Delete previous outlier problems
-  deleteOutliers(fcst);
+void ForecastSolver::evaluateBaselineForecast(BaselineForecast& result) {
+  auto fcst = result.forecast;
+  auto& data = result.data;
+  lock_guard<recursive_mutex> exclusive(data->lock);
 
   // Skip all buckets till the first non-zero bucket
   auto bckt_start = data->getBuckets().begin();
@@ -158,13 +162,13 @@ void ForecastSolver::computeBaselineForecast(const Forecast* fcst) {
                                      bckt_first->getStart()))
           : inactive_buckets;
 
-  // We create the forecasting objects in stack memory for best performance.
-  MovingAverage moving_avg;
-  Croston croston;
-  SingleExponential single_exp;
-  DoubleExponential double_exp;
-  Seasonal seasonal;
-  Manual manual;
+  // The forecasting objects are part of the result structure.
+  auto& moving_avg = result.moving_avg;
+  auto& croston = result.croston;
+  auto& single_exp = result.single_exp;
+  auto& double_exp = result.double_exp;
+  auto& seasonal = result.seasonal;
+  auto& manual = result.manual;
   int numberOfMethods = 0;
   ForecastMethod* qualifiedmethods[6];
 
@@ -237,11 +241,8 @@ void ForecastSolver::computeBaselineForecast(const Forecast* fcst) {
     if (res.smape < best_error || res.force) {
       best_error = res.smape;
       best_method = i;
-      const_cast<Forecast*>(fcst)->setDeviation(res.standarddeviation);
-      if (res.force) {
-        const_cast<Forecast*>(fcst)->setDeviation(res.standarddeviation);
-        break;
-      }
+      result.deviation = res.standarddeviation;
+      if (res.force) break;
     }
   }
   if (fcst->methods == fcst->METHOD_SEASONAL && best_error == DBL_MAX) {
@@ -253,7 +254,7 @@ void ForecastSolver::computeBaselineForecast(const Forecast* fcst) {
                                               bckt_start->getIndex(),
                                               timeseries, historycount, this);
     best_error = res.smape;
-    const_cast<Forecast*>(fcst)->setDeviation(res.standarddeviation);
+    result.deviation = res.standarddeviation;
     // Special case in the special case: Trend doesn't apply as there are less
     // than 5 buckets after the warmup period, switch to moving average
     if (best_error == DBL_MAX) {
@@ -263,28 +264,51 @@ void ForecastSolver::computeBaselineForecast(const Forecast* fcst) {
                                                 bckt_start->getIndex(),
                                                 timeseries, historycount, this);
       best_error = res.smape;
-      const_cast<Forecast*>(fcst)->setDeviation(res.standarddeviation);
+      result.deviation = res.standarddeviation;
     }
   }
 
-  // Apply the most appropriate forecasting method
+  // Remember the most appropriate forecasting method
   if (best_method >= 0) {
-    const_cast<Forecast*>(fcst)->setMethod(
-        qualifiedmethods[best_method]->getCode());
-    const_cast<Forecast*>(fcst)->setSMAPEerror(best_error);
+    result.method = qualifiedmethods[best_method];
+    result.smape = best_error;
+    result.bcktstart = bckt_plan_end->getIndex();
+  }
+}
+
+void ForecastSolver::applyBaselineForecast(BaselineForecast& result) {
+  auto fcst = const_cast<Forecast*>(result.forecast);
+  lock_guard<recursive_mutex> exclusive(result.data->lock);
+
+  // Delete previous outlier problems
+  deleteOutliers(fcst);
+
+  // Apply the most appropriate forecasting method
+  if (result.method) {
+    fcst->setDeviation(result.deviation);
+    fcst->setMethod(result.method->getCode());
+    fcst->setSMAPEerror(result.smape);
     if (getLogLevel() > 0)
       logger << fcst << ": chosen method: " << fcst->getMethod()
              << ", standard deviation: " << fcst->getDeviation()
              << ", smape error: " << fcst->getSMAPEerror() << '\n';
-    qualifiedmethods[best_method]->applyForecast(
-        const_cast<Forecast*>(fcst), data->getBuckets(),
-        bckt_plan_end->getIndex(), !getAutocommit() ? commands : nullptr);
+    result.method->createOutliers(result.data->getBuckets());
+    result.method->applyForecast(fcst, result.data->getBuckets(),
+                                 result.bcktstart,
+                                 !getAutocommit() ? commands : nullptr);
   } else {
-    const_cast<Forecast*>(fcst)->setMethod(0);
-    const_cast<Forecast*>(fcst)->setSMAPEerror(0.0);
+    fcst->setMethod(0);
+    fcst->setSMAPEerror(0.0);
   }
 }
 
+void ForecastSolver::ForecastMethod::createOutliers(
+    vector<ForecastBucketData>& bucketdata) {
+  for (auto i : outlierbuckets)
+    new ProblemOutlier(bucketdata[i].getOrCreateForecastBucket(), this, true);
+  outlierbuckets.clear();
+}
+
 //
 // MOVING AVERAGE FORECAST
 //
@@ -295,6 +319,7 @@ ForecastSolver::Metrics ForecastSolver::MovingAverage::generateForecast(
     const Forecast* fcst, vector<ForecastBucketData>& bucketdata,
     short firstbckt, vector<double>& timeseries, unsigned int count,
     ForecastSolver* solver) {
+  outlierbuckets.clear();
   double error_smape, error_smape_weights;
   auto* clean_history = new double[count + 1];
 
@@ -335,16 +360,12 @@ ForecastSolver::Metrics ForecastSolver::MovingAverage::generateForecast(
             avg + ForecastSolver::Forecast_maxDeviation * standarddeviation) {
           clean_history[i] =
               avg + ForecastSolver::Forecast_maxDeviation * standarddeviation;
-          new ProblemOutlier(
-              bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-              true);
+          outlierbuckets.push_back(i + firstbckt);
         } else if (actual < avg - ForecastSolver::Forecast_maxDeviation *
                                       standarddeviation) {
           clean_history[i] =
               avg - ForecastSolver::Forecast_maxDeviation * standarddeviation;
-          new ProblemOutlier(
-              bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-              true);
+          outlierbuckets.push_back(i + firstbckt);
         } else
           clean_history[i] = actual;
       }
@@ -421,6 +442,7 @@ ForecastSolver::Metrics ForecastSolver::SingleExponential::generateForecast(
     const Forecast* fcst, vector<ForecastBucketData>& bucketdata,
     short firstbckt, vector<double>& timeseries, unsigned int count,
     ForecastSolver* solver) {
+  outlierbuckets.clear();
   // Verify whether this is a valid forecast method.
   //   - We need at least 5 buckets after the warmup period.
   if (count < solver->getForecastSkip() + 5)
@@ -499,18 +521,12 @@ ForecastSolver::Metrics ForecastSolver::SingleExponential::generateForecast(
               f_i + ForecastSolver::Forecast_maxDeviation * standarddeviation) {
             history_i =
                 f_i + ForecastSolver::Forecast_maxDeviation * standarddeviation;
-            if (iteration == 1)
-              new ProblemOutlier(
-                  bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-                  true);
+            if (iteration == 1) outlierbuckets.push_back(i + firstbckt);
           } else if (history_i < f_i - ForecastSolver::Forecast_maxDeviation *
                                            standarddeviation) {
             history_i =
                 f_i - ForecastSolver::Forecast_maxDeviation * standarddeviation;
-            if (iteration == 1)
-              new ProblemOutlier(
-                  bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-                  true);
+            if (iteration == 1) outlierbuckets.push_back(i + firstbckt);
           }
         }
         sum_12 += df_dalfa_i * (history_i - f_i) * weight[count - i];
@@ -634,6 +650,7 @@ ForecastSolver::Metrics ForecastSolver::DoubleExponential::generateForecast(
     const Forecast* fcst, vector<ForecastBucketData>& bucketdata,
     short firstbckt, vector<double>& timeseries, unsigned int count,
     ForecastSolver* solver) {
+  outlierbuckets.clear();
   // Verify whether this is a valid forecast method.
   //   - We need at least 5 buckets after the warmup period.
   if (count < solver->getForecastSkip() + 5)
@@ -749,20 +766,14 @@ ForecastSolver::Metrics ForecastSolver::DoubleExponential::generateForecast(
             history_i =
                 constant_i + trend_i +
                 ForecastSolver::Forecast_maxDeviation * standarddeviation;
-            if (iteration == 1)
-              new ProblemOutlier(
-                  bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-                  true);
+            if (iteration == 1) outlierbuckets.push_back(i + firstbckt);
           } else if (history_i < constant_i + trend_i -
                                      ForecastSolver::Forecast_maxDeviation *
                                          standarddeviation) {
             history_i =
                 constant_i + trend_i -
                 ForecastSolver::Forecast_maxDeviation * standarddeviation;
-            if (iteration == 1)
-              new ProblemOutlier(
-                  bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-                  true);
+            if (iteration == 1) outlierbuckets.push_back(i + firstbckt);
           }
         }
         d_constant_d_gamma_prev = d_constant_d_gamma;
@@ -1308,6 +1319,7 @@ ForecastSolver::Metrics ForecastSolver::Croston::generateForecast(
     const Forecast* fcst, vector<ForecastBucketData>& bucketdata,
     short firstbckt, vector<double>& timeseries, unsigned int count,
     ForecastSolver* solver) {
+  outlierbuckets.clear();
   // Count non-zero buckets
   double nonzero = 0.0;
   double totalsum = 0.0;
@@ -1391,10 +1403,7 @@ ForecastSolver::Metrics ForecastSolver::Croston::generateForecast(
               f_i + ForecastSolver::Forecast_maxDeviation * standarddeviation) {
             history_i =
                 f_i + ForecastSolver::Forecast_maxDeviation * standarddeviation;
-            if (iteration == 1)
-              new ProblemOutlier(
-                  bucketdata[i + firstbckt].getOrCreateForecastBucket(), this,
-                  true);
+            if (iteration == 1) outlierbuckets.push_back(i + firstbckt);
           }
         }
         if (i >= solver->getForecastSkip() &&
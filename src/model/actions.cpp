@@ -385,6 +385,7 @@ PyObject* eraseModel(PyObject*, PyObject* args) {
       // The order is chosen to minimize the work of the individual destructors.
       // E.g. the destructor of the item class recurses over all demands and
       // all buffers. It is much faster if there are none already.
+      HasLevel::triggerLazyRecomputation();
       Operation::clear();
       Demand::clear();
       Buffer::clear();
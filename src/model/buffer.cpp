@@ -226,7 +226,7 @@ void Buffer::setItem(Item* i, bool recompute) {
 
   // Mark changed
   setChanged();
-  if (recompute) HasLevel::triggerLazyRecomputation();
+  if (recompute) HasLevel::triggerIncrementalRecomputation(this);
 }
 
 void Buffer::setOnHand(double f) {
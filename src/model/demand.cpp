@@ -83,6 +83,9 @@ void Demand::setQuantity(double f) {
 }
 
 Demand::~Demand() {
+  // A demand group loses a member
+  HasLevel::triggerIncrementalRecomputation(this);
+
   // Remove the delivery operationplans
   deleteOperationPlans(true);
 
@@ -75,7 +75,7 @@ int Flow::initialize() {
 
 Flow::~Flow() {
   // Set a flag to make sure the level computation is triggered again
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation(getPtrA(), getPtrB());
 
   // Delete existing flowplans
   if (getOperation() && getBuffer()) {
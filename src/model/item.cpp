@@ -96,7 +96,8 @@ void Demand::setItem(Item* i) {
   if (oper && oper->getHidden()) oper = uninitializedDelivery;
 
   // Trigger level calculation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
+  HasLevel::triggerIncrementalRecomputation(this);
 }
 
 Date Item::findEarliestPurchaseOrder(const PooledString& batch) const {
@@ -57,7 +57,7 @@ ItemDistribution::ItemDistribution() {
   initType(metadata);
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 ItemDistribution::~ItemDistribution() {
@@ -69,7 +69,7 @@ ItemDistribution::~ItemDistribution() {
   while (firstOperation) delete firstOperation;
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 PyObject* ItemDistribution::create(PyTypeObject* , PyObject* ,
@@ -142,7 +142,7 @@ PyObject* ItemDistribution::create(PyTypeObject* , PyObject* ,
 void ItemDistribution::setItem(Item* i) {
   if (!i) return;
   setPtrB(i, i->getDistributions());
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 void ItemDistribution::deleteOperationPlans(bool b) {
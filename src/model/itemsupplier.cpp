@@ -61,14 +61,14 @@ ItemSupplier::~ItemSupplier() {
   while (firstOperation) delete firstOperation;
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 ItemSupplier::ItemSupplier() {
   initType(metadata);
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 ItemSupplier::ItemSupplier(Supplier* s, Item* r, int u) {
@@ -78,7 +78,7 @@ ItemSupplier::ItemSupplier(Supplier* s, Item* r, int u) {
   initType(metadata);
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 ItemSupplier::ItemSupplier(Supplier* s, Item* r, int u, const DateRange& e) {
@@ -89,7 +89,7 @@ ItemSupplier::ItemSupplier(Supplier* s, Item* r, int u, const DateRange& e) {
   initType(metadata);
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation();
 }
 
 PyObject* ItemSupplier::create(PyTypeObject*, PyObject*, PyObject* kwds) {
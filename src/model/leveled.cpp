@@ -34,10 +34,107 @@
 
 namespace frepple {
 
-bool HasLevel::recomputeLevels = false;
+bool HasLevel::recomputeLevels = true;
+bool HasLevel::recomputeIncremental = false;
 bool HasLevel::computationBusy = false;
 int HasLevel::numberOfClusters = 0;
 short HasLevel::numberOfLevels = 0;
+set<const HasLevel*> HasLevel::changedOperations;
+set<const HasLevel*> HasLevel::changedBuffers;
+set<const HasLevel*> HasLevel::changedResources;
+set<int> HasLevel::changedClusters;
+multimap<Operation*, Demand*> HasLevel::clustereddeliveries;
+set<const HasLevel*> HasLevel::groupeddeliveries;
+bool HasLevel::changedDemands = false;
+mutex HasLevel::changelock;
+
+HasLevel::~HasLevel() {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  // The cluster of this entity may fall apart in multiple clusters
+  lock_guard<mutex> l(changelock);
+  changedOperations.erase(this);
+  changedBuffers.erase(this);
+  changedResources.erase(this);
+  groupeddeliveries.erase(this);
+  changedClusters.insert(cluster);
+  recomputeIncremental = true;
+}
+
+void HasLevel::triggerIncrementalRecomputation() {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  lock_guard<mutex> l(changelock);
+  recomputeIncremental = true;
+}
+
+void HasLevel::triggerIncrementalRecomputation(const Operation* o) {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  lock_guard<mutex> l(changelock);
+  if (o) changedOperations.insert(o);
+  recomputeIncremental = true;
+}
+
+void HasLevel::triggerIncrementalRecomputation(const Buffer* b) {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  lock_guard<mutex> l(changelock);
+  if (b) changedBuffers.insert(b);
+  recomputeIncremental = true;
+}
+
+void HasLevel::triggerIncrementalRecomputation(const Resource* r) {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  lock_guard<mutex> l(changelock);
+  if (r) changedResources.insert(r);
+  recomputeIncremental = true;
+}
+
+void HasLevel::triggerIncrementalRecomputation(const Demand* d) {
+  // A full recomputation is already pending
+  if (recomputeLevels) return;
+
+  // Only the deliveries of demand groups are clustered together
+  if (!d || !(d->hasType<DemandGroup>() ||
+              (d->getOwner() && d->getOwner()->hasType<DemandGroup>())))
+    return;
+
+  lock_guard<mutex> l(changelock);
+  changedDemands = true;
+  recomputeIncremental = true;
+}
+
+void HasLevel::collectClusteredDeliveries() {
+  // Force creation of all delivery operations
+  clustereddeliveries.clear();
+  groupeddeliveries.clear();
+  for (auto& gdem : Demand::all()) {
+    auto dlvr = gdem.getDeliveryOperation();
+    if (dlvr && gdem.getOwner() && gdem.getOwner()->hasType<DemandGroup>() &&
+        static_cast<DemandGroup*>(gdem.getOwner())->getPolicy() !=
+            Demand::POLICY_INDEPENDENT) {
+      auto search = clustereddeliveries.equal_range(dlvr);
+      bool exists = false;
+      for (auto it = search.first; it != search.second; ++it) {
+        if (it->second == gdem.getOwner()) {
+          exists = true;
+          break;
+        }
+      }
+      if (!exists) {
+        clustereddeliveries.insert(make_pair(dlvr, gdem.getOwner()));
+        groupeddeliveries.insert(dlvr);
+      }
+    }
+  }
+}
 
 void HasLevel::computeLevels() {
   computationBusy = true;
@@ -47,26 +144,11 @@ void HasLevel::computeLevels() {
 
   // Another thread may already have computed the levels while this thread was
   // waiting for the lock. In that case the while loop will be skipped.
-  multimap<Operation*, Demand*> clustereddeliveries;
-  while (recomputeLevels) {
-    // Force creation of all delivery operations
-    for (auto& gdem : Demand::all()) {
-      auto dlvr = gdem.getDeliveryOperation();
-      if (dlvr && gdem.getOwner() && gdem.getOwner()->hasType<DemandGroup>() &&
-          static_cast<DemandGroup*>(gdem.getOwner())->getPolicy() !=
-              Demand::POLICY_INDEPENDENT) {
-        auto search = clustereddeliveries.equal_range(dlvr);
-        bool exists = false;
-        for (auto it = search.first; it != search.second; ++it) {
-          if (it->second == gdem.getOwner()) {
-            exists = true;
-            break;
-          }
-        }
-        if (!exists)
-          clustereddeliveries.insert(make_pair(dlvr, gdem.getOwner()));
-      }
-    }
+  while (recomputeLevels || recomputeIncremental) {
+    // Only update the clusters impacted by the changes
+    if (!recomputeLevels && computeLevelsIncremental()) continue;
+
+    collectClusteredDeliveries();
 
     // Reset current levels on buffers, resources and operations.
     // Creating the producing operations of the buffers can cause new buffers
@@ -99,277 +181,497 @@ void HasLevel::computeLevels() {
     // on again by some model change, the while loop will rerun the calculation
     // again.
     recomputeLevels = false;
+    {
+      lock_guard<mutex> l2(changelock);
+      changedOperations.clear();
+      changedBuffers.clear();
+      changedResources.clear();
+      changedClusters.clear();
+      changedDemands = false;
+      recomputeIncremental = false;
+    }
 
     // Loop through all operations
-    stack<pair<Operation*, int> > opstack;
-    Operation* cur_oper;
-    int cur_level;
-    Buffer* cur_buf;
-    const Flow* cur_Flow;
-    bool search_level;
-    int cur_cluster;
     numberOfLevels = 0;
     numberOfClusters = 0;
-    map<Operation*, short> visited;
     for (auto& g : Operation::all()) {
-      // Select a new cluster number
-      if (g.cluster)
-        cur_cluster = g.cluster;
-      else {
-        // Detect hanging operations
-        if (g.getFlows().empty() && g.getLoads().empty() && !g.getOwner() &&
-            g.getSubOperations().empty() && g.getDependencies().empty()) {
-          // Cluster 0 keeps all dangling operations
-          g.lvl = 0;
-          continue;
+      if (computeCluster(g, numberOfClusters + 1) &&
+          ++numberOfClusters >= INT_MAX)
+        throw LogicException("Too many clusters");
+    }
+
+    // Copy the level from generic buffers to the specific mto-buffers
+    for (auto& gbuf : Buffer::all()) copyLevelToBatchBuffers(gbuf);
+  }  // End of while recomputeLevels. The loop will be repeated as long as model
+     // changes are done during the recomputation.
+
+  // Unlock the exclusive access to this function
+  computationBusy = false;
+}
+
+bool HasLevel::computeLevelsIncremental() {
+  // Pick up the changes
+  set<const HasLevel*> newopers, newbufs, newres;
+  set<int> deleted;
+  bool demands;
+  {
+    lock_guard<mutex> l(changelock);
+    newopers.swap(changedOperations);
+    newbufs.swap(changedBuffers);
+    newres.swap(changedResources);
+    deleted.swap(changedClusters);
+    demands = changedDemands;
+    changedDemands = false;
+    recomputeIncremental = false;
+  }
+
+  // When a big part of the model changed, a full recomputation is faster
+  if (newopers.size() + newbufs.size() + newres.size() > Operation::size() / 2)
+    return false;
+
+  // Changes to the demand groups can merge and split the clusters of all
+  // their deliveries, before and after the change. Deleted operations can
+  // leave a grouped delivery as well.
+  if (demands)
+    for (auto o : groupeddeliveries) deleted.insert(o->cluster);
+  if (demands || !deleted.empty()) {
+    collectClusteredDeliveries();
+    if (demands)
+      for (auto o : groupeddeliveries) newopers.insert(o);
+  }
+
+  // Finding the remaining entities of the clusters of deleted entities
+  // requires a pass over all entities. This is only needed after deletions.
+  deleted.erase(0);
+  if (!deleted.empty()) {
+    for (auto& o : Operation::all())
+      if (deleted.count(o.cluster)) newopers.insert(&o);
+    for (auto& b : Buffer::all())
+      if (deleted.count(b.cluster)) newbufs.insert(&b);
+    for (auto& r : Resource::all())
+      if (deleted.count(r.cluster)) newres.insert(&r);
+  }
+
+  // Walk over all entities reachable from the changed entities. Since a
+  // cluster contains all entities connected to each other, these are the
+  // complete clusters of the changed entities.
+  set<const HasLevel*> visited;
+  vector<Operation*> opers;
+  vector<Buffer*> bufs;
+  vector<Resource*> ress;
+  stack<Operation*> opstack;
+  stack<Buffer*> bufstack;
+  stack<Resource*> resstack;
+  auto addOperation = [&](Operation* o) {
+    if (o && visited.insert(o).second) {
+      opers.push_back(o);
+      opstack.push(o);
+    }
+  };
+  auto addBuffer = [&](Buffer* b) {
+    if (b && visited.insert(b).second) {
+      bufs.push_back(b);
+      bufstack.push(b);
+    }
+  };
+  auto addResource = [&](Resource* r) {
+    if (r && visited.insert(r).second) {
+      ress.push_back(r);
+      resstack.push(r);
+    }
+  };
+  set<int> affected;
+  map<const HasLevel*, int> previous;
+  size_t firstoper = 0;
+  size_t firstbuf = 0;
+  size_t firstres = 0;
+  while (true) {
+    for (auto e : newopers)
+      addOperation(static_cast<Operation*>(const_cast<HasLevel*>(e)));
+    for (auto e : newbufs)
+      addBuffer(static_cast<Buffer*>(const_cast<HasLevel*>(e)));
+    for (auto e : newres)
+      addResource(static_cast<Resource*>(const_cast<HasLevel*>(e)));
+    while (!opstack.empty() || !bufstack.empty() || !resstack.empty()) {
+      if (!opstack.empty()) {
+        auto o = opstack.top();
+        opstack.pop();
+        addOperation(o->getOwner());
+        for (auto i : o->getSubOperations()) addOperation(i->getOperation());
+        for (auto dpd : o->getDependencies()) {
+          addOperation(dpd->getOperation());
+          addOperation(dpd->getBlockedBy());
+        }
+        for (auto& fl : o->getFlows()) addBuffer(fl.getBuffer());
+        for (auto& ld : o->getLoads()) addResource(ld.getResource());
+        auto search = clustereddeliveries.equal_range(o);
+        for (auto it = search.first; it != search.second; ++it)
+          for (auto m = it->second->getMembers(); m != Demand::end(); ++m)
+            addOperation(m->getDeliveryOperation());
+      } else if (!bufstack.empty()) {
+        auto b = bufstack.top();
+        bufstack.pop();
+        for (auto& fl : b->getFlows()) addOperation(fl.getOperation());
+        if (b->getItem()) {
+          Item::bufferIterator buf_iter(b->getItem());
+          while (Buffer* tmpbuf = buf_iter.next()) addBuffer(tmpbuf);
         }
-        cur_cluster = ++numberOfClusters;
-        if (numberOfClusters >= INT_MAX)
-          throw LogicException("Too many clusters");
+      } else {
+        auto r = resstack.top();
+        resstack.pop();
+        for (auto& ld : r->getLoads()) addOperation(ld.getOperation());
+        addResource(r->getOwner());
+        for (auto m = r->getMembers(); m != Resource::end(); ++m)
+          addResource(&*m);
       }
+    }
+
+    // Reset the levels and clusters of these entities.
+    // Creating the producing operations of the buffers can cause new entities
+    // to be created. They are added to the walk.
+    for (; firstoper < opers.size(); ++firstoper) {
+      auto o = opers[firstoper];
+      previous[o] = o->cluster;
+      affected.insert(o->cluster);
+      o->cluster = 0;
+      o->lvl = -1;
+      for (auto& fl : o->getFlows()) fl.getBuffer();
+    }
+    for (; firstbuf < bufs.size(); ++firstbuf) {
+      auto b = bufs[firstbuf];
+      previous[b] = b->cluster;
+      affected.insert(b->cluster);
+      b->cluster = 0;
+      b->lvl = -1;
+      b->getProducingOperation();
+    }
+    for (; firstres < ress.size(); ++firstres) {
+      auto r = ress[firstres];
+      previous[r] = r->cluster;
+      affected.insert(r->cluster);
+      r->cluster = 0;
+      r->lvl = -1;
+    }
+    if (recomputeLevels) return true;
+    {
+      lock_guard<mutex> l(changelock);
+      if (changedOperations.empty() && changedBuffers.empty() &&
+          changedResources.empty())
+        break;
+      newopers.swap(changedOperations);
+      newbufs.swap(changedBuffers);
+      newres.swap(changedResources);
+      changedOperations.clear();
+      changedBuffers.clear();
+      changedResources.clear();
+    }
+  }
+
+  // Compute the levels and clusters again, in the same order as a full
+  // recomputation. The clusters get temporary negative numbers first.
+  // The number of levels isn't reduced: it remains an upper limit.
+  sort(opers.begin(), opers.end(), [](const Operation* a, const Operation* b) {
+    return a->getName() < b->getName();
+  });
+  int tmpcluster = 0;
+  for (auto o : opers)
+    if (computeCluster(*o, tmpcluster - 1)) --tmpcluster;
+
+  // A cluster keeps the lowest previous number of its entities that isn't
+  // taken yet. Clusters that didn't change keep their number, and merged
+  // clusters keep the number of one of their parts. The other released
+  // numbers are reused before new numbers are allocated.
+  map<int, set<int> > candidates;
+  auto collect = [&](const HasLevel* e) {
+    if (e->cluster >= 0) return;
+    auto& c = candidates[e->cluster];
+    auto prev = previous.find(e);
+    if (prev != previous.end() && prev->second) c.insert(prev->second);
+  };
+  for (auto o : opers) collect(o);
+  for (auto b : bufs) collect(b);
+  for (auto r : ress) collect(r);
+  affected.insert(deleted.begin(), deleted.end());
+  affected.erase(0);
+  map<int, int> renumber;
+  for (auto c = candidates.rbegin(); c != candidates.rend(); ++c)
+    for (auto n : c->second)
+      if (affected.erase(n)) {
+        renumber[c->first] = n;
+        break;
+      }
+  auto freecluster = affected.begin();
+  for (auto c = candidates.rbegin(); c != candidates.rend(); ++c) {
+    if (renumber.count(c->first)) continue;
+    if (freecluster != affected.end())
+      renumber[c->first] = *freecluster++;
+    else if (++numberOfClusters >= INT_MAX)
+      throw LogicException("Too many clusters");
+    else
+      renumber[c->first] = numberOfClusters;
+  }
+  for (auto o : opers)
+    if (o->cluster < 0) o->cluster = renumber[o->cluster];
+  for (auto b : bufs)
+    if (b->cluster < 0) b->cluster = renumber[b->cluster];
+  for (auto r : ress)
+    if (r->cluster < 0) r->cluster = renumber[r->cluster];
+
+  // Copy the level from generic buffers to the specific mto-buffers
+  for (auto b : bufs) copyLevelToBatchBuffers(*b);
+  return true;
+}
+
+bool HasLevel::computeCluster(Operation& g, int cur_cluster) {
+  // Select a new cluster number
+  if (g.cluster)
+    cur_cluster = g.cluster;
+  else if (g.getFlows().empty() && g.getLoads().empty() && !g.getOwner() &&
+           g.getSubOperations().empty() && g.getDependencies().empty()) {
+    // Detect hanging operations
+    // Cluster 0 keeps all dangling operations
+    g.lvl = 0;
+    return false;
+  }
 
 #ifdef CLUSTERDEBUG
-      logger << "Investigating operation '" << g << "' - current cluster "
-             << g.cluster << '\n';
+  logger << "Investigating operation '" << g << "' - current cluster "
+         << g.cluster << '\n';
 #endif
 
-      // Do we need to activate the level search?
-      // Criterion are:
-      //   - Not used in a super operation
-      //   - Have a producing flow on the operation itself
-      //     or on any of its sub operations
-      search_level = false;
-      if (!g.getOwner()) {
-        search_level = true;
-        // Does the operation itself have producing flows?
-        for (auto fl = g.getFlows().begin();
-             fl != g.getFlows().end() && search_level; ++fl)
+  stack<pair<Operation*, int> > opstack;
+  Operation* cur_oper;
+  int cur_level;
+  Buffer* cur_buf;
+  const Flow* cur_Flow;
+  bool search_level;
+  map<Operation*, short> visited;
+
+  // Do we need to activate the level search?
+  // Criterion are:
+  //   - Not used in a super operation
+  //   - Have a producing flow on the operation itself
+  //     or on any of its sub operations
+  search_level = false;
+  if (!g.getOwner()) {
+    search_level = true;
+    // Does the operation itself have producing flows?
+    for (auto fl = g.getFlows().begin();
+         fl != g.getFlows().end() && search_level; ++fl)
+      if (fl->isProducer() && fl->getBuffer()->hasConsumingFlows())
+        search_level = false;
+    if (search_level) {
+      // Do suboperations have a producing flow?
+      for (auto i = g.getSubOperations().rbegin();
+           i != g.getSubOperations().rend() && search_level; ++i)
+        for (auto fl = (*i)->getOperation()->getFlows().begin();
+             fl != (*i)->getOperation()->getFlows().end() && search_level; ++fl)
           if (fl->isProducer() && fl->getBuffer()->hasConsumingFlows())
             search_level = false;
-        if (search_level) {
-          // Do suboperations have a producing flow?
-          for (auto i = g.getSubOperations().rbegin();
-               i != g.getSubOperations().rend() && search_level; ++i)
-            for (auto fl = (*i)->getOperation()->getFlows().begin();
-                 fl != (*i)->getOperation()->getFlows().end() && search_level;
-                 ++fl)
-              if (fl->isProducer() && fl->getBuffer()->hasConsumingFlows())
-                search_level = false;
-        }
-      }
-
-      // If both the level and the cluster are de-activated, then we can move on
-      if (!search_level && g.cluster) continue;
-
-      // Start recursing
-      // Note that as soon as push an operation on the stack we set its
-      // cluster and/or level. This is avoid that operations are needlessly
-      // pushed a second time on the stack.
-      opstack.emplace(&g, search_level ? 0 : -1);
-      visited.clear();
-      g.cluster = cur_cluster;
-      if (search_level) g.lvl = 0;
-      while (!opstack.empty()) {
-        // Take the top of the stack
-        cur_oper = opstack.top().first;
-        cur_level = opstack.top().second;
-        opstack.pop();
-
-        // Keep track of the maximum number of levels
-        if (cur_level > numberOfLevels) numberOfLevels = cur_level;
+    }
+  }
+
+  // If both the level and the cluster are de-activated, then we can move on
+  if (!search_level && g.cluster) return false;
+
+  // Start recursing
+  // Note that as soon as push an operation on the stack we set its
+  // cluster and/or level. This is avoid that operations are needlessly
+  // pushed a second time on the stack.
+  bool new_cluster = !g.cluster;
+  opstack.emplace(&g, search_level ? 0 : -1);
+  g.cluster = cur_cluster;
+  if (search_level) g.lvl = 0;
+  while (!opstack.empty()) {
+    // Take the top of the stack
+    cur_oper = opstack.top().first;
+    cur_level = opstack.top().second;
+    opstack.pop();
+
+    // Keep track of the maximum number of levels
+    if (cur_level > numberOfLevels) numberOfLevels = cur_level;
 
 #ifdef CLUSTERDEBUG
-        logger << "    Recursing in Operation '" << *(cur_oper)
-               << "' - current level " << cur_level << '\n';
+    logger << "    Recursing in Operation '" << *(cur_oper)
+           << "' - current level " << cur_level << '\n';
 #endif
-        // Detect loops in the supply chain
-        auto detectloop = visited.find(cur_oper);
-        if (detectloop == visited.end())
-          // Keep track of operations already visited
-          visited.insert(make_pair(cur_oper, 0));
-        else if (++(detectloop->second) > 1)
-          // Already visited this operation enough times - don't repeat
-          continue;
-
-        // Push sub operations on the stack
-        for (auto& i :
-             std::ranges::reverse_view(cur_oper->getSubOperations())) {
-          if (i->getOperation()->lvl < cur_level) {
-            // Search level and cluster
-            opstack.emplace(i->getOperation(), cur_level);
-            i->getOperation()->lvl = cur_level;
-            i->getOperation()->cluster = cur_cluster;
-          } else if (!i->getOperation()->cluster) {
-            // Search for clusters information only
-            opstack.emplace(i->getOperation(), -1);
-            i->getOperation()->cluster = cur_cluster;
-          }
-          // else: no search required
-        }
+    // Detect loops in the supply chain
+    auto detectloop = visited.find(cur_oper);
+    if (detectloop == visited.end())
+      // Keep track of operations already visited
+      visited.insert(make_pair(cur_oper, 0));
+    else if (++(detectloop->second) > 1)
+      // Already visited this operation enough times - don't repeat
+      continue;
+
+    // Push sub operations on the stack
+    for (auto& i : std::ranges::reverse_view(cur_oper->getSubOperations())) {
+      if (i->getOperation()->lvl < cur_level) {
+        // Search level and cluster
+        opstack.emplace(i->getOperation(), cur_level);
+        i->getOperation()->lvl = cur_level;
+        i->getOperation()->cluster = cur_cluster;
+      } else if (!i->getOperation()->cluster) {
+        // Search for clusters information only
+        opstack.emplace(i->getOperation(), -1);
+        i->getOperation()->cluster = cur_cluster;
+      }
+      // else: no search required
+    }
 
-        // Push super operations on the stack
-        if (cur_oper->getOwner()) {
-          if (cur_oper->getOwner()->lvl < cur_level) {
-            // Search level and cluster
-            opstack.emplace(cur_oper->getOwner(), cur_level);
-            cur_oper->getOwner()->lvl = cur_level;
-            cur_oper->getOwner()->cluster = cur_cluster;
-          } else if (!cur_oper->getOwner()->cluster) {
-            // Search for clusters information only
-            opstack.emplace(cur_oper->getOwner(), -1);
-            cur_oper->getOwner()->cluster = cur_cluster;
-          }
-          // else: no search required
-        }
+    // Push super operations on the stack
+    if (cur_oper->getOwner()) {
+      if (cur_oper->getOwner()->lvl < cur_level) {
+        // Search level and cluster
+        opstack.emplace(cur_oper->getOwner(), cur_level);
+        cur_oper->getOwner()->lvl = cur_level;
+        cur_oper->getOwner()->cluster = cur_cluster;
+      } else if (!cur_oper->getOwner()->cluster) {
+        // Search for clusters information only
+        opstack.emplace(cur_oper->getOwner(), -1);
+        cur_oper->getOwner()->cluster = cur_cluster;
+      }
+      // else: no search required
+    }
 
-        // Push dependencies on the stack
-        for (auto dpd : cur_oper->getDependencies()) {
-          auto new_oper = dpd->getOperation();
-          if (new_oper == cur_oper) new_oper = dpd->getBlockedBy();
-          if (new_oper->lvl < cur_level + 1) {
-            // Search level and cluster
-            opstack.emplace(new_oper, cur_level + 1);
-            new_oper->lvl = cur_level + 1;
-            new_oper->cluster = cur_cluster;
-          } else if (!new_oper->cluster) {
-            // Search for clusters information only
-            opstack.emplace(new_oper, -1);
-            new_oper->cluster = cur_cluster;
-          }
-          // else: no search required
-        }
+    // Push dependencies on the stack
+    for (auto dpd : cur_oper->getDependencies()) {
+      auto new_oper = dpd->getOperation();
+      if (new_oper == cur_oper) new_oper = dpd->getBlockedBy();
+      if (new_oper->lvl < cur_level + 1) {
+        // Search level and cluster
+        opstack.emplace(new_oper, cur_level + 1);
+        new_oper->lvl = cur_level + 1;
+        new_oper->cluster = cur_cluster;
+      } else if (!new_oper->cluster) {
+        // Search for clusters information only
+        opstack.emplace(new_oper, -1);
+        new_oper->cluster = cur_cluster;
+      }
+      // else: no search required
+    }
 
-        // Update level of resources linked to current operation
-        for (const auto& gres : cur_oper->getLoads()) {
-          stack<Resource*> rsrc;
-          auto resptr = gres.getResource();
-          while (resptr->getOwner()) resptr = resptr->getOwner();
-          rsrc.push(resptr);
-          while (!rsrc.empty()) {
-            resptr = rsrc.top();
-            rsrc.pop();
-
-            // Update the level of the resource
-            if (resptr->lvl < cur_level) resptr->lvl = cur_level;
-            // Update the cluster of the resource and operations using it
-            if (!resptr->cluster) {
-              resptr->cluster = cur_cluster;
-              // Find more operations connected to this cluster by the resource
-              for (const auto& resops : resptr->getLoads()) {
-                if (!resops.getOperation()->cluster) {
-                  opstack.emplace(resops.getOperation(), -1);
-                  resops.getOperation()->cluster = cur_cluster;
-                }
-              }
+    // Update level of resources linked to current operation
+    for (const auto& gres : cur_oper->getLoads()) {
+      stack<Resource*> rsrc;
+      auto resptr = gres.getResource();
+      while (resptr->getOwner()) resptr = resptr->getOwner();
+      rsrc.push(resptr);
+      while (!rsrc.empty()) {
+        resptr = rsrc.top();
+        rsrc.pop();
+
+        // Update the level of the resource
+        if (resptr->lvl < cur_level) resptr->lvl = cur_level;
+        // Update the cluster of the resource and operations using it
+        if (!resptr->cluster) {
+          resptr->cluster = cur_cluster;
+          // Find more operations connected to this cluster by the resource
+          for (const auto& resops : resptr->getLoads()) {
+            if (!resops.getOperation()->cluster) {
+              opstack.emplace(resops.getOperation(), -1);
+              resops.getOperation()->cluster = cur_cluster;
             }
-
-            // Add all child resources to the stack
-            for (auto chld = resptr->getMembers(); chld != Resource::end();
-                 ++chld)
-              rsrc.push(&*chld);
           }
         }
 
-        // Now loop through all flows of the operation
-        for (const auto& gflow : cur_oper->getFlows()) {
-          cur_Flow = &gflow;
-          cur_buf = cur_Flow->getBuffer();
-
-          // Check whether the level search needs to continue
-          search_level = cur_level != -1 && cur_buf->lvl < cur_level + 1;
-
-          // Check if the buffer needs processing
-          if (search_level || !cur_buf->cluster) {
-            // Update the cluster of the current buffer
-            cur_buf->cluster = cur_cluster;
-
-            // Loop through all flows of the buffer
-            for (auto buffl = cur_buf->getFlows().begin();
-                 buffl != cur_buf->getFlows().end(); ++buffl) {
-              // Check level recursion
-              if (cur_Flow->isConsumer() && search_level &&
-                  (!cur_Flow->getOperation()
-                        ->hasType<OperationItemDistribution>() ||
-                   static_cast<OperationItemDistribution*>(
-                       cur_Flow->getOperation())
-                       ->getPriority())) {
-                if (buffl->getOperation()->lvl < cur_level + 1 &&
-                    &*buffl != cur_Flow && buffl->isProducer()) {
-                  opstack.emplace(buffl->getOperation(), cur_level + 1);
-                  buffl->getOperation()->lvl = cur_level + 1;
-                  buffl->getOperation()->cluster = cur_cluster;
-                } else if (!buffl->getOperation()->cluster) {
-                  opstack.emplace(buffl->getOperation(), -1);
-                  buffl->getOperation()->cluster = cur_cluster;
-                }
-                if (cur_level + 1 > numberOfLevels)
-                  numberOfLevels = cur_level + 1;
-                cur_buf->lvl = cur_level + 1;
-              }
-              // Check cluster recursion
-              else if (!buffl->getOperation()->cluster) {
-                opstack.emplace(buffl->getOperation(), -1);
-                buffl->getOperation()->cluster = cur_cluster;
-              }
-            }
-          }  // End of needs-processing if statement
-          else if (cur_buf->lvl < 0 && !cur_Flow->isConsumer())
-            cur_buf->lvl = 0;
-
-          // Add all buffers for this item to the same cluster
-          Item::bufferIterator buf_iter(cur_Flow->getBuffer()->getItem());
-          while (Buffer* tmpbuf = buf_iter.next())
-            if (!tmpbuf->cluster) {
-              tmpbuf->cluster = cur_cluster;
-              for (const auto& buffl : tmpbuf->getFlows()) {
-                if (!buffl.getOperation()->cluster) {
-                  opstack.emplace(buffl.getOperation(), -1);
-                  buffl.getOperation()->cluster = cur_cluster;
-                }
-              }
-            }
-        }  // End of flow loop
-
-        // Push grouped deliveries on the stack
-        auto search = clustereddeliveries.equal_range(cur_oper);
-        for (auto it = search.first; it != search.second; ++it) {
-          for (auto m = it->second->getMembers(); m != Demand::end(); ++m) {
-            auto dlvr = m->getDeliveryOperation();
-            if (dlvr && !dlvr->cluster) {
-              opstack.emplace(dlvr, -1);
-              dlvr->cluster = cur_cluster;
+        // Add all child resources to the stack
+        for (auto chld = resptr->getMembers(); chld != Resource::end(); ++chld)
+          rsrc.push(&*chld);
+      }
+    }
+
+    // Now loop through all flows of the operation
+    for (const auto& gflow : cur_oper->getFlows()) {
+      cur_Flow = &gflow;
+      cur_buf = cur_Flow->getBuffer();
+
+      // Check whether the level search needs to continue
+      search_level = cur_level != -1 && cur_buf->lvl < cur_level + 1;
+
+      // Check if the buffer needs processing
+      if (search_level || !cur_buf->cluster) {
+        // Update the cluster of the current buffer
+        cur_buf->cluster = cur_cluster;
+
+        // Loop through all flows of the buffer
+        for (auto buffl = cur_buf->getFlows().begin();
+             buffl != cur_buf->getFlows().end(); ++buffl) {
+          // Check level recursion
+          if (cur_Flow->isConsumer() && search_level &&
+              (!cur_Flow->getOperation()
+                    ->hasType<OperationItemDistribution>() ||
+               static_cast<OperationItemDistribution*>(cur_Flow->getOperation())
+                   ->getPriority())) {
+            if (buffl->getOperation()->lvl < cur_level + 1 &&
+                &*buffl != cur_Flow && buffl->isProducer()) {
+              opstack.emplace(buffl->getOperation(), cur_level + 1);
+              buffl->getOperation()->lvl = cur_level + 1;
+              buffl->getOperation()->cluster = cur_cluster;
+            } else if (!buffl->getOperation()->cluster) {
+              opstack.emplace(buffl->getOperation(), -1);
+              buffl->getOperation()->cluster = cur_cluster;
             }
+            if (cur_level + 1 > numberOfLevels) numberOfLevels = cur_level + 1;
+            cur_buf->lvl = cur_level + 1;
+          }
+          // Check cluster recursion
+          else if (!buffl->getOperation()->cluster) {
+            opstack.emplace(buffl->getOperation(), -1);
+            buffl->getOperation()->cluster = cur_cluster;
           }
         }
-      }  // End while stack not empty
-
-    }  // End of Operation loop
-
-    // Copy the level from generic buffers to the specific mto-buffers
-    // TODO this logic will no longer apply when the mto-buffers can
-    // have their own producing operation.
-    for (auto& gbuf : Buffer::all()) {
-      if (!gbuf.getBatch() || !gbuf.getItem()) continue;
-      Buffer* generic = nullptr;
-      Item::bufferIterator buf_iter(gbuf.getItem());
-      while (Buffer* tmpbuf = buf_iter.next()) {
-        if (!tmpbuf->getBatch()) {
-          generic = tmpbuf;
-          break;
+      }  // End of needs-processing if statement
+      else if (cur_buf->lvl < 0 && !cur_Flow->isConsumer())
+        cur_buf->lvl = 0;
+
+      // Add all buffers for this item to the same cluster
+      Item::bufferIterator buf_iter(cur_Flow->getBuffer()->getItem());
+      while (Buffer* tmpbuf = buf_iter.next())
+        if (!tmpbuf->cluster) {
+          tmpbuf->cluster = cur_cluster;
+          for (const auto& buffl : tmpbuf->getFlows()) {
+            if (!buffl.getOperation()->cluster) {
+              opstack.emplace(buffl.getOperation(), -1);
+              buffl.getOperation()->cluster = cur_cluster;
+            }
+          }
         }
-      }
-      if (generic) {
-        Item::bufferIterator buf_iter(gbuf.getItem());
-        while (Buffer* tmpbuf = buf_iter.next()) {
-          if (tmpbuf->getBatch()) tmpbuf->copyLevelAndCluster(generic);
+    }  // End of flow loop
+
+    // Push grouped deliveries on the stack
+    auto search = clustereddeliveries.equal_range(cur_oper);
+    for (auto it = search.first; it != search.second; ++it) {
+      for (auto m = it->second->getMembers(); m != Demand::end(); ++m) {
+        auto dlvr = m->getDeliveryOperation();
+        if (dlvr && !dlvr->cluster) {
+          opstack.emplace(dlvr, -1);
+          dlvr->cluster = cur_cluster;
         }
       }
     }
-  }  // End of while recomputeLevels. The loop will be repeated as long as model
-     // changes are done during the recomputation.
+  }  // End while stack not empty
+  return new_cluster;
+}
 
-  // Unlock the exclusive access to this function
-  computationBusy = false;
+void HasLevel::copyLevelToBatchBuffers(Buffer& b) {
+  // TODO this logic will no longer apply when the mto-buffers can
+  // have their own producing operation.
+  if (!b.getBatch() || !b.getItem()) return;
+  Buffer* generic = nullptr;
+  Item::bufferIterator buf_iter(b.getItem());
+  while (Buffer* tmpbuf = buf_iter.next()) {
+    if (!tmpbuf->getBatch()) {
+      generic = tmpbuf;
+      break;
+    }
+  }
+  if (generic) {
+    Item::bufferIterator buf_iter(b.getItem());
+    while (Buffer* tmpbuf = buf_iter.next()) {
+      if (tmpbuf->getBatch()) tmpbuf->copyLevelAndCluster(generic);
+    }
+  }
 }
 
 }  // namespace frepple
@@ -167,6 +167,9 @@ void LibraryModel::initialize() {
   PythonInterpreter::registerGlobalMethod(
       "problems", PythonIterator<Problem::iterator, Problem>::create,
       METH_NOARGS, "Returns an iterator over the problems.");
+  PythonInterpreter::registerGlobalMethod(
+      "problemstatistics", Plannable::getProblemStatistics, METH_NOARGS,
+      "Returns statistics on the incremental problem detection.");
   PythonInterpreter::registerGlobalMethod(
       "setupmatrices", SetupMatrix::createIterator, METH_NOARGS,
       "Returns an iterator over the setup matrices.");
@@ -81,7 +81,7 @@ int LoadBucketizedFromEnd::initialize() {
 
 Load::~Load() {
   // Set a flag to make sure the level computation is triggered again
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation(getPtrA(), getPtrB());
 
   // Delete existing loadplans
   if (getOperation() && getResource()) {
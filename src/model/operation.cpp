@@ -2315,7 +2315,7 @@ void Operation::setItem(Item* i) {
   }
 
   // Trigger level and cluster recomputation
-  HasLevel::triggerLazyRecomputation();
+  HasLevel::triggerIncrementalRecomputation(this);
 }
 
 pair<Duration, Date> OperationAlternate::getDecoupledLeadTime(
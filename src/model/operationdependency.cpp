@@ -76,6 +76,7 @@ int OperationDependency::initialize() {
 }
 
 OperationDependency::~OperationDependency() {
+  HasLevel::triggerIncrementalRecomputation(oper, blockedby);
   if (blockedby) {
     blockedby->removeDependency(this);
     for (auto o = oper->getOperationPlans(); o != OperationPlan::end(); ++o) {
@@ -92,6 +93,7 @@ OperationDependency::~OperationDependency() {
 
 void OperationDependency::setOperation(Operation* o) {
   if (o == oper) return;
+  HasLevel::triggerIncrementalRecomputation(oper, blockedby);
   if (oper && blockedby) oper->removeDependency(this);
   if (!oper && o) {
     oper = o;
@@ -111,10 +113,14 @@ void OperationDependency::setOperation(Operation* o) {
       blockedby = nullptr;
     }
   }
+
+  // Trigger level and cluster recomputation
+  HasLevel::triggerIncrementalRecomputation(oper, blockedby);
 }
 
 void OperationDependency::setBlockedBy(Operation* o) {
   if (o == blockedby) return;
+  HasLevel::triggerIncrementalRecomputation(oper, blockedby);
   if (blockedby && oper) blockedby->removeDependency(this);
   if (!blockedby && o) {
     blockedby = o;
@@ -134,6 +140,9 @@ void OperationDependency::setBlockedBy(Operation* o) {
       blockedby = nullptr;
     }
   }
+
+  // Trigger level and cluster recomputation
+  HasLevel::triggerIncrementalRecomputation(oper, blockedby);
 }
 
 PyObject* OperationDependency::create(PyTypeObject*, PyObject*,
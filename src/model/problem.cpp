@@ -23,12 +23,19 @@
  *                                                                         *
  ***************************************************************************/
 
+#include <chrono>
+
 #include "frepple/model.h"
 
 namespace frepple {
 
-bool Plannable::anyChange = false;
-bool Plannable::computationBusy = false;
+map<unsigned long, Plannable*> Plannable::dirty;
+unsigned long Plannable::dirtycounter = 0;
+mutex Plannable::dirtylock;
+atomic<bool> Plannable::computationBusy{false};
+unsigned long Plannable::statRuns = 0;
+unsigned long Plannable::statEntities = 0;
+double Plannable::statTime = 0.0;
 const MetaCategory* Problem::metadata;
 const MetaClass *ProblemMaterialShortage::metadata,
     *ProblemInvalidData::metadata, *ProblemPrecedence::metadata,
@@ -169,7 +176,10 @@ void Problem::List::transfer(HasProblems* newowner) {
 
 void Plannable::computeProblems() {
   // Exit immediately if the list is up to date
-  if (!anyChange && !computationBusy) return;
+  if (!computationBusy) {
+    lock_guard<mutex> l(dirtylock);
+    if (dirty.empty()) return;
+  }
 
   computationBusy = true;
   // Get exclusive access to this function in a multi-threaded environment.
@@ -177,31 +187,57 @@ void Plannable::computeProblems() {
   {
     lock_guard<mutex> l(computationbusy);
 
+    auto start = chrono::steady_clock::now();
+    unsigned long cnt = 0;
+
     // Another thread may already have computed it while this thread was
     // waiting for the lock
-    while (anyChange) {
-      // Reset to change flag. Note that during the computation the flag
-      // could be switched on again by some model change in a different thread.
-      anyChange = false;
-
-      // Loop through all entities
-      for (HasProblems::EntityIterator i; i != HasProblems::endEntity(); ++i) {
-        Plannable* e = i->getEntity();
-        if (e->getChanged() && e->getDetectProblems()) i->updateProblems();
+    while (true) {
+      // Pick the next changed entity. Note that during the computation new
+      // entities can be marked as changed by a model change in a different
+      // thread. The flag is cleared before updating the problems, so that
+      // such a change during the update puts the entity back on the list.
+      Plannable* e;
+      {
+        lock_guard<mutex> l2(dirtylock);
+        if (dirty.empty()) break;
+        auto first = dirty.begin();
+        e = first->second;
+        dirty.erase(first);
+        e->changed = false;
       }
 
-      // Mark the entities as unchanged
-      for (HasProblems::EntityIterator j; j != HasProblems::endEntity(); ++j) {
-        Plannable* e = j->getEntity();
-        if (e->getChanged() && e->getDetectProblems()) e->setChanged(false);
+      // Update the problems of the entity.
+      if (e->getDetectProblems()) {
+        e->updateProblems();
+        ++cnt;
       }
     }
 
+    // Collect statistics
+    if (cnt) {
+      ++statRuns;
+      statEntities += cnt;
+      statTime +=
+          chrono::duration<double>(chrono::steady_clock::now() - start).count();
+    }
+
     // Unlock the exclusive access to this function
     computationBusy = false;
   }
 }
 
+PyObject* Plannable::getProblemStatistics(PyObject*, PyObject*) {
+  size_t pending;
+  {
+    lock_guard<mutex> l(dirtylock);
+    pending = dirty.size();
+  }
+  return Py_BuildValue("{s:k,s:k,s:d,s:n}", "runs", statRuns, "entities",
+                       statEntities, "time", statTime, "pending",
+                       static_cast<Py_ssize_t>(pending));
+}
+
 void Problem::clearProblems() {
   // Loop through all entities, and call clearProblems(i)
   for (HasProblems::EntityIterator i = HasProblems::beginEntity();
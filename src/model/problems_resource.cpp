@@ -82,7 +82,8 @@ void Resource::updateProblems() {
 
 void ResourceBuckets::updateProblems() {
   // Delete existing problems for this resource
-  Problem::clearProblems(*this, true, false);
+  Problem::clearProblems(*this, false, false);
+  setChanged(false);
 
   // Problem detection disabled on this resource
   if (!getDetectProblems() || !getConstrained()) return;
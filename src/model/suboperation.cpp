@@ -54,6 +54,7 @@ int SubOperation::initialize() {
 }
 
 SubOperation::~SubOperation() {
+  HasLevel::triggerIncrementalRecomputation(owner, oper);
   if (owner) owner->getSubOperations().remove(this);
   if (oper) oper->owner = nullptr;
 }
@@ -70,6 +71,7 @@ void SubOperation::setOwner(Operation* o) {
   }
 
   // Remove from previous owner
+  HasLevel::triggerIncrementalRecomputation(owner, oper);
   if (oper && owner) oper->owner = nullptr;
   if (owner) owner->getSubOperations().remove(this);
 
@@ -85,12 +87,16 @@ void SubOperation::setOwner(Operation* o) {
       ++iter;
     owner->getSubOperations().insert(iter, this);
   }
+
+  // Trigger level and cluster recomputation
+  HasLevel::triggerIncrementalRecomputation(owner, oper);
 }
 
 void SubOperation::setOperation(Operation* o) {
   if (o == oper) return;
 
   // Remove from previous oper
+  HasLevel::triggerIncrementalRecomputation(owner, oper);
   if (oper && owner) oper->owner = nullptr;
 
   // Update
@@ -98,6 +104,9 @@ void SubOperation::setOperation(Operation* o) {
 
   // Insert at new oper
   if (owner) oper->owner = owner;
+
+  // Trigger level and cluster recomputation
+  HasLevel::triggerIncrementalRecomputation(owner, oper);
 }
 
 void SubOperation::setPriority(int pr) {